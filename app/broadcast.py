@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+FETCH_CONCURRENCY = int(os.getenv("BROADCAST_FETCH_CONCURRENCY", "10"))
+SEND_CONCURRENCY = int(os.getenv("BROADCAST_SEND_CONCURRENCY", "5"))
+SEND_QUEUE_SIZE = int(os.getenv("BROADCAST_SEND_QUEUE_SIZE", "200"))
+MAX_SEND_RETRIES = int(os.getenv("BROADCAST_MAX_SEND_RETRIES", "3"))
+
+# fetch_city(city) -> тексты сообщений для города (пустой список = пропустить город)
+FetchCity = Callable[[str], Awaitable[Sequence[str]]]
+# send_chat(chat_id, texts) — отправка всех сообщений одному получателю
+SendChat = Callable[[int, Sequence[str]], Awaitable[None]]
+
+
+class RetryDelivery(Exception):
+    def __init__(self, delay: float, texts: Sequence[str]):
+        super().__init__(f"retry delivery in {delay}s")
+        self.delay = delay
+        self.texts = list(texts)
+
+
+@dataclass
+class StageStats:
+    items: int = 0
+    errors: int = 0
+    retries: int = 0
+    busy_time: float = 0.0
+    max_item_time: float = 0.0
+    wall_time: float = 0.0
+
+    def observe(self, elapsed: float, ok: bool = True):
+        self.items += 1
+        if not ok:
+            self.errors += 1
+        self.busy_time += elapsed
+        if elapsed > self.max_item_time:
+            self.max_item_time = elapsed
+
+    @property
+    def avg_item_time(self) -> float:
+        return self.busy_time / self.items if self.items else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "items": self.items,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_ms": round(self.avg_item_time * 1000, 1),
+            "max_ms": round(self.max_item_time * 1000, 1),
+            "wall_ms": round(self.wall_time * 1000, 1),
+        }
+
+
+@dataclass
+class BroadcastStats:
+    fetch: StageStats = field(default_factory=StageStats)
+    send: StageStats = field(default_factory=StageStats)
+    # сколько fetch-воркеры простояли на заполненной очереди отправки
+    backpressure_wait: float = 0.0
+    max_queue_depth: int = 0
+    total_time: float = 0.0
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "fetch": self.fetch.as_dict(),
+            "send": self.send.as_dict(),
+            "backpressure_wait_ms": round(self.backpressure_wait * 1000, 1),
+            "max_queue_depth": self.max_queue_depth,
+            "total_ms": round(self.total_time * 1000, 1),
+        }
+
+    def summary(self) -> str:
+        return (
+            f"cities={self.fetch.items} (errors={self.fetch.errors}, "
+            f"avg={self.fetch.avg_item_time * 1000:.1f}ms, wall={self.fetch.wall_time * 1000:.1f}ms); "
+            f"chats={self.send.items} (errors={self.send.errors}, retries={self.send.retries}, "
+            f"avg={self.send.avg_item_time * 1000:.1f}ms, wall={self.send.wall_time * 1000:.1f}ms); "
+            f"backpressure={self.backpressure_wait * 1000:.1f}ms, max_queue={self.max_queue_depth}, "
+            f"total={self.total_time * 1000:.1f}ms"
+        )
+
+
+async def run_broadcast(
+    users_by_city: Dict[str, List[int]],
+    fetch_city: FetchCity,
+    send_chat: SendChat,
+    *,
+    fetch_concurrency: Optional[int] = None,
+    send_concurrency: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    max_retries: Optional[int] = None,
+) -> BroadcastStats:
+    fetch_concurrency = max(1, fetch_concurrency or FETCH_CONCURRENCY)
+    send_concurrency = max(1, send_concurrency or SEND_CONCURRENCY)
+    queue_size = max(1, queue_size or SEND_QUEUE_SIZE)
+    max_retries = MAX_SEND_RETRIES if max_retries is None else max_retries
+
+    stats = BroadcastStats()
+    started = time.perf_counter()
+
+    cities: asyncio.Queue[Tuple[str, List[int]]] = asyncio.Queue()
+    for city, chat_ids in users_by_city.items():
+        cities.put_nowait((city, chat_ids))
+
+    # ограниченная очередь связывает стадии: медленная отправка тормозит загрузку погоды,
+    # но не блокирует уже идущие запросы к OWM
+    outbox: asyncio.Queue[Optional[Tuple[int, Sequence[str], int]]] = asyncio.Queue(maxsize=queue_size)
+    requeues: set[asyncio.Task] = set()
+
+    async def fetch_worker():
+        while True:
+            try:
+                city, chat_ids = cities.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            t0 = time.perf_counter()
+            try:
+                texts = await fetch_city(city)
+            except Exception as exc:
+                stats.fetch.observe(time.perf_counter() - t0, ok=False)
+                logger.exception(f"Broadcast fetch stage failed for {city}: {exc}")
+                continue
+            stats.fetch.observe(time.perf_counter() - t0)
+
+            if not texts:
+                continue
+
+            for chat_id in chat_ids:
+                if outbox.full():
+                    w0 = time.perf_counter()
+                    await outbox.put((chat_id, texts, 0))
+                    stats.backpressure_wait += time.perf_counter() - w0
+                else:
+                    outbox.put_nowait((chat_id, texts, 0))
+                stats.max_queue_depth = max(stats.max_queue_depth, outbox.qsize())
+
+    async def requeue(item, delay: float):
+        await asyncio.sleep(delay)
+        await outbox.put(item)
+
+    async def send_worker():
+        while True:
+            item = await outbox.get()
+            try:
+                if item is None:
+                    return
+                chat_id, texts, attempt = item
+                t0 = time.perf_counter()
+                try:
+                    await send_chat(chat_id, texts)
+                except RetryDelivery as exc:
+                    if attempt >= max_retries:
+                        stats.send.observe(time.perf_counter() - t0, ok=False)
+                        logger.error(f"Broadcast gave up on {chat_id} after {attempt} retries")
+                        continue
+                    # не блокируем воркер на время retry_after — возвращаем доставку в очередь позже
+                    stats.send.retries += 1
+                    task = asyncio.create_task(requeue((chat_id, exc.texts, attempt + 1), exc.delay))
+                    requeues.add(task)
+                    task.add_done_callback(requeues.discard)
+                    continue
+                except Exception as exc:
+                    stats.send.observe(time.perf_counter() - t0, ok=False)
+                    logger.exception(f"Broadcast send stage failed for {chat_id}: {exc}")
+                    continue
+                stats.send.observe(time.perf_counter() - t0)
+            finally:
+                outbox.task_done()
+
+    senders = [asyncio.create_task(send_worker()) for _ in range(send_concurrency)]
+    try:
+        await asyncio.gather(*(fetch_worker() for _ in range(min(fetch_concurrency, cities.qsize() or 1))))
+        stats.fetch.wall_time = time.perf_counter() - started
+        while True:
+            await outbox.join()
+            if not requeues:
+                break
+            await asyncio.gather(*list(requeues))
+        for _ in senders:
+            await outbox.put(None)
+        await asyncio.gather(*senders)
+    finally:
+        for task in [*senders, *requeues]:
+            if not task.done():
+                task.cancel()
+
+    stats.total_time = time.perf_counter() - started
+    stats.send.wall_time = stats.total_time
+    return stats
@@ -1,67 +1,461 @@
 import os
+import sys
 import json
+import time
+import uuid
 import asyncio
-from typing import Any
+import logging
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import cache_codec
+
+logger = logging.getLogger(__name__)
 
 REDIS_URL = os.getenv("REDIS_URL")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "20"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+CACHE_L1_TTL = float(os.getenv("CACHE_L1_TTL", "30"))  # секунды жизни копии в памяти поверх Redis
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "weather-cache:invalidate")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "20000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_SHARDS = int(os.getenv("CACHE_SHARDS", "16"))
+CACHE_POLICY = os.getenv("CACHE_POLICY", "lru")  # lru | lfu
+CACHE_SWEEP_SECONDS = float(os.getenv("CACHE_SWEEP_SECONDS", "60"))
+_LFU_SAMPLE = 5
+
+# (expires_at, value, approx bytes, hits)
+_Entry = Tuple[float, Any, int, int]
+
+
+def _approx_size(value: Any, depth: int = 0) -> int:
+    # грубая оценка: полный обход дорогих структур не нужен, важен порядок величины
+    size = sys.getsizeof(value)
+    if depth >= 4:
+        return size
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += _approx_size(k, depth + 1) + _approx_size(v, depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += _approx_size(item, depth + 1)
+    return size
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": self.entries,
+            "bytes": self.bytes,
+        }
+
+
+class _Shard:
+    __slots__ = ("entries", "bytes")
 
-class InMemoryTTLCache:
     def __init__(self):
-        self._store = {}  # key -> (ts, ttl, value)
-        self._lock = asyncio.Lock()
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.bytes = 0
+
+
+class BoundedTTLCache:
+    # все операции синхронны внутри event loop и не отдают управление, поэтому блокировка не нужна
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        shards: int = CACHE_SHARDS,
+        policy: str = CACHE_POLICY,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown cache policy: {policy}")
+        self.policy = policy
+        self._shards: List[_Shard] = [_Shard() for _ in range(max(1, shards))]
+        self._max_entries = max(1, max_entries // len(self._shards))
+        self._max_bytes = max(1, max_bytes // len(self._shards))
+        self._clock = clock
+        self._sweeper: Optional[asyncio.Task] = None
+        self._sweep_cursor = 0
+        self.stats = CacheStats()
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _drop(self, shard: _Shard, key: str):
+        entry = shard.entries.pop(key)
+        shard.bytes -= entry[2]
+        self.stats.entries -= 1
+        self.stats.bytes -= entry[2]
+
+    def get_local(self, key: str) -> Any:
+        shard = self._shard(key)
+        entry = shard.entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        expires_at, value, size, hits = entry
+        if expires_at <= self._clock():
+            self._drop(shard, key)
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+        shard.entries[key] = (expires_at, value, size, hits + 1)
+        shard.entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set_local(self, key: str, value: Any, ttl: int = 300):
+        shard = self._shard(key)
+        if key in shard.entries:
+            self._drop(shard, key)
+        size = _approx_size(value)
+        shard.entries[key] = (self._clock() + ttl, value, size, 0)
+        shard.bytes += size
+        self.stats.entries += 1
+        self.stats.bytes += size
+        self._evict(shard, keep=key)
+
+    def clear(self):
+        for shard in self._shards:
+            shard.entries.clear()
+            shard.bytes = 0
+        self.stats.entries = 0
+        self.stats.bytes = 0
+
+    def delete_local(self, key: str):
+        shard = self._shard(key)
+        if key in shard.entries:
+            self._drop(shard, key)
+
+    def _victim(self, shard: _Shard, keep: str) -> Optional[str]:
+        candidates = []
+        for key in shard.entries:
+            if key != keep:
+                candidates.append(key)
+            if self.policy == "lru" or len(candidates) >= _LFU_SAMPLE:
+                break
+        if not candidates:
+            return None
+        if self.policy == "lru":
+            return candidates[0]
+        # приближённый LFU: среди самых давно использованных выбрасываем самый редко читаемый
+        return min(candidates, key=lambda k: shard.entries[k][3])
+
+    def _evict(self, shard: _Shard, keep: str):
+        while len(shard.entries) > self._max_entries or shard.bytes > self._max_bytes:
+            victim = self._victim(shard, keep)
+            if victim is None:
+                return
+            self._drop(shard, victim)
+            self.stats.evictions += 1
+
+    def sweep(self, shards: int = 1) -> int:
+        now = self._clock()
+        removed = 0
+        for _ in range(min(shards, len(self._shards))):
+            shard = self._shards[self._sweep_cursor]
+            self._sweep_cursor = (self._sweep_cursor + 1) % len(self._shards)
+            for key in [k for k, entry in shard.entries.items() if entry[0] <= now]:
+                self._drop(shard, key)
+                removed += 1
+        self.stats.expirations += removed
+        return removed
+
+    def __len__(self) -> int:
+        return self.stats.entries
+
+    def start_sweeper(self, interval: float = CACHE_SWEEP_SECONDS):
+        if self._sweeper is not None and not self._sweeper.done():
+            return
+
+        async def loop():
+            # за один проход чистим одну долю, чтобы не держать event loop на большом кеше
+            while True:
+                await asyncio.sleep(interval / len(self._shards))
+                self.sweep()
+
+        self._sweeper = asyncio.ensure_future(loop())
+
+    async def stop_sweeper(self):
+        task, self._sweeper = self._sweeper, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def get_many_local(self, keys: Iterable[str]) -> Dict[str, Any]:
+        found = {}
+        for key in keys:
+            value = self.get_local(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set_many_local(self, items: Dict[str, Any], ttl: int = 300):
+        for key, value in items.items():
+            self.set_local(key, value, ttl)
+
+    async def get(self, key: str):
+        return self.get_local(key)
+
+    async def set(self, key: str, value: Any, ttl: int = 300):
+        self.set_local(key, value, ttl)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return self.get_many_local(keys)
+
+    async def set_many(self, items: Dict[str, Any], ttl: int = 300):
+        self.set_many_local(items, ttl)
+
+
+_inmem = BoundedTTLCache()
+
+
+@dataclass
+class TierStats:
+    l1_hits: int = 0
+    l2_hits: int = 0
+    misses: int = 0
+    l2_errors: int = 0
+    invalidations_sent: int = 0
+    invalidations_received: int = 0
+    resubscribes: int = 0
+
+
+class TieredCache:
+    # L1 в процессе перед общим Redis; записи других реплик гасят L1 через pub/sub
+    def __init__(self, redis_client, l1: BoundedTTLCache, l1_ttl: float = CACHE_L1_TTL, channel: str = CACHE_INVALIDATION_CHANNEL):
+        self.redis = redis_client
+        self.l1 = l1
+        self.l1_ttl = l1_ttl
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self.stats = TierStats()
+        self.healthy = True
+        self.last_error: Optional[str] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def _l2_failed(self, exc: Exception):
+        self.stats.l2_errors += 1
+        self.healthy = False
+        self.last_error = repr(exc)
+        logger.warning(f"Redis cache unavailable, serving L1 only: {exc}")
 
     async def get(self, key: str):
-        async with self._lock:
-            item = self._store.get(key)
-            if not item:
-                return None
-            ts, ttl, value = item
-            import time
-            if time.time() - ts > ttl:
-                del self._store[key]
-                return None
-            return value
+        return (await self.get_many([key])).get(key)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        found = self.l1.get_many_local(keys)
+        self.stats.l1_hits += len(found)
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if not missing:
+            return found
+        # MGET и PTTL всех промахов уходят в Redis одним пайплайном — один round trip на пачку
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.mget(missing)
+            for key in missing:
+                pipe.pttl(key)
+            values, *pttls = await pipe.execute()
+        except Exception as exc:
+            self._l2_failed(exc)
+            return found
+        self.healthy = True
+        for key, data, pttl in zip(missing, values, pttls):
+            if data is None:
+                self.stats.misses += 1
+                continue
+            try:
+                value = cache_codec.decode(data)
+            except cache_codec.CodecError as exc:
+                logger.warning(f"Dropping unreadable cache entry {key}: {exc}")
+                self.stats.misses += 1
+                continue
+            self.stats.l2_hits += 1
+            ttl = self.l1_ttl if pttl is None or pttl < 0 else min(self.l1_ttl, pttl / 1000)
+            if ttl > 0:
+                self.l1.set_local(key, value, ttl)
+            found[key] = value
+        return found
 
     async def set(self, key: str, value: Any, ttl: int = 300):
-        async with self._lock:
-            import time
-            self._store[key] = (time.time(), ttl, value)
-
-_inmem = InMemoryTTLCache()
-
-_redis_client = None
-try:
-    if REDIS_URL:
-        import aioredis
-
-        async def _get_redis():
-            global _redis_client
-            if _redis_client is None:
-                _redis_client = aioredis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
-            return _redis_client
-
-        async def get_cached(key: str):
-            r = await _get_redis()
-            if r is None:
-                return await _inmem.get(key)
-            data = await r.get(key)
-            return json.loads(data) if data else None
-
-        async def set_cached(key: str, value: Any, ttl: int = 300):
-            r = await _get_redis()
-            if r:
-                await r.set(key, json.dumps(value), ex=ttl)
-            else:
-                await _inmem.set(key, value, ttl)
+        await self.set_many({key: value}, ttl)
+
+    async def set_many(self, items: Dict[str, Any], ttl: int = 300):
+        if not items:
+            return
+        self.l1.set_many_local(items, min(ttl, self.l1_ttl))
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.set(key, cache_codec.encode(value), ex=ttl)
+            pipe.publish(self.channel, json.dumps({"origin": self.origin, "keys": list(items)}))
+            await pipe.execute()
+        except Exception as exc:
+            self._l2_failed(exc)
+            return
+        self.healthy = True
+        self.stats.invalidations_sent += 1
+
+    def _on_invalidation(self, raw):
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError):
+            return
+        if message.get("origin") == self.origin:
+            return
+        self.stats.invalidations_received += 1
+        for key in message.get("keys", ()):
+            self.l1.delete_local(key)
+
+    async def _listen(self):
+        backoff = 0.5
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                # пока подписки не было, чужие записи могли пройти мимо — L1 больше не доверяем
+                self.l1.clear()
+                backoff = 0.5
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._on_invalidation(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._l2_failed(exc)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            self.stats.resubscribes += 1
+            await asyncio.sleep(backoff)
+            backoff = min(30.0, backoff * 2)
+
+    def start(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.ensure_future(self._listen())
+
+    async def close(self):
+        task, self._listener = self._listener, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.redis.aclose()
+        except Exception:
+            pass
+
+    async def health(self) -> Dict[str, Any]:
+        try:
+            await self.redis.ping()
+            self.healthy = True
+        except Exception as exc:
+            self._l2_failed(exc)
+        return {
+            "redis": "ok" if self.healthy else "down",
+            "last_error": self.last_error,
+            "listener": self._listener is not None and not self._listener.done(),
+            **asdict(self.stats),
+        }
+
+
+def _build_tiered_cache() -> Optional[TieredCache]:
+    if not REDIS_URL:
+        return None
+    try:
+        from redis import asyncio as redis_asyncio
+    except ImportError:
+        logger.warning("REDIS_URL задан, но пакет redis не установлен; кеш работает только в памяти")
+        return None
+    client = redis_asyncio.Redis.from_url(
+        REDIS_URL,
+        decode_responses=False,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        health_check_interval=30,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+    )
+    return TieredCache(client, _inmem)
+
+
+_tiered = _build_tiered_cache()
+
+
+def cache_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = _inmem.stats.as_dict()
+    if _tiered is not None:
+        stats["tiers"] = asdict(_tiered.stats)
+    return stats
+
+
+async def cache_health() -> Dict[str, Any]:
+    if _tiered is None:
+        return {"redis": "disabled", **_inmem.stats.as_dict()}
+    return await _tiered.health()
+
+
+def start_cache():
+    _inmem.start_sweeper()
+    if _tiered is not None:
+        _tiered.start()
+
+
+async def close_cache():
+    await _inmem.stop_sweeper()
+    if _tiered is not None:
+        await _tiered.close()
+
+
+async def get_cached(key: str):
+    if _tiered is not None:
+        return await _tiered.get(key)
+    return await _inmem.get(key)
+
+
+async def set_cached(key: str, value: Any, ttl: int = 300):
+    if _tiered is not None:
+        await _tiered.set(key, value, ttl)
     else:
-        async def get_cached(key: str):
-            return await _inmem.get(key)
+        await _inmem.set(key, value, ttl)
+
 
-        async def set_cached(key: str, value: Any, ttl: int = 300):
-            await _inmem.set(key, value, ttl)
-except Exception:
-    async def get_cached(key: str):
-        return await _inmem.get(key)
+async def get_many(keys: Iterable[str]) -> Dict[str, Any]:
+    if _tiered is not None:
+        return await _tiered.get_many(keys)
+    return await _inmem.get_many(keys)
 
-    async def set_cached(key: str, value: Any, ttl: int = 300):
-        await _inmem.set(key, value, ttl)
\ No newline at end of file
+
+async def set_many(items: Dict[str, Any], ttl: int = 300):
+    if _tiered is not None:
+        await _tiered.set_many(items, ttl)
+    else:
+        await _inmem.set_many(items, ttl)
@@ -0,0 +1,227 @@
+import json
+import struct
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+# формат записи в Redis: 1 байт тега + тело; L1 хранит обычные объекты и кодек не использует
+TAG_JSON = b"J"
+TAG_ENVELOPE = b"E"
+TAG_CURRENT = b"C"
+TAG_FORECAST = b"F"
+
+_ENVELOPE = struct.Struct("<d")
+_CURRENT = struct.Struct("<Hqiddid")
+_FORECAST = struct.Struct("<iH")
+_DAY = struct.Struct("<Hidddddd")
+_STR_LEN = struct.Struct("<H")
+
+_DAY_FLOATS = ("temp_min", "temp_max", "temp_avg", "feels_like_avg", "wind_speed_avg", "humidity_avg")
+_DAY_KEYS = frozenset(("date", "main", "description") + _DAY_FLOATS)
+
+
+class CodecError(Exception):
+    pass
+
+
+def trim_current_weather(data: Dict[str, Any]) -> Dict[str, Any]:
+    # оставляем только то, что показываем пользователю и проверяем в алертах
+    main = data.get("main") or {}
+    wind = data.get("wind") or {}
+    weather = data.get("weather") or []
+    trimmed: Dict[str, Any] = {
+        "main": {k: float(main[k]) for k in ("temp", "feels_like") if _is_number(main.get(k))},
+        "wind": {"speed": float(wind["speed"])} if _is_number(wind.get("speed")) else {},
+        "weather": [],
+    }
+    if _is_number(main.get("humidity")):
+        trimmed["main"]["humidity"] = int(main["humidity"])
+    if weather:
+        first = weather[0]
+        trimmed["weather"].append({k: first[k] for k in ("main", "description") if first.get(k) is not None})
+    for key in ("name", "dt", "timezone"):
+        if data.get(key) is not None:
+            trimmed[key] = data[key]
+    return trimmed
+
+
+def _pack_str(value: str) -> bytes:
+    raw = value.encode("utf-8")
+    return _STR_LEN.pack(len(raw)) + raw
+
+
+def _unpack_str(buf: memoryview, offset: int) -> Tuple[str, int]:
+    (length,) = _STR_LEN.unpack_from(buf, offset)
+    offset += _STR_LEN.size
+    return bytes(buf[offset:offset + length]).decode("utf-8"), offset + length
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _encode_current(data: Dict[str, Any]) -> Optional[bytes]:
+    if set(data) - {"main", "wind", "weather", "name", "dt", "timezone"}:
+        return None
+    main, wind, weather = data.get("main"), data.get("wind"), data.get("weather")
+    if not isinstance(main, dict) or not isinstance(wind, dict) or not isinstance(weather, list) or len(weather) > 1:
+        return None
+    if set(main) - {"temp", "feels_like", "humidity"} or set(wind) - {"speed"}:
+        return None
+    first = weather[0] if weather else {}
+    if set(first) - {"main", "description"}:
+        return None
+
+    ints = {"dt": data.get("dt"), "timezone": data.get("timezone"), "humidity": main.get("humidity")}
+    floats = {"temp": main.get("temp"), "feels_like": main.get("feels_like"), "speed": wind.get("speed")}
+    # целые должны вернуться целыми, иначе round-trip не точный — такие записи идут через JSON
+    if any(v is not None and (not isinstance(v, int) or isinstance(v, bool)) for v in ints.values()):
+        return None
+    if any(v is not None and not _is_number(v) for v in floats.values()):
+        return None
+    strings = (data.get("name"), first.get("main"), first.get("description"))
+    if any(s is not None and not isinstance(s, str) for s in strings):
+        return None
+
+    present = (
+        ints["dt"], ints["timezone"], floats["temp"], floats["feels_like"], ints["humidity"], floats["speed"],
+    ) + strings
+    mask = sum(1 << bit for bit, value in enumerate(present) if value is not None)
+    if weather:
+        mask |= 1 << 9
+    head = _CURRENT.pack(
+        mask,
+        ints["dt"] or 0,
+        ints["timezone"] or 0,
+        floats["temp"] or 0.0,
+        floats["feels_like"] or 0.0,
+        ints["humidity"] or 0,
+        floats["speed"] or 0.0,
+    )
+    return head + b"".join(_pack_str(s) for s in strings if s is not None)
+
+
+def _decode_current(buf: memoryview) -> Dict[str, Any]:
+    mask, dt, tz, temp, feels, humidity, speed = _CURRENT.unpack_from(buf, 0)
+    offset = _CURRENT.size
+    strings: List[Optional[str]] = []
+    for bit in (6, 7, 8):
+        if mask & (1 << bit):
+            value, offset = _unpack_str(buf, offset)
+            strings.append(value)
+        else:
+            strings.append(None)
+    name, weather_main, description = strings
+
+    main = {}
+    for bit, key, value in ((2, "temp", temp), (3, "feels_like", feels), (4, "humidity", humidity)):
+        if mask & (1 << bit):
+            main[key] = value
+    data: Dict[str, Any] = {
+        "main": main,
+        "wind": {"speed": speed} if mask & (1 << 5) else {},
+        "weather": [],
+    }
+    if mask & (1 << 9):
+        first = {}
+        if weather_main is not None:
+            first["main"] = weather_main
+        if description is not None:
+            first["description"] = description
+        data["weather"].append(first)
+    if name is not None:
+        data["name"] = name
+    if mask & 1:
+        data["dt"] = dt
+    if mask & 2:
+        data["timezone"] = tz
+    return data
+
+
+def _encode_forecast(value: Any) -> Optional[bytes]:
+    if not isinstance(value, (tuple, list)) or len(value) != 2:
+        return None
+    days, timezone_offset = value
+    if not isinstance(days, list) or not isinstance(timezone_offset, int) or isinstance(timezone_offset, bool):
+        return None
+    parts = [_FORECAST.pack(timezone_offset, len(days))]
+    for day in days:
+        if not isinstance(day, dict) or set(day) != _DAY_KEYS:
+            return None
+        day_date = day["date"]
+        if type(day_date) is not date:
+            return None
+        floats = [day[key] for key in _DAY_FLOATS]
+        if any(v is not None and not _is_number(v) for v in floats):
+            return None
+        strings = (day["main"], day["description"])
+        if any(s is not None and not isinstance(s, str) for s in strings):
+            return None
+        mask = sum(1 << bit for bit, v in enumerate(floats + list(strings)) if v is not None)
+        parts.append(_DAY.pack(mask, day_date.toordinal(), *(float(v or 0.0) for v in floats)))
+        parts.extend(_pack_str(s) for s in strings if s is not None)
+    return b"".join(parts)
+
+
+def _decode_forecast(buf: memoryview) -> Tuple[List[Dict[str, Any]], int]:
+    timezone_offset, count = _FORECAST.unpack_from(buf, 0)
+    offset = _FORECAST.size
+    days = []
+    for _ in range(count):
+        mask, ordinal, *floats = _DAY.unpack_from(buf, offset)
+        offset += _DAY.size
+        day: Dict[str, Any] = {"date": date.fromordinal(ordinal)}
+        for bit, key in enumerate(_DAY_FLOATS):
+            day[key] = floats[bit] if mask & (1 << bit) else None
+        for bit, key in ((6, "main"), (7, "description")):
+            if mask & (1 << bit):
+                day[key], offset = _unpack_str(buf, offset)
+            else:
+                day[key] = None
+        days.append(day)
+    return days, timezone_offset
+
+
+def _json_default(value: Any):
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def _json_hook(obj: Dict[str, Any]):
+    if len(obj) == 1 and "$date" in obj:
+        return date.fromisoformat(obj["$date"])
+    return obj
+
+
+def encode(value: Any) -> bytes:
+    if isinstance(value, dict) and set(value) == {"v", "ts"} and _is_number(value["ts"]):
+        return TAG_ENVELOPE + _ENVELOPE.pack(float(value["ts"])) + encode(value["v"])
+    try:
+        if isinstance(value, dict) and "main" in value:
+            body = _encode_current(value)
+            if body is not None:
+                return TAG_CURRENT + body
+        body = _encode_forecast(value)
+        if body is not None:
+            return TAG_FORECAST + body
+    except struct.error:
+        pass  # значение не влезает в поля записи (длинная строка, большое число)
+    return TAG_JSON + json.dumps(value, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode(raw: bytes) -> Any:
+    buf = memoryview(raw)
+    tag = bytes(buf[:1])
+    try:
+        if tag == TAG_ENVELOPE:
+            (ts,) = _ENVELOPE.unpack_from(buf, 1)
+            return {"v": decode(bytes(buf[1 + _ENVELOPE.size:])), "ts": ts}
+        if tag == TAG_CURRENT:
+            return _decode_current(buf[1:])
+        if tag == TAG_FORECAST:
+            return _decode_forecast(buf[1:])
+        if tag == TAG_JSON:
+            return json.loads(bytes(buf[1:]), object_hook=_json_hook)
+    except (struct.error, UnicodeDecodeError, ValueError) as exc:
+        raise CodecError(f"Corrupted cache entry: {exc}") from exc
+    raise CodecError(f"Unknown cache entry tag: {tag!r}")
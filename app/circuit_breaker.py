@@ -0,0 +1,140 @@
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from .quota import is_owm_url
+
+logger = logging.getLogger(__name__)
+
+# после BREAKER_FAILURE_THRESHOLD сбоев подряд перестаём ходить в OWM на BREAKER_RESET_SECONDS,
+# затем пропускаем один пробный запрос
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+@dataclass
+class BreakerStats:
+    opened: int = 0
+    closed: int = 0
+    half_opened: int = 0
+    rejected: int = 0
+    probes: int = 0
+    failures: int = 0
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self.stats = BreakerStats()
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self.stats.opened += 1
+            self._opened_at = self._clock()
+        elif state == HALF_OPEN:
+            self.stats.half_opened += 1
+        else:
+            self.stats.closed += 1
+        self._probe_started = None
+
+    def allow(self) -> bool:
+        now = self._clock()
+        if self.state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        if self.state == CLOSED:
+            return True
+        # в half-open пропускаем один пробный запрос; зависший пробник не держит выключатель вечно
+        if self.state == HALF_OPEN and (
+            self._probe_started is None or now - self._probe_started >= self.reset_timeout
+        ):
+            self._probe_started = now
+            self.stats.probes += 1
+            return True
+        self.stats.rejected += 1
+        return False
+
+    def release_probe(self):
+        # пробный запрос так и не ушёл (например, не хватило квоты) — слот достаётся следующему вызову
+        if self.state == HALF_OPEN:
+            self._probe_started = None
+
+    def record_success(self):
+        self._failures = 0
+        if self.state != CLOSED:
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        self.stats.failures += 1
+        if self.state == HALF_OPEN:
+            self._transition(OPEN)
+            return
+        self._failures += 1
+        if self.state == CLOSED and self._failures >= self.failure_threshold:
+            self._transition(OPEN)
+
+    def reset(self):
+        self.state = CLOSED
+        self._failures = 0
+        self._probe_started = None
+        self.stats = BreakerStats()
+
+    def as_dict(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._failures, **asdict(self.stats)}
+
+
+# один набор выключателей на процесс: все вызовы weather_client видят одно и то же состояние OWM
+owm_breakers: Dict[str, CircuitBreaker] = {
+    "weather": CircuitBreaker("weather"),
+    "forecast": CircuitBreaker("forecast"),
+    "geo": CircuitBreaker("geo"),
+}
+
+
+def breaker_for(url: str) -> Optional[CircuitBreaker]:
+    if not is_owm_url(url):
+        return None
+    path = urlsplit(url).path
+    if path.startswith("/geo/"):
+        return owm_breakers["geo"]
+    if path.endswith("/forecast"):
+        return owm_breakers["forecast"]
+    if path.endswith("/weather"):
+        return owm_breakers["weather"]
+    return None
+
+
+def breaker_states() -> Dict[str, dict]:
+    return {name: breaker.as_dict() for name, breaker in owm_breakers.items()}
+
+
+def reset_breakers():
+    for breaker in owm_breakers.values():
+        breaker.reset()
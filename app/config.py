@@ -19,7 +19,8 @@ def get_settings() -> Settings:
         postgres_db=os.getenv("POSTGRES_DB", "weather_db"),
         postgres_host=os.getenv("POSTGRES_HOST", "weather-postgres"),
         postgres_port=os.getenv("POSTGRES_PORT", "5432"),
-        openweather_api_key=os.getenv("OPENWEATHER_API_KEY", ""),
+        # легаси-бот (bot.py) настраивался через OPEN_WEATHER_KEY / OWM_KEY
+        openweather_api_key=os.getenv("OPENWEATHER_API_KEY") or os.getenv("OPEN_WEATHER_KEY") or os.getenv("OWM_KEY", ""),
     )
 
 settings = get_settings()
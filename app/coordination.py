@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+import time
+import zlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# single — одна реплика (по умолчанию); leader — рассылку делает только держатель advisory lock;
+# shard — каждая реплика ведёт свою долю городов и подхватывает доли упавших реплик
+COORDINATION_MODE = os.getenv("COORDINATION_MODE", "single")
+SHARD_COUNT = int(os.getenv("COORDINATION_SHARD_COUNT", "1"))
+SHARD_INDEX = int(os.getenv("COORDINATION_SHARD_INDEX", "0"))
+LOCK_KEY = int(os.getenv("COORDINATION_LOCK_KEY", "5130904"))
+HEARTBEAT_SECONDS = int(os.getenv("COORDINATION_HEARTBEAT_SECONDS", "10"))
+
+OwnsCity = Callable[[str], bool]
+
+
+def city_shard(city: str, shard_count: int) -> int:
+    return zlib.crc32(city.strip().lower().encode("utf-8")) % shard_count
+
+
+class Coordinator:
+    def __init__(
+        self,
+        engine=None,
+        mode: str = COORDINATION_MODE,
+        shard_index: int = SHARD_INDEX,
+        shard_count: int = SHARD_COUNT,
+        lock_key: int = LOCK_KEY,
+        clock: Callable[[], float] = time.time,
+    ):
+        if mode not in ("single", "leader", "shard"):
+            raise ValueError(f"Unknown coordination mode: {mode}")
+        if mode != "single" and engine is None:
+            raise ValueError("engine is required for multi-replica coordination")
+        if mode == "shard" and not 0 <= shard_index < shard_count:
+            raise ValueError(f"Shard index {shard_index} is out of range 0..{shard_count - 1}")
+        self.engine = engine
+        self.mode = mode
+        self.shard_index = shard_index
+        self.shard_count = shard_count if mode == "shard" else 1
+        self.lock_key = lock_key
+        self._conn = None
+        # heartbeat и рассылка идут из разных задач, а asyncpg не допускает параллельных запросов в одном коннекте
+        self._conn_lock = asyncio.Lock()
+        self._held: Set[int] = set()
+        # ключ подхваченной доли -> минута, в которую её разослали
+        self._adopted: Dict[int, int] = {}
+        self._clock = clock
+        self.transitions: List[str] = []
+
+    def _shard_key(self, shard: int) -> int:
+        return self.lock_key + 1 + shard
+
+    def _minute(self) -> int:
+        return int(self._clock() // 60)
+
+    @property
+    def is_leader(self) -> bool:
+        if self.mode == "single":
+            return True
+        if self.mode == "leader":
+            return self.lock_key in self._held
+        return self._shard_key(self.shard_index) in self._held
+
+    async def _connection(self):
+        if self._conn is None:
+            # AUTOCOMMIT: advisory lock уровня сессии живёт, пока жив коннект, без висящей транзакции
+            conn = await self.engine.connect()
+            self._conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        return self._conn
+
+    async def _drop_connection(self):
+        conn, self._conn = self._conn, None
+        if self._held:
+            self._note("lost", sorted(self._held))
+        self._held.clear()
+        self._adopted.clear()
+        if conn is not None:
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+    def _note(self, event: str, keys):
+        message = f"{event}:{keys}"
+        self.transitions.append(message)
+        logger.info(f"Coordination ({self.mode}) {message}")
+
+    async def _scalar(self, sql: str, **params):
+        async with self._conn_lock:
+            conn = await self._connection()
+            return await conn.scalar(text(sql), params)
+
+    async def _try_lock(self, key: int) -> bool:
+        acquired = bool(await self._scalar("SELECT pg_try_advisory_lock(:key)", key=key))
+        if acquired:
+            self._held.add(key)
+        return acquired
+
+    async def _unlock(self, key: int):
+        if key not in self._held:
+            return
+        await self._scalar("SELECT pg_advisory_unlock(:key)", key=key)
+        self._held.discard(key)
+        self._adopted.pop(key, None)
+
+    async def _release_adopted(self):
+        # чужую долю держим до конца минуты: иначе реплика, чей cron сработал чуть позже,
+        # подхватит её снова и разошлёт ту же минуту повторно
+        minute = self._minute()
+        for key in [key for key, adopted_at in self._adopted.items() if adopted_at != minute]:
+            await self._unlock(key)
+
+    async def heartbeat(self) -> bool:
+        if self.mode == "single":
+            return True
+        own_key = self.lock_key if self.mode == "leader" else self._shard_key(self.shard_index)
+        try:
+            await self._release_adopted()
+            if own_key in self._held:
+                # коннект мог умереть вместе с блокировкой — проверяем, что сессия жива
+                await self._scalar("SELECT 1")
+            elif await self._try_lock(own_key):
+                self._note("acquired", [own_key])
+        except Exception as exc:
+            logger.warning(f"Coordination heartbeat failed: {exc}")
+            await self._drop_connection()
+        return self.is_leader
+
+    def owns(self, city: str) -> bool:
+        if self.mode == "shard":
+            return self.is_leader and city_shard(city, self.shard_count) == self.shard_index
+        return self.is_leader
+
+    @asynccontextmanager
+    async def broadcast_turn(self) -> AsyncIterator[Optional[OwnsCity]]:
+        if self.mode == "single":
+            yield lambda city: True
+            return
+
+        await self.heartbeat()
+
+        if self.mode == "leader":
+            yield (lambda city: True) if self.is_leader else None
+            return
+
+        shards: Set[int] = {self.shard_index} if self.is_leader else set()
+        adopted: List[int] = []
+        minute = self._minute()
+        try:
+            for shard in range(self.shard_count):
+                if shard == self.shard_index:
+                    continue
+                key = self._shard_key(shard)
+                if key in self._adopted:
+                    # эту долю мы уже разослали в текущую минуту
+                    continue
+                # свободный ключ чужой доли означает, что её реплика недоступна — обрабатываем долю сами
+                if await self._try_lock(key):
+                    self._adopted[key] = minute
+                    adopted.append(key)
+                    shards.add(shard)
+        except Exception as exc:
+            logger.warning(f"Coordination shard probe failed: {exc}")
+            await self._drop_connection()
+            adopted.clear()
+            shards.clear()
+
+        if adopted:
+            self._note("adopted", adopted)
+
+        if not shards:
+            yield None
+        else:
+            yield lambda city: city_shard(city, self.shard_count) in shards
+
+    async def close(self):
+        await self._drop_connection()
@@ -0,0 +1,102 @@
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .models import CityCoordinates
+
+logger = logging.getLogger(__name__)
+
+GEOCODE_LRU_SIZE = int(os.getenv("GEOCODE_LRU_SIZE", "5000"))
+
+Coordinates = Tuple[float, float]
+
+
+def normalize_city_name(city: str) -> str:
+    return " ".join(city.strip().lower().split())
+
+
+@dataclass
+class CoordinatesStats:
+    lru_hits: int = 0
+    db_hits: int = 0
+    misses: int = 0
+    db_errors: int = 0
+
+
+class CoordinatesStore:
+    def __init__(self, max_entries: int = GEOCODE_LRU_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._lru: "OrderedDict[str, Coordinates]" = OrderedDict()
+        self._session_maker = None
+        self.stats = CoordinatesStats()
+
+    def attach(self, session_maker):
+        # Postgres-слой подключается жизненным циклом приложения; без него работает только LRU
+        self._session_maker = session_maker
+
+    def detach(self):
+        self._session_maker = None
+
+    def _remember(self, name: str, coords: Coordinates):
+        self._lru[name] = coords
+        self._lru.move_to_end(name)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def get_local(self, city: str) -> Optional[Coordinates]:
+        name = normalize_city_name(city)
+        coords = self._lru.get(name)
+        if coords is not None:
+            self._lru.move_to_end(name)
+        return coords
+
+    async def get(self, city: str) -> Optional[Coordinates]:
+        coords = self.get_local(city)
+        if coords is not None:
+            self.stats.lru_hits += 1
+            return coords
+
+        if self._session_maker is not None:
+            name = normalize_city_name(city)
+            try:
+                async with self._session_maker() as session:
+                    row = await session.scalar(select(CityCoordinates).where(CityCoordinates.name == name))
+            except Exception as exc:
+                self.stats.db_errors += 1
+                logger.warning(f"City coordinates lookup failed for {name}: {exc}")
+                row = None
+            if row is not None:
+                self.stats.db_hits += 1
+                coords = (float(row.lat), float(row.lon))
+                self._remember(name, coords)
+                return coords
+
+        self.stats.misses += 1
+        return None
+
+    async def put(self, city: str, lat: float, lon: float):
+        name = normalize_city_name(city)
+        self._remember(name, (lat, lon))
+        if self._session_maker is None:
+            return
+        try:
+            async with self._session_maker() as session:
+                stmt = pg_insert(CityCoordinates).values(name=name, lat=lat, lon=lon, updated_at=datetime.utcnow())
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[CityCoordinates.name],
+                    set_={"lat": stmt.excluded.lat, "lon": stmt.excluded.lon, "updated_at": stmt.excluded.updated_at},
+                )
+                await session.execute(stmt)
+                await session.commit()
+        except Exception as exc:
+            self.stats.db_errors += 1
+            logger.warning(f"City coordinates save failed for {name}: {exc}")
+
+
+coordinates_store = CoordinatesStore()
@@ -0,0 +1,152 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Optional, Set, TypeVar
+
+T = TypeVar("T")
+
+# хедж выключен по умолчанию: второй запрос тратит квоту OWM
+HEDGE_ENABLED = os.getenv("WEATHER_HEDGE_ENABLED", "0") == "1"
+# дублируем запрос, если он дольше этого перцентиля недавних ответов
+HEDGE_PERCENTILE = float(os.getenv("WEATHER_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("WEATHER_HEDGE_MIN_DELAY_MS", "50")) / 1000
+# пока замеров мало, ориентируемся на p95 из README (~190 мс)
+HEDGE_INITIAL_DELAY = float(os.getenv("WEATHER_HEDGE_INITIAL_DELAY_MS", "200")) / 1000
+HEDGE_MIN_SAMPLES = int(os.getenv("WEATHER_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = int(os.getenv("WEATHER_HEDGE_WINDOW", "500"))
+
+_clock = time.monotonic
+
+
+class LatencyWindow:
+    def __init__(self, size: int = HEDGE_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        rank = math.ceil(pct / 100 * len(ordered)) - 1
+        return ordered[max(0, min(len(ordered) - 1, rank))]
+
+
+@dataclass
+class HedgeStats:
+    requests: int = 0
+    hedged: int = 0
+    hedge_wins: int = 0
+    quota_denied: int = 0
+
+    @property
+    def hedge_rate(self) -> float:
+        return self.hedged / self.requests if self.requests else 0.0
+
+
+class Hedger:
+    def __init__(
+        self,
+        enabled: bool = HEDGE_ENABLED,
+        percentile: float = HEDGE_PERCENTILE,
+        min_delay: float = HEDGE_MIN_DELAY,
+        initial_delay: float = HEDGE_INITIAL_DELAY,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        window: int = HEDGE_WINDOW,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        # primary — сколько ждали бы без хеджа, served — сколько ждал вызывающий код
+        self.primary = LatencyWindow(window)
+        self.served = LatencyWindow(window)
+        self.stats = HedgeStats()
+        self._stragglers: Set[asyncio.Task] = set()
+
+    def delay(self) -> float:
+        if len(self.primary) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, self.primary.percentile(self.percentile))
+
+    def _timed(self, send: Callable[[], Awaitable[T]], started: float) -> asyncio.Task:
+        task = asyncio.ensure_future(send())
+        task.add_done_callback(lambda t: t.cancelled() or self.primary.observe(_clock() - started))
+        return task
+
+    def _finish_in_background(self, task: asyncio.Task):
+        # проигравший запрос не отменяем: отмена рвёт HTTP/1.1-соединение, а его время нужно для метрик
+        self._stragglers.add(task)
+        task.add_done_callback(self._stragglers.discard)
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def run(
+        self,
+        send: Callable[[], Awaitable[T]],
+        can_hedge: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> T:
+        started = _clock()
+        if not self.enabled or can_hedge is None:
+            result = await send()
+            self.primary.observe(_clock() - started)
+            return result
+
+        self.stats.requests += 1
+        primary = self._timed(send, started)
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.delay())
+            if not done and await can_hedge():
+                self.stats.hedged += 1
+                tasks.append(asyncio.ensure_future(send()))
+            elif not done:
+                self.stats.quota_denied += 1
+
+            # побеждает первый успешный ответ; ошибка одной копии не отменяет ожидание второй
+            pending = set(tasks)
+            winner = None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        for task in pending:
+            self._finish_in_background(task)
+        if winner is None:
+            raise primary.exception()
+        if winner is not primary:
+            self.stats.hedge_wins += 1
+        self.served.observe(_clock() - started)
+        return winner.result()
+
+    def as_dict(self) -> dict:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "enabled": self.enabled,
+            "requests": self.stats.requests,
+            "hedged": self.stats.hedged,
+            "hedge_rate": round(self.stats.hedge_rate, 3),
+            "hedge_wins": self.stats.hedge_wins,
+            "quota_denied": self.stats.quota_denied,
+            "delay_ms": ms(self.delay()),
+            "unhedged_p95_ms": ms(self.primary.percentile(95)),
+            "unhedged_p99_ms": ms(self.primary.percentile(99)),
+            "served_p95_ms": ms(self.served.percentile(95)),
+            "served_p99_ms": ms(self.served.percentile(99)),
+        }
+
+
+weather_hedger = Hedger()
@@ -0,0 +1,132 @@
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+from .transport import (
+    DNS_CACHE_TTL,
+    HTTP2_ENABLED,
+    OWM_BASE_URL,
+    PREWARM_CONNECTIONS,
+    PREWARM_EXTENSION,
+    DNSCache,
+    build_transport,
+    prewarm,
+)
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = float(os.getenv("WEATHER_HTTP_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("WEATHER_HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("WEATHER_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("WEATHER_HTTP_KEEPALIVE_EXPIRY", "30"))  # секунды
+# простой после реального трафика дольше этого — прогреваем заново, пока пул не закрыл keep-alive соединения
+PREWARM_IDLE_SECONDS = float(os.getenv("WEATHER_PREWARM_IDLE_SECONDS", str(HTTP_KEEPALIVE_EXPIRY * 0.8)))
+
+
+@dataclass
+class PoolStats:
+    requests: int = 0
+    new_connections: int = 0
+    prewarms: int = 0
+
+    @property
+    def reused(self) -> int:
+        return max(0, self.requests - self.new_connections)
+
+    @property
+    def reuse_rate(self) -> float:
+        return self.reused / self.requests if self.requests else 0.0
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused": self.reused,
+            "reuse_rate": round(self.reuse_rate, 3),
+            "prewarms": self.prewarms,
+        }
+
+
+class WeatherHTTPPool:
+    def __init__(
+        self,
+        timeout: float = HTTP_TIMEOUT,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        http2: bool = HTTP2_ENABLED,
+        dns_cache_ttl: float = DNS_CACHE_TTL,
+        base_url: str = OWM_BASE_URL,
+    ):
+        self.timeout = timeout
+        self.http2 = http2
+        self.dns_cache = DNSCache(ttl=dns_cache_ttl) if dns_cache_ttl > 0 else None
+        self.base_url = base_url
+        self.last_used: Optional[float] = None
+        self.warmed_at: Optional[float] = None
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.client: Optional[httpx.AsyncClient] = None
+        self.stats = PoolStats()
+
+    async def _trace(self, event_name: str, info: dict):
+        # httpcore сообщает об установке соединения; запросы без этого события пошли по keep-alive
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.new_connections += 1
+
+    async def _on_request(self, request: httpx.Request):
+        if request.extensions.get(PREWARM_EXTENSION):
+            return
+        self.stats.requests += 1
+        self.last_used = time.monotonic()
+        request.extensions["trace"] = self._trace
+
+    def build_client(self, **kwargs) -> httpx.AsyncClient:
+        if "transport" not in kwargs:
+            kwargs["transport"] = build_transport(
+                self.limits, http2=self.http2, dns_cache=self.dns_cache, verify=kwargs.pop("verify", True)
+            )
+        return httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=self.limits,
+            event_hooks={"request": [self._on_request]},
+            **kwargs,
+        )
+
+    async def start(self, **kwargs) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            self.client = self.build_client(**kwargs)
+        return self.client
+
+    async def prewarm(self, connections: int = PREWARM_CONNECTIONS) -> int:
+        if self.client is None:
+            return 0
+        opened = await prewarm(self.client, self.base_url, connections)
+        self.stats.prewarms += 1
+        self.warmed_at = time.monotonic()
+        return opened
+
+    async def keep_warm(self, idle_seconds: float = PREWARM_IDLE_SECONDS) -> int:
+        # прогреваем один раз после затихшего трафика: простаивающий бот не должен слать HEAD бесконечно
+        if self.last_used is None or (self.warmed_at is not None and self.warmed_at >= self.last_used):
+            return 0
+        if time.monotonic() - self.last_used < idle_seconds:
+            return 0
+        return await self.prewarm()
+
+    async def close(self):
+        client, self.client = self.client, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+            logger.info(f"Weather HTTP pool closed: {self.stats.as_dict()}")
+
+
+# общий клиент к OWM живёт столько же, сколько приложение; его открывает и закрывает main()
+weather_http = WeatherHTTPPool()
@@ -1,11 +1,12 @@
 import asyncio
 import logging
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 
 import httpx
 from aiogram import Bot, Dispatcher, F
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.filters import CommandStart, Command, StateFilter
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.fsm.state import StatesGroup, State
@@ -21,10 +22,31 @@ from .weather_client import (
     format_single_forecast,
     format_weather_message,
     format_weekly_forecast,
+    forecast_cache_stats,
     get_current_weather,
     get_daily_forecast,
+    peek_many_current_weather,
+    rehydrate_cache,
+    WeatherUnavailableError,
 )
 from .alerts import check_extreme_weather
+from .broadcast import RetryDelivery, run_broadcast
+from .telegram_sender import create_bot_session, telegram_sender
+from .schedule_index import DEFAULT_NOTIFICATION_TIME, fetch_index_rows, subscription_index
+from .prefetch import WeatherPrefetcher
+from .outbox import STATUS_PENDING, STATUS_SENDING, OutboxStore, OutboxWorkerPool, run_key_for
+from .coordination import HEARTBEAT_SECONDS, Coordinator
+from .geocoding import coordinates_store
+from .http_pool import PREWARM_IDLE_SECONDS, weather_http
+from .cache import cache_stats, close_cache, start_cache
+from .snapshots import SNAPSHOT_FLUSH_SECONDS, snapshot_store
+from .swr import swr_stats
+from .negative_cache import negative_cache
+from .circuit_breaker import breaker_states
+from .hedging import weather_hedger
+from .quota import BROADCAST, PREFETCH, owm_quota, quota_priority
+from .singleflight import weather_flight
+from .retry import request_metrics
 
 if not os.path.exists("logs"):
     os.makedirs("logs")
@@ -41,7 +63,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-DEFAULT_NOTIFICATION_TIME = "06:00"
+INDEX_RECONCILE_MINUTES = int(os.getenv("SUBSCRIPTION_INDEX_RECONCILE_MINUTES", "15"))
+
+# pipeline — отправка прямо из памяти; outbox — через таблицу delivery_outbox с пулом воркеров
+DELIVERY_MODE = os.getenv("DAILY_DELIVERY_MODE", "pipeline")
+
+weather_prefetcher = WeatherPrefetcher(subscription_index)
+coordinator = Coordinator(engine)
+scheduler = AsyncIOScheduler(timezone="UTC")
+OUTBOX_JOB_ID = "outbox_delivery_job"
+# прогоны, запланированные этой репликой: итоги доставки по ним пишем в лог, пока строки не завершатся
+outbox_open_runs: set[str] = set()
 
 class CityForm(StatesGroup):
     waiting_for_city = State()
@@ -304,7 +336,6 @@ async def set_notification_time_handler(message: Message, state: FSMContext):
     try:
         async with async_session_maker() as session:
             await save_notification_time(session, user.id, normalized)
-            asyncio.create_task(send_daily_weather(message.bot, None, normalized))
     except Exception as e:
         logger.exception(f"Error saving notification time for user {user.id}: {e}")
         await message.answer("Не удалось сохранить время уведомлений. Попробуйте ещё раз.")
@@ -335,6 +366,9 @@ async def cmd_set_city(message: Message):
 
         try:
             await get_current_weather(city)
+        except WeatherUnavailableError:
+            await message.answer("Сервис погоды временно недоступен, попробуйте позже.")
+            return
         except Exception as e:
             await message.answer(f"Не удалось найти город: {city}. Проверьте правильность написания.")
             return
@@ -356,6 +390,9 @@ async def cmd_set_city(message: Message):
 
             await session.commit()
 
+        if user.id is not None:
+            subscription_index.update_city(user.id, city)
+
         await message.answer(f"Окей, буду слать погоду для города: <b>{city}</b>", parse_mode="HTML")
         logger.info(f"City for user {message.from_user.id} set to {city}")
     except Exception as e:
@@ -369,6 +406,9 @@ async def process_city(message: Message, state: FSMContext):
         return
     try:
         await get_current_weather(city)
+    except WeatherUnavailableError:
+        await message.answer("Сервис погоды временно недоступен, попробуйте позже.")
+        return
     except Exception as e:
         await message.answer(f"Не удалось найти город: {city}. Проверьте правильность написания.")
         return
@@ -390,6 +430,9 @@ async def process_city(message: Message, state: FSMContext):
 
         await session.commit()
 
+    if user.id is not None:
+        subscription_index.update_city(user.id, city)
+
     await state.clear()
 
     await message.answer(
@@ -441,6 +484,8 @@ async def unsubscribe_daily(message: Message):
         user.subscribed = False
         await session.commit()
 
+    subscription_index.remove(user.id)
+
     await message.answer("Вы отписались от ежедневных уведомлений о погоде.")
 
 async def ask_notification_time(message: Message, state: FSMContext):
@@ -484,6 +529,10 @@ async def save_notification_time(session, user_id: int, notification_time: str):
 
     await session.commit()
 
+    user = await session.scalar(select(User).where(User.id == user_id))
+    if user is not None and user.telegram_id is not None:
+        subscription_index.upsert(user_id, user.telegram_id, user.city or subscription.city, normalized_time)
+
 async def process_notification_time(message: Message, state: FSMContext):
     time_input = message.text.strip()
 
@@ -532,6 +581,10 @@ async def process_notification_time(message: Message, state: FSMContext):
         reply_markup=main_menu_keyboard(),
     )
 
+    # превью только этому пользователю; общую рассылку в это время сделает планировщик
+    if db_user.city:
+        await send_daily_weather_to_user(message.bot, message.from_user.id, db_user.city)
+
 
 
 
@@ -605,76 +658,244 @@ async def process_notification_choice(message: Message, state: FSMContext):
     logger.info(
         f"User {message.from_user.id} subscribed to daily weather updates for {user.city} at {normalized_time}"
     )
+    await send_daily_weather_to_user(message.bot, message.from_user.id, user.city)
 
 
 
-async def send_daily_weather(bot, http_client: httpx.AsyncClient | None = None, current_time: Optional[str] = None):
-    created_client = False
-    if http_client is None:
-        http_client = httpx.AsyncClient()
-        created_client = True
+async def _load_users_by_city(target_time: str) -> dict[str, list[int]]:
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(User, Subscription)
+            .join(Subscription, Subscription.user_id == User.id)
+            .where(
+                Subscription.daily_notifications == True,
+                User.city.isnot(None),
+                func.coalesce(
+                    Subscription.notification_time,
+                    DEFAULT_NOTIFICATION_TIME
+                ) == target_time,
+            )
+        )
+        rows = result.all()
 
-    try:
-        target_time = current_time if current_time is not None else datetime.utcnow().strftime("%H:%M")
-        logger.info(f"Starting daily weather broadcast for {target_time}")
+        filtered_rows = [
+            (user, sub)
+            for user, sub in rows
+            if (sub.notification_time or DEFAULT_NOTIFICATION_TIME) == target_time
+        ]
+
+        if not filtered_rows:
+            return {}
+
+    users_by_city: dict[str, list[int]] = {}
+    for user, sub in filtered_rows:
+        city = user.city or sub.city
+        if not city:
+            continue
+        users_by_city.setdefault(city, []).append(user.telegram_id)
+    return users_by_city
 
+
+async def reconcile_subscription_index():
+    subscription_index.begin_reconcile()
+    try:
         async with async_session_maker() as session:
-            result = await session.execute(
-                select(User, Subscription)
-                .join(Subscription, Subscription.user_id == User.id)
-                .where(
-                    Subscription.daily_notifications == True,
-                    User.city.isnot(None),
-                    func.coalesce(
-                        Subscription.notification_time,
-                        DEFAULT_NOTIFICATION_TIME
-                    ) == target_time,
-                )
-            )
-            rows = result.all()
+            rows = await fetch_index_rows(session)
+    except Exception:
+        subscription_index.abort_reconcile()
+        raise
+    drift = subscription_index.finish_reconcile(rows)
+    logger.info(f"Subscription index reconciled: {len(subscription_index)} entries, drift={drift}")
 
-            filtered_rows = [
-                (user, sub)
-                for user, sub in rows
-                if (sub.notification_time or DEFAULT_NOTIFICATION_TIME) == target_time
-            ]
 
-            if not filtered_rows:
-                logger.info("No users for this notification time.")
-                return
+async def prefetch_upcoming_weather(http_client: httpx.AsyncClient | None = None):
+    async def fetch(city: str):
+        return await get_current_weather(city, http_client, ttl=weather_prefetcher.prefetch_ttl)
 
-        users_by_city: dict[str, list[int]] = {}
-        for user, sub in filtered_rows:
-            city = user.city or sub.city
-            if not city:
-                continue
-            users_by_city.setdefault(city, []).append(user.telegram_id)
+    if not coordinator.is_leader:
+        return
 
-        for city, chat_ids in users_by_city.items():
-            try:
+    try:
+        with quota_priority(PREFETCH):
+            await weather_prefetcher.run(datetime.utcnow(), fetch, coordinator.owns)
+    except Exception as e:
+        logger.exception(f"Weather prefetch failed: {e}")
+
+
+async def deliver_outbox(bot):
+    async def send_text(chat_id: int, text: str):
+        await telegram_sender.send(bot, chat_id, text, parse_mode="HTML")
+
+    store = OutboxStore(async_session_maker)
+    pool = OutboxWorkerPool(store, send_text)
+    try:
+        stats = await pool.drain()
+    except Exception as e:
+        logger.exception(f"Outbox delivery failed: {e}")
+        return
+    if stats.claimed:
+        logger.info(
+            f"Outbox drained: claimed={stats.claimed}, sent={stats.sent}, "
+            f"retried={stats.retried}, failed={stats.failed}, elapsed={stats.elapsed:.2f}s"
+        )
+    await _report_outbox_runs(store)
+
+
+async def _report_outbox_runs(store: OutboxStore):
+    for run_key in sorted(outbox_open_runs):
+        try:
+            counts = await store.run_counts(run_key)
+        except Exception as e:
+            logger.warning(f"Outbox run {run_key} counts unavailable: {e}")
+            return
+        if counts.get(STATUS_PENDING) or counts.get(STATUS_SENDING):
+            logger.info(f"Outbox run {run_key} delivery counts so far: {counts}")
+            continue
+        logger.info(f"Outbox run {run_key} delivered: {counts}")
+        outbox_open_runs.discard(run_key)
+
+
+def wake_outbox_delivery():
+    # доставки шлёт только job outbox; после планирования запускаем его сразу, не дожидаясь интервала.
+    # Если он уже идёт, то сам доберёт новые строки: воркеры берут пачки, пока очередь не опустеет
+    job = scheduler.get_job(OUTBOX_JOB_ID)
+    if job is not None:
+        job.modify(next_run_time=datetime.now(timezone.utc))
+
+
+async def purge_outbox():
+    try:
+        removed = await OutboxStore(async_session_maker).purge()
+    except Exception as e:
+        logger.exception(f"Outbox purge failed: {e}")
+        return
+    if removed:
+        logger.info(f"Outbox purge removed {removed} finished deliveries")
+
+
+def _daily_texts(city: str, data: dict) -> list[str]:
+    daily_text = "Ежедневный прогноз 🌤\n\n" + format_weather_message(city, data)
+    alert_text = check_extreme_weather(data)
+    return [daily_text, alert_text] if alert_text else [daily_text]
+
+
+async def send_daily_weather_to_user(bot, chat_id: int, city: str) -> bool:
+    try:
+        data = await get_current_weather(city)
+        texts = _daily_texts(city, data)
+    except Exception as e:
+        logger.exception(f"Не удалось получить погоду для города {city}: {e}")
+        return False
+
+    for index, text in enumerate(texts):
+        try:
+            await telegram_sender.send(bot, chat_id, text, parse_mode="HTML")
+        except Exception as e:
+            logger.exception(f"Не удалось отправить прогноз пользователю {chat_id}: {e}")
+            return index > 0
+    return True
+
+
+async def _broadcast_to(bot, http_client, target_time: str, users_by_city: dict[str, list[int]]):
+    # все города минуты читаем из кеша одним запросом; в OWM идут только промахи
+    try:
+        cached_weather = await peek_many_current_weather(users_by_city, ttl=weather_prefetcher.tick_ttl)
+    except Exception as e:
+        logger.warning(f"Batched cache read failed for {target_time}: {e}")
+        cached_weather = {}
+
+    async def fetch_city(city: str) -> list[str]:
+        try:
+            data = cached_weather.get(city)
+            weather_prefetcher.record_tick(target_time, city, data is not None)
+            if data is None:
                 try:
                     data = await get_current_weather(city, http_client)
                 except TypeError:
                     data = await get_current_weather(city)
 
-                daily_text = "Ежедневный прогноз 🌤\n\n" + format_weather_message(city, data)
-                alert_text = check_extreme_weather(data)
-            except Exception as e:
-                logger.exception(f"Не удалось получить погоду для города {city}: {e}")
-                continue
+            return _daily_texts(city, data)
+        except Exception as e:
+            logger.exception(f"Не удалось получить погоду для города {city}: {e}")
+            return []
 
-            for chat_id in chat_ids:
-                try:
-                    await bot.send_message(chat_id, daily_text, parse_mode="HTML")
-                except Exception as e:
+    async def send_chat(chat_id: int, texts: list[str]):
+        for index, text in enumerate(texts):
+            try:
+                await telegram_sender.send(bot, chat_id, text, parse_mode="HTML")
+            except TelegramRetryAfter as e:
+                raise RetryDelivery(e.retry_after, texts[index:]) from e
+            except Exception as e:
+                if index == 0:
                     logger.exception(f"Не удалось отправить ежедневный прогноз пользователю {chat_id}: {e}")
+                else:
+                    logger.exception(f"Не удалось отправить экстренное предупреждение пользователю {chat_id}: {e}")
+
+    if DELIVERY_MODE == "outbox":
+        # стадия отправки только планирует доставки; шлют их воркеры outbox
+        city_of_chat = {chat_id: city for city, chat_ids in users_by_city.items() for chat_id in chat_ids}
+        planned: list[tuple[int, str, list[str]]] = []
+
+        async def plan_chat(chat_id: int, texts: list[str]):
+            planned.append((chat_id, city_of_chat[chat_id], list(texts)))
+
+        stats = await run_broadcast(users_by_city, fetch_city, plan_chat)
+        run_key = run_key_for(target_time)
+        store = OutboxStore(async_session_maker)
+        inserted = await store.enqueue(run_key, planned)
+        logger.info(f"Outbox run {run_key}: planned {len(planned)} deliveries, inserted {inserted}")
+        outbox_open_runs.add(run_key)
+        wake_outbox_delivery()
+    else:
+        stats = await run_broadcast(users_by_city, fetch_city, send_chat)
+    logger.info(f"Broadcast stages for {target_time}: {stats.summary()}")
+    logger.info(f"Telegram sender totals: {telegram_sender.stats}")
+    logger.info(f"Weather HTTP pool: {weather_http.stats.as_dict()}, hedging: {weather_hedger.as_dict()}")
+    logger.info(f"OWM circuit breakers: {breaker_states()}, quota: {owm_quota.as_dict()}")
+    logger.info(f"Weather cache: {cache_stats()}, revalidation: {swr_stats}, not found: {negative_cache.stats}")
+    # hits — запросы прогноза, обслуженные общей записью координат без похода в OWM
+    logger.info(f"Forecast cache: {forecast_cache_stats}")
+    flight = weather_flight.stats
+    logger.info(
+        f"Weather single-flight: leaders={flight.leaders}, coalesced={flight.coalesced}, "
+        f"rate={flight.coalesce_rate:.2f}"
+    )
+    logger.info(f"OWM requests by endpoint: {request_metrics.as_dict()}")
+    weather_prefetcher.finish_tick(target_time)
 
-            if alert_text:
-                for chat_id in chat_ids:
-                    try:
-                        await bot.send_message(chat_id, alert_text, parse_mode="HTML")
-                    except Exception as e:
-                        logger.exception(f"Не удалось отправить экстренное предупреждение пользователю {chat_id}: {e}")
+
+async def send_daily_weather(bot, http_client: httpx.AsyncClient | None = None, current_time: Optional[str] = None):
+    created_client = False
+    if http_client is None:
+        http_client = weather_http.client
+    if http_client is None:
+        http_client = httpx.AsyncClient()
+        created_client = True
+
+    try:
+        target_time = current_time if current_time is not None else datetime.utcnow().strftime("%H:%M")
+        logger.info(f"Starting daily weather broadcast for {target_time}")
+
+        async with coordinator.broadcast_turn() as owns_city:
+            if owns_city is None:
+                logger.info(f"Skipping broadcast for {target_time}: another replica owns it")
+                return
+
+            # индекс в памяти видит только изменения своей реплики, а остальные подтягивает лишь сверкой;
+            # при нескольких репликах список получателей минуты берём из БД
+            if coordinator.mode == "single" and subscription_index.loaded:
+                users_by_city = subscription_index.due(target_time)
+            else:
+                users_by_city = await _load_users_by_city(target_time)
+            users_by_city = {city: chat_ids for city, chat_ids in users_by_city.items() if owns_city(city)}
+
+            if not users_by_city:
+                logger.info("No users for this notification time.")
+                return
+
+            # рассылка уступает квоту OWM интерактивным запросам пользователей
+            with quota_priority(BROADCAST):
+                await _broadcast_to(bot, http_client, target_time, users_by_city)
 
         logger.info("Daily weather broadcast succeeded")
     finally:
@@ -727,16 +948,94 @@ async def main():
     if not settings.telegram_bot_token:
         raise RuntimeError("TELEGRAM_BOT_TOKEN не задан в переменных окружения")
 
-    bot = Bot(token=settings.telegram_bot_token)
+    # одна aiohttp-сессия на весь процесс: и ответы, и рассылка идут через общий пул соединений
+    bot = Bot(token=settings.telegram_bot_token, session=create_bot_session())
     dp = Dispatcher(storage=MemoryStorage())
 
     setup_handlers(dp)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
-    async with httpx.AsyncClient(timeout=10.0) as http_client:
-        scheduler = AsyncIOScheduler(timezone="UTC")
+    coordinates_store.attach(async_session_maker)
+    snapshot_store.attach(async_session_maker)
+    start_cache()
+    # после деплоя первые минуты обслуживаем из снимков, а не лавиной запросов к OWM
+    try:
+        restored = await rehydrate_cache()
+        logger.info(f"Weather cache rehydrated from snapshots: {restored} entries")
+    except Exception as e:
+        logger.warning(f"Weather cache warm start failed: {e}")
 
+    # индекс подписок грузим один раз, дальше его обновляют хендлеры и периодическая сверка с БД
+    await reconcile_subscription_index()
+
+    # один пул соединений к OWM на весь процесс: хендлеры, прогрев и рассылка переиспользуют keep-alive
+    http_client = await weather_http.start()
+    try:
+        # DNS, TCP и TLS до OWM проходим заранее, а не в первом пользовательском запросе
+        await weather_http.prewarm()
+        # job только проверяет простой: прогрев повторяется лишь после затихшего реального трафика
+        scheduler.add_job(
+            weather_http.keep_warm,
+            "interval",
+            seconds=max(5, int(PREWARM_IDLE_SECONDS)),
+            id="weather_http_keep_warm",
+            replace_existing=True,
+            max_instances=1,
+        )
+
+        if coordinator.mode != "single":
+            await coordinator.heartbeat()
+            scheduler.add_job(
+                coordinator.heartbeat,
+                "interval",
+                seconds=HEARTBEAT_SECONDS,
+                id="coordination_heartbeat",
+                replace_existing=True,
+                max_instances=1,
+            )
+        scheduler.add_job(
+            snapshot_store.flush,
+            "interval",
+            seconds=SNAPSHOT_FLUSH_SECONDS,
+            id="weather_snapshot_flush",
+            replace_existing=True,
+            max_instances=1,
+        )
+        scheduler.add_job(
+            reconcile_subscription_index,
+            "interval",
+            minutes=INDEX_RECONCILE_MINUTES,
+            id="subscription_index_reconcile",
+            replace_existing=True,
+        )
+        scheduler.add_job(
+            prefetch_upcoming_weather,
+            "cron",
+            minute="*",
+            args=[http_client],
+            id="weather_prefetch_job",
+            replace_existing=True,
+        )
+        if DELIVERY_MODE == "outbox":
+            # добираем доставки, оставшиеся после рестарта или упавшей реплики, и отложенные ретраи
+            scheduler.add_job(
+                deliver_outbox,
+                "interval",
+                seconds=30,
+                args=[bot],
+                id=OUTBOX_JOB_ID,
+                replace_existing=True,
+                max_instances=1,
+            )
+            scheduler.add_job(
+                purge_outbox,
+                "interval",
+                hours=1,
+                id="outbox_purge_job",
+                replace_existing=True,
+                max_instances=1,
+            )
         # при добавлении job передаём client
         scheduler.add_job(
             send_daily_weather,
@@ -752,6 +1051,12 @@ async def main():
             await dp.start_polling(bot)
         finally:
             scheduler.shutdown()
+            await coordinator.close()
+            await bot.session.close()
+    finally:
+        await snapshot_store.flush()
+        await weather_http.close()
+        await close_cache()
 
 if __name__ == "__main__":
     asyncio.run(main())
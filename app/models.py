@@ -1,4 +1,20 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, BigInteger
+from datetime import datetime
+
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
@@ -40,4 +56,54 @@ User.subscriptions = relationship(
     "Subscription",
     order_by=Subscription.id,
     back_populates="user",
-)
\ No newline at end of file
+)
+
+class DeliveryOutbox(Base):
+    __tablename__ = "delivery_outbox"
+    __table_args__ = (
+        UniqueConstraint("run_key", "chat_id", name="uq_delivery_outbox_run_chat"),
+        Index("ix_delivery_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    run_key = Column(String, nullable=False, index=True)
+    chat_id = Column(BigInteger, nullable=False)
+    city = Column(String, nullable=True)
+    texts = Column(JSON, nullable=False)
+    sent_parts = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = Column(DateTime, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return (
+            f"<DeliveryOutbox(id={self.id}, run_key={self.run_key}, chat_id={self.chat_id}, "
+            f"status={self.status}, attempts={self.attempts})>"
+        )
+
+
+class CityCoordinates(Base):
+    __tablename__ = "city_coordinates"
+
+    name = Column(String, primary_key=True)  # нормализованное название города
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<CityCoordinates(name={self.name}, lat={self.lat}, lon={self.lon})>"
+
+
+class WeatherSnapshot(Base):
+    __tablename__ = "weather_snapshots"
+
+    key = Column(String, primary_key=True)  # ключ кеша: current_weather:... или forecast:...
+    payload = Column(LargeBinary, nullable=False)  # значение в формате app.cache_codec
+    fetched_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<WeatherSnapshot(key={self.key}, fetched_at={self.fetched_at})>"
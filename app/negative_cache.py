@@ -0,0 +1,52 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from .cache import get_cached, set_cached
+from .geocoding import normalize_city_name
+
+logger = logging.getLogger(__name__)
+
+# короткий TTL: город могут переименовать или OWM добавит его в базу
+NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", "600"))
+
+
+@dataclass
+class NegativeCacheStats:
+    hits: int = 0
+    stored: int = 0
+
+
+class NegativeCache:
+    # хранит только «город не найден»; сетевые ошибки и 5xx сюда не попадают
+    def __init__(self, ttl: int = NEGATIVE_CACHE_TTL):
+        self.ttl = ttl
+        self.stats = NegativeCacheStats()
+
+    @staticmethod
+    def key(city: str) -> str:
+        return f"notfound:{normalize_city_name(city)}"
+
+    async def check(self, city: str) -> Optional[str]:
+        try:
+            entry = await get_cached(self.key(city))
+        except Exception:
+            return None
+        if entry is None:
+            return None
+        self.stats.hits += 1
+        return entry.get("message") if isinstance(entry, dict) else str(entry)
+
+    async def remember(self, city: str, message: str):
+        if self.ttl <= 0:
+            return
+        try:
+            await set_cached(self.key(city), {"message": message}, ttl=self.ttl)
+        except Exception as exc:
+            logger.warning(f"Negative cache write failed for {city}: {exc}")
+            return
+        self.stats.stored += 1
+
+
+negative_cache = NegativeCache()
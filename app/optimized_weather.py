@@ -1,21 +1,9 @@
-import os
-from .http_client import HTTPClient
-from .cache import get_cached, set_cached
+from typing import Any, Dict, Optional
 
-OWM_URL = "https://api.openweathermap.org/data/2.5/weather"
-OWM_KEY = os.getenv("OWM_KEY")
+from .weather_client import convert_units, get_current_weather
 
-async def get_weather(city: str, units: str = "metric", ttl: int = 300):
-    if not OWM_KEY:
-        raise RuntimeError("OWM_KEY is not set in environment")
 
-    city_key = city.strip().lower()
-    cache_key = f"weather:{city_key}:{units}"
-    cached = await get_cached(cache_key)
-    if cached:
-        return cached
-
-    params = {"q": city, "appid": OWM_KEY, "units": units}
-    data = await HTTPClient.fetch_json(OWM_URL, params=params, timeout=10)
-    await set_cached(cache_key, data, ttl=ttl)
-    return data
\ No newline at end of file
+async def get_weather(city: str, units: str = "metric", ttl: Optional[int] = None) -> Dict[str, Any]:
+    # тонкая обёртка над weather_client: пул, кеш, негативный кеш, квота и ретраи общие с ботом
+    data = await get_current_weather(city) if ttl is None else await get_current_weather(city, ttl=ttl)
+    return convert_units(data, units)
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .models import DeliveryOutbox
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "5"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_BACKOFF_INITIAL = float(os.getenv("OUTBOX_BACKOFF_INITIAL", "5"))  # секунды
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "300"))
+# строки в статусе sending дольше аренды считаются брошенными упавшим воркером
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+# доставленные и окончательно неудавшиеся строки храним для разбора инцидентов, потом удаляем
+OUTBOX_RETENTION_DAYS = float(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+_INSERT_CHUNK = 1000
+
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+# (chat_id, город, тексты сообщений)
+PlannedDelivery = Tuple[int, str, Sequence[str]]
+SendText = Callable[[int, str], Awaitable[None]]
+
+
+def run_key_for(target_time: str, now: Optional[datetime] = None) -> str:
+    now = now or datetime.utcnow()
+    return f"{now.date().isoformat()}T{target_time}"
+
+
+def retry_delay(attempts: int) -> float:
+    return min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_INITIAL * (2 ** max(0, attempts - 1)))
+
+
+@dataclass
+class OutboxItem:
+    id: int
+    chat_id: int
+    texts: List[str]
+    sent_parts: int
+    attempts: int
+
+
+class OutboxStore:
+    def __init__(self, session_maker):
+        self._session_maker = session_maker
+
+    async def enqueue(self, run_key: str, deliveries: Sequence[PlannedDelivery]) -> int:
+        now = datetime.utcnow()
+        rows = [
+            {
+                "run_key": run_key,
+                "chat_id": chat_id,
+                "city": city,
+                "texts": list(texts),
+                "sent_parts": 0,
+                "status": STATUS_PENDING,
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now,
+            }
+            for chat_id, city, texts in deliveries
+        ]
+        inserted = 0
+        async with self._session_maker() as session:
+            for start in range(0, len(rows), _INSERT_CHUNK):
+                # повторное планирование той же минуты не создаёт дублей
+                stmt = (
+                    pg_insert(DeliveryOutbox)
+                    .values(rows[start:start + _INSERT_CHUNK])
+                    .on_conflict_do_nothing(constraint="uq_delivery_outbox_run_chat")
+                )
+                result = await session.execute(stmt)
+                inserted += max(0, result.rowcount or 0)
+            await session.commit()
+        return inserted
+
+    async def claim(self, limit: int) -> List[OutboxItem]:
+        now = datetime.utcnow()
+        lease_expired = now - timedelta(seconds=OUTBOX_LEASE_SECONDS)
+        async with self._session_maker() as session:
+            rows = (
+                await session.scalars(
+                    select(DeliveryOutbox)
+                    .where(
+                        or_(
+                            and_(
+                                DeliveryOutbox.status == STATUS_PENDING,
+                                DeliveryOutbox.next_attempt_at <= now,
+                            ),
+                            and_(
+                                DeliveryOutbox.status == STATUS_SENDING,
+                                DeliveryOutbox.claimed_at < lease_expired,
+                            ),
+                        )
+                    )
+                    .order_by(DeliveryOutbox.id)
+                    .limit(limit)
+                    .with_for_update(skip_locked=True)
+                )
+            ).all()
+            for row in rows:
+                row.status = STATUS_SENDING
+                row.claimed_at = now
+                row.attempts += 1
+            items = [OutboxItem(r.id, r.chat_id, list(r.texts), r.sent_parts, r.attempts) for r in rows]
+            await session.commit()
+        return items
+
+    async def _update(self, item_id: int, **values):
+        async with self._session_maker() as session:
+            await session.execute(update(DeliveryOutbox).where(DeliveryOutbox.id == item_id).values(**values))
+            await session.commit()
+
+    async def mark_sent(self, item: OutboxItem):
+        await self._update(
+            item.id, status=STATUS_SENT, sent_parts=len(item.texts), sent_at=datetime.utcnow(), last_error=None
+        )
+
+    async def mark_retry(self, item: OutboxItem, sent_parts: int, delay: float, error: str) -> bool:
+        if item.attempts >= OUTBOX_MAX_ATTEMPTS:
+            await self.mark_failed(item, sent_parts, error)
+            return False
+        await self._update(
+            item.id,
+            status=STATUS_PENDING,
+            sent_parts=sent_parts,
+            next_attempt_at=datetime.utcnow() + timedelta(seconds=delay),
+            last_error=error[:1000],
+        )
+        return True
+
+    async def mark_failed(self, item: OutboxItem, sent_parts: int, error: str):
+        await self._update(item.id, status=STATUS_FAILED, sent_parts=sent_parts, last_error=error[:1000])
+
+    async def purge(self, retention_days: float = OUTBOX_RETENTION_DAYS, now: Optional[datetime] = None) -> int:
+        cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+        async with self._session_maker() as session:
+            result = await session.execute(
+                delete(DeliveryOutbox).where(
+                    DeliveryOutbox.status.in_((STATUS_SENT, STATUS_FAILED)),
+                    DeliveryOutbox.created_at < cutoff,
+                )
+            )
+            await session.commit()
+        return max(0, result.rowcount or 0)
+
+    async def run_counts(self, run_key: str) -> Dict[str, int]:
+        async with self._session_maker() as session:
+            result = await session.execute(
+                select(DeliveryOutbox.status, func.count())
+                .where(DeliveryOutbox.run_key == run_key)
+                .group_by(DeliveryOutbox.status)
+            )
+            return {status: count for status, count in result.all()}
+
+
+@dataclass
+class OutboxDrainStats:
+    claimed: int = 0
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    per_worker: Dict[int, int] = field(default_factory=dict)
+
+
+class OutboxWorkerPool:
+    def __init__(
+        self,
+        store: OutboxStore,
+        send_text: SendText,
+        workers: int = OUTBOX_WORKERS,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+    ):
+        self.store = store
+        self.send_text = send_text
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+
+    @staticmethod
+    def _count_retry(stats: OutboxDrainStats, retried: bool):
+        if retried:
+            stats.retried += 1
+        else:
+            stats.failed += 1
+
+    async def _deliver(self, item: OutboxItem, stats: OutboxDrainStats):
+        sent_parts = item.sent_parts
+        try:
+            for text in item.texts[sent_parts:]:
+                await self.send_text(item.chat_id, text)
+                sent_parts += 1
+        except TelegramRetryAfter as exc:
+            retried = await self.store.mark_retry(item, sent_parts, exc.retry_after, f"retry after {exc.retry_after}s")
+            self._count_retry(stats, retried)
+            return
+        except (TelegramForbiddenError, TelegramBadRequest) as exc:
+            # бот заблокирован или чат удалён — повтор не поможет
+            stats.failed += 1
+            logger.warning(f"Outbox delivery {item.id} to {item.chat_id} failed permanently: {exc}")
+            await self.store.mark_failed(item, sent_parts, repr(exc))
+            return
+        except Exception as exc:
+            logger.warning(f"Outbox delivery {item.id} to {item.chat_id} failed (attempt {item.attempts}): {exc}")
+            retried = await self.store.mark_retry(item, sent_parts, retry_delay(item.attempts), repr(exc))
+            self._count_retry(stats, retried)
+            return
+        stats.sent += 1
+        await self.store.mark_sent(item)
+
+    async def drain(self) -> OutboxDrainStats:
+        stats = OutboxDrainStats()
+        started = time.perf_counter()
+
+        async def worker(worker_id: int):
+            while True:
+                items = await self.store.claim(self.batch_size)
+                if not items:
+                    return
+                stats.claimed += len(items)
+                stats.per_worker[worker_id] = stats.per_worker.get(worker_id, 0) + len(items)
+                for item in items:
+                    await self._deliver(item, stats)
+
+        await asyncio.gather(*(worker(i) for i in range(self.workers)))
+        stats.elapsed = time.perf_counter() - started
+        return stats
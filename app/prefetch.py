@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from .schedule_index import SubscriptionIndex
+from .ttl_policy import current_soft_ttl
+
+logger = logging.getLogger(__name__)
+
+# soft TTL текущей погоды считается по dt наблюдения и может быть всего CURRENT_MIN_TTL, поэтому рассылка
+# читает прогретые записи с TTL не меньше окна (tick_ttl); окно ограничено, чтобы не слать слишком старые данные
+LOOKAHEAD_MINUTES = max(1, min(4, int(os.getenv("PREFETCH_LOOKAHEAD_MINUTES", "2"))))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "10"))
+
+
+@dataclass
+class PrefetchStats:
+    runs: int = 0
+    warmed: int = 0
+    failed: int = 0
+    tick_hits: int = 0
+    tick_misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.tick_hits + self.tick_misses
+        return self.tick_hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "runs": self.runs,
+            "warmed": self.warmed,
+            "failed": self.failed,
+            "tick_hits": self.tick_hits,
+            "tick_misses": self.tick_misses,
+            "hit_rate": round(self.hit_rate, 3),
+        }
+
+
+class WeatherPrefetcher:
+    def __init__(
+        self,
+        index: SubscriptionIndex,
+        lookahead_minutes: int = LOOKAHEAD_MINUTES,
+        concurrency: int = PREFETCH_CONCURRENCY,
+    ):
+        self.index = index
+        self.lookahead_minutes = lookahead_minutes
+        # столько может пройти от прогрева до конца целевой минуты
+        self.horizon = (lookahead_minutes + 1) * 60
+        self.concurrency = max(1, concurrency)
+        self.stats = PrefetchStats()
+        self._warmed: Dict[str, Set[str]] = {}
+
+    def target_time(self, now: datetime) -> str:
+        return (now + timedelta(minutes=self.lookahead_minutes)).strftime("%H:%M")
+
+    def tick_ttl(self, value: Any, fetched_at: float) -> float:
+        # в тике запись, прогретая для него, свежая, даже если по dt OWM обновит данные раньше
+        return max(current_soft_ttl(value, fetched_at), self.horizon)
+
+    def prefetch_ttl(self, value: Any, fetched_at: float) -> float:
+        # при прогреве свежей считаем только запись, которая доживёт до тика; остальные обновляем сейчас
+        return self.tick_ttl(value, fetched_at) - self.lookahead_minutes * 60
+
+    async def run(
+        self,
+        now: datetime,
+        fetch: Callable[[str], Awaitable[object]],
+        owns_city: Optional[Callable[[str], bool]] = None,
+    ) -> int:
+        if not self.index.loaded:
+            return 0
+
+        target = self.target_time(now)
+        cities = [city for city in self.index.due(target) if owns_city is None or owns_city(city)]
+        self.stats.runs += 1
+        if not cities:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        warmed: Set[str] = set()
+
+        async def warm(city: str):
+            async with semaphore:
+                try:
+                    await fetch(city)
+                except Exception as exc:
+                    self.stats.failed += 1
+                    logger.warning(f"Prefetch failed for {city} ({target}): {exc}")
+                    return
+                warmed.add(city)
+
+        await asyncio.gather(*(warm(city) for city in cities))
+        self.stats.warmed += len(warmed)
+        self._warmed[target] = warmed
+        logger.info(f"Prefetched {len(warmed)}/{len(cities)} cities for {target}")
+        return len(warmed)
+
+    def record_tick(self, target_time: str, city: str, cache_hit: bool):
+        if cache_hit:
+            self.stats.tick_hits += 1
+        else:
+            self.stats.tick_misses += 1
+            if city in self._warmed.get(target_time, ()):
+                logger.info(f"Prefetched entry for {city} expired before {target_time}")
+
+    def finish_tick(self, target_time: str):
+        self._warmed.pop(target_time, None)
+        logger.info(f"Prefetch stats: {self.stats.as_dict()}")
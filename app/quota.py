@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from .rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# лимит тарифа OWM (бесплатный — 60 вызовов в минуту) и запас на всплеск;
+# скорость пополнения считаем так, чтобы в любом минутном окне было не больше лимита
+OWM_CALLS_PER_MINUTE = float(os.getenv("OWM_CALLS_PER_MINUTE", "60"))
+OWM_QUOTA_BURST = float(os.getenv("OWM_QUOTA_BURST", "10"))
+# доля бакета, которую фоновые запросы не трогают: она остаётся интерактивным пользователям
+BROADCAST_RESERVE = float(os.getenv("OWM_QUOTA_BROADCAST_RESERVE", "0.2"))
+PREFETCH_RESERVE = float(os.getenv("OWM_QUOTA_PREFETCH_RESERVE", "0.5"))
+INTERACTIVE_MAX_WAIT = float(os.getenv("OWM_QUOTA_INTERACTIVE_MAX_WAIT", "2"))
+BROADCAST_MAX_WAIT = float(os.getenv("OWM_QUOTA_BROADCAST_MAX_WAIT", "30"))
+# пауза после 429 без Retry-After
+THROTTLE_PAUSE = float(os.getenv("OWM_QUOTA_THROTTLE_PAUSE", "30"))
+
+INTERACTIVE = "interactive"
+BROADCAST = "broadcast"
+PREFETCH = "prefetch"
+# дублирующий запрос хеджа: берёт квоту на тех же условиях, что и prefetch, и никогда не ждёт
+HEDGE = "hedge"
+
+_priority: ContextVar[str] = ContextVar("owm_quota_priority", default=INTERACTIVE)
+_sleep = asyncio.sleep
+
+
+class QuotaExceededError(Exception):
+    pass
+
+
+@dataclass
+class PriorityStats:
+    granted: int = 0
+    deferred: int = 0
+    rejected: int = 0
+    waited: float = 0.0
+
+
+@contextmanager
+def quota_priority(priority: str):
+    # приоритет едет через contextvar: фоновые обновления SWR, запущенные внутри, наследуют его
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_owm_url(url: str) -> bool:
+    # квота тарифа считает любые вызовы API OWM, а не только эндпоинты с выключателем
+    return urlsplit(url).netloc.endswith("openweathermap.org")
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+class QuotaManager:
+    def __init__(
+        self,
+        per_minute: float = OWM_CALLS_PER_MINUTE,
+        burst: float = OWM_QUOTA_BURST,
+        clock=time.monotonic,
+    ):
+        self.capacity = max(1.0, burst)
+        self._rate = max(1.0, per_minute - self.capacity) / 60
+        self._clock = clock
+        self._bucket = TokenBucket(self._rate, self.capacity, clock=clock)
+        self.reserves = {
+            INTERACTIVE: 0.0,
+            BROADCAST: BROADCAST_RESERVE,
+            PREFETCH: PREFETCH_RESERVE,
+            HEDGE: PREFETCH_RESERVE,
+        }
+        # prefetch не ждёт вовсе: при нехватке бюджета прогрев просто откладывается до следующего тика
+        self.max_waits = {INTERACTIVE: INTERACTIVE_MAX_WAIT, BROADCAST: BROADCAST_MAX_WAIT, PREFETCH: 0.0, HEDGE: 0.0}
+        self.stats: Dict[str, PriorityStats] = {priority: PriorityStats() for priority in self.reserves}
+        self.throttled = 0
+
+    async def acquire(self, priority: Optional[str] = None) -> float:
+        priority = priority or current_priority()
+        stats = self.stats[priority]
+        # низкий приоритет берёт токен, только если после него в бакете остаётся резерв
+        needed = min(self.capacity, 1 + self.capacity * self.reserves[priority])
+        waited = 0.0
+        while True:
+            delay = self._bucket.delay_for(needed)
+            if delay <= 0 and self._bucket.try_acquire():
+                stats.granted += 1
+                if waited:
+                    stats.deferred += 1
+                    stats.waited += waited
+                return waited
+            if waited + delay > self.max_waits[priority]:
+                stats.rejected += 1
+                raise QuotaExceededError(f"OpenWeatherMap quota exhausted for {priority} requests")
+            await _sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: Optional[float] = None):
+        # OWM ответил 429 — наш учёт разошёлся с его счётчиком, притормаживаем все пути
+        self.throttled += 1
+        seconds = THROTTLE_PAUSE if seconds is None else seconds
+        self._bucket.pause(seconds)
+        logger.warning(f"OWM quota: provider throttled us, pausing for {seconds:.0f}s")
+
+    def reset(self):
+        self._bucket = TokenBucket(self._rate, self.capacity, clock=self._clock)
+        self.stats = {priority: PriorityStats() for priority in self.reserves}
+        self.throttled = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "tokens": round(self._bucket.tokens, 2),
+            "capacity": self.capacity,
+            "throttled": self.throttled,
+            "priorities": {priority: asdict(stats) for priority, stats in self.stats.items()},
+        }
+
+
+owm_quota = QuotaManager()
@@ -0,0 +1,57 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def _refill(self):
+        now = self._clock()
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    @property
+    def idle(self) -> bool:
+        return self.tokens >= self.capacity and self._paused_until <= self._clock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def delay_for(self, tokens: float = 1.0) -> float:
+        self._refill()
+        pause_left = max(0.0, self._paused_until - self._clock())
+        if self._tokens >= tokens:
+            return pause_left
+        return max(pause_left, (tokens - self._tokens) / self.rate)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        if self.delay_for(tokens) > 0:
+            return False
+        self._tokens -= tokens
+        return True
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        waited = 0.0
+        while True:
+            delay = self.delay_for(tokens)
+            if delay <= 0:
+                self._tokens -= tokens
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
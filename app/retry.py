@@ -0,0 +1,196 @@
+import os
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+MAX_RETRIES = int(os.getenv("HTTPCLIENT_MAX_RETRIES", "3"))
+# пользователь ждёт ответа, а у него есть кеш и последние известные данные — ему хватит одного ретрая
+INTERACTIVE_MAX_RETRIES = int(os.getenv("WEATHER_INTERACTIVE_MAX_RETRIES", "1"))
+BACKOFF_INITIAL = float(os.getenv("HTTPCLIENT_BACKOFF_INITIAL", "0.5"))  # секунды
+BACKOFF_FACTOR = float(os.getenv("HTTPCLIENT_BACKOFF_FACTOR", "2.0"))
+DEADLINE = float(os.getenv("HTTPCLIENT_DEADLINE", "15"))  # секунды на вызов вместе с ретраями
+# ретраи не больше RETRY_BUDGET_RATIO от основного трафика; запас MAX покрывает редкие одиночные сбои
+RETRY_BUDGET_RATIO = float(os.getenv("HTTPCLIENT_RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_MAX = float(os.getenv("HTTPCLIENT_RETRY_BUDGET_MAX", "10"))
+
+GIVE_UP_ATTEMPTS = "attempts"
+GIVE_UP_DEADLINE = "deadline"
+GIVE_UP_BUDGET = "budget"
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ATTEMPT_BUCKETS: Tuple[float, ...] = (1, 2, 3, 4)
+
+
+class RetryBudget:
+    # каждый исходный запрос кладёт ratio токена, каждый ретрай забирает целый токен:
+    # при деградации OWM ретраи затухают, а не умножают исходящий трафик
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, max_tokens: float = RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+    def deposit(self):
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class Deadline:
+    # общий срок на вызов: таймауты попыток и паузы между ними берутся из остатка
+    def __init__(self, seconds: float, clock=time.monotonic):
+        self._clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class RetryPolicy:
+    # одна политика на все пути к OWM: общий бюджет ретраев, backoff и срок вызова
+    def __init__(
+        self,
+        max_retries: int = MAX_RETRIES,
+        backoff_initial: float = BACKOFF_INITIAL,
+        backoff_factor: float = BACKOFF_FACTOR,
+        deadline: float = DEADLINE,
+        budget: Optional[RetryBudget] = None,
+        clock=time.monotonic,
+    ):
+        self.max_retries = max_retries
+        self.backoff_initial = backoff_initial
+        self.backoff_factor = backoff_factor
+        self.deadline = deadline
+        self.budget = budget or RetryBudget()
+        self._clock = clock
+
+    def start(self, deadline: Optional[float] = None) -> Deadline:
+        self.budget.deposit()
+        return Deadline(deadline if deadline is not None else self.deadline, clock=self._clock)
+
+    def delay_for(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return retry_after
+        backoff = self.backoff_initial * self.backoff_factor ** (attempt - 1)
+        jitter = backoff * 0.1
+        return max(0.0, backoff + jitter * (0.5 - os.urandom(1)[0] / 255.0))
+
+    def give_up(
+        self, attempt: int, delay: float, deadline: Deadline, stats: "EndpointStats", max_retries: Optional[int] = None
+    ) -> Optional[str]:
+        # None — можно повторять; иначе причина отказа, она же попадает в метрики эндпоинта
+        if attempt > (self.max_retries if max_retries is None else max_retries):
+            return GIVE_UP_ATTEMPTS
+        if delay >= deadline.remaining():
+            stats.deadline_exceeded += 1
+            return GIVE_UP_DEADLINE
+        if not self.budget.try_withdraw():
+            stats.budget_exhausted += 1
+            return GIVE_UP_BUDGET
+        stats.retries += 1
+        return None
+
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+def endpoint_of(url: str) -> str:
+    return urlsplit(url).path or "/"
+
+
+@dataclass
+class Histogram:
+    bounds: Tuple[float, ...]
+    counts: List[int] = field(default_factory=list)
+    total: float = 0.0
+
+    def __post_init__(self):
+        if not self.counts:
+            self.counts = [0] * (len(self.bounds) + 1)
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def as_dict(self) -> dict:
+        labels = [f"le_{bound:g}" for bound in self.bounds] + ["inf"]
+        return {"buckets": dict(zip(labels, self.counts)), "count": self.count, "sum": round(self.total, 4)}
+
+
+@dataclass
+class EndpointStats:
+    calls: int = 0
+    retries: int = 0
+    throttled: int = 0
+    budget_exhausted: int = 0
+    deadline_exceeded: int = 0
+    short_circuited: int = 0
+    failures: int = 0
+    attempts: Histogram = field(default_factory=lambda: Histogram(ATTEMPT_BUCKETS))
+    latency: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "budget_exhausted": self.budget_exhausted,
+            "deadline_exceeded": self.deadline_exceeded,
+            "short_circuited": self.short_circuited,
+            "failures": self.failures,
+            "attempts": self.attempts.as_dict(),
+            "latency": self.latency.as_dict(),
+        }
+
+
+class RequestMetrics:
+    def __init__(self):
+        self._endpoints: Dict[str, EndpointStats] = {}
+
+    def for_url(self, url: str) -> EndpointStats:
+        endpoint = endpoint_of(url)
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = EndpointStats()
+        return stats
+
+    def as_dict(self) -> dict:
+        return {endpoint: stats.as_dict() for endpoint, stats in self._endpoints.items()}
+
+
+owm_retry = RetryPolicy()
+request_metrics = RequestMetrics()
@@ -0,0 +1,164 @@
+import logging
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from .models import Subscription, User
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NOTIFICATION_TIME = "06:00"
+MINUTES_PER_DAY = 24 * 60
+
+# (users.id, telegram_id, город, "ЧЧ:ММ")
+IndexRow = Tuple[int, int, str, str]
+
+
+def minute_of_day(notification_time: str) -> int:
+    hours, minutes = notification_time.strip().split(":")
+    value = int(hours) * 60 + int(minutes)
+    if not 0 <= value < MINUTES_PER_DAY:
+        raise ValueError(f"Invalid notification time: {notification_time}")
+    return value
+
+
+class _Bucket:
+    __slots__ = ("user_ids", "chat_ids", "city_ids")
+
+    def __init__(self):
+        self.user_ids = array("q")
+        self.chat_ids = array("q")
+        self.city_ids = array("l")
+
+
+class SubscriptionIndex:
+    def __init__(self):
+        self._reset()
+        self.loaded = False
+        self.loaded_at: Optional[float] = None
+        self._journal: Optional[List[Tuple[str, tuple]]] = None
+
+    def _reset(self):
+        self._buckets: List[_Bucket] = [_Bucket() for _ in range(MINUTES_PER_DAY)]
+        self._cities: List[str] = []
+        self._city_ids: Dict[str, int] = {}
+        self._slots: Dict[int, int] = {}  # users.id -> минута суток
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _intern(self, city: str) -> int:
+        city_id = self._city_ids.get(city)
+        if city_id is None:
+            city_id = len(self._cities)
+            self._cities.append(city)
+            self._city_ids[city] = city_id
+        return city_id
+
+    def _position(self, user_id: int) -> Tuple[Optional[_Bucket], int]:
+        minute = self._slots.get(user_id)
+        if minute is None:
+            return None, -1
+        bucket = self._buckets[minute]
+        return bucket, bucket.user_ids.index(user_id)
+
+    def _record(self, op: str, *args):
+        if self._journal is not None:
+            self._journal.append((op, args))
+
+    def upsert(self, user_id: int, telegram_id: int, city: str, notification_time: Optional[str]):
+        self._record("upsert", user_id, telegram_id, city, notification_time)
+        self._upsert(user_id, telegram_id, city, notification_time)
+
+    def _upsert(self, user_id: int, telegram_id: int, city: str, notification_time: Optional[str]):
+        self._remove(user_id)
+        if not city:
+            return
+        minute = minute_of_day(notification_time or DEFAULT_NOTIFICATION_TIME)
+        bucket = self._buckets[minute]
+        bucket.user_ids.append(user_id)
+        bucket.chat_ids.append(telegram_id)
+        bucket.city_ids.append(self._intern(city))
+        self._slots[user_id] = minute
+
+    def remove(self, user_id: int):
+        self._record("remove", user_id)
+        self._remove(user_id)
+
+    def _remove(self, user_id: int):
+        bucket, pos = self._position(user_id)
+        if bucket is None:
+            return
+        del bucket.user_ids[pos]
+        del bucket.chat_ids[pos]
+        del bucket.city_ids[pos]
+        del self._slots[user_id]
+
+    def update_city(self, user_id: int, city: str):
+        self._record("update_city", user_id, city)
+        self._update_city(user_id, city)
+
+    def _update_city(self, user_id: int, city: str):
+        bucket, pos = self._position(user_id)
+        if bucket is None:
+            return
+        bucket.city_ids[pos] = self._intern(city)
+
+    def due(self, notification_time: str) -> Dict[str, List[int]]:
+        bucket = self._buckets[minute_of_day(notification_time)]
+        users_by_city: Dict[str, List[int]] = {}
+        for chat_id, city_id in zip(bucket.chat_ids, bucket.city_ids):
+            users_by_city.setdefault(self._cities[city_id], []).append(chat_id)
+        return users_by_city
+
+    def entries(self) -> Dict[int, Tuple[int, str, int]]:
+        result = {}
+        for minute, bucket in enumerate(self._buckets):
+            for user_id, chat_id, city_id in zip(bucket.user_ids, bucket.chat_ids, bucket.city_ids):
+                result[user_id] = (chat_id, self._cities[city_id], minute)
+        return result
+
+    def load(self, rows: Iterable[IndexRow]):
+        self._reset()
+        for user_id, telegram_id, city, notification_time in rows:
+            self._upsert(user_id, telegram_id, city, notification_time)
+        self.loaded = True
+        self.loaded_at = time.time()
+
+    def begin_reconcile(self):
+        self._journal = []
+
+    def abort_reconcile(self):
+        self._journal = None
+
+    def finish_reconcile(self, rows: Iterable[IndexRow]) -> int:
+        before = self.entries()
+        journal, self._journal = self._journal or [], None
+        self.load(rows)
+        # изменения, пришедшие от хендлеров пока шёл запрос к БД, применяем поверх снимка
+        for op, args in journal:
+            getattr(self, f"_{op}")(*args)
+        after = self.entries()
+        drift = sum(1 for key in before.keys() | after.keys() if before.get(key) != after.get(key))
+        if drift:
+            logger.warning(f"Subscription index drift corrected: {drift} entries")
+        return drift
+
+
+async def fetch_index_rows(session) -> List[IndexRow]:
+    result = await session.execute(
+        select(User.id, User.telegram_id, User.city, Subscription.city, Subscription.notification_time)
+        .join(Subscription, Subscription.user_id == User.id)
+        .where(Subscription.daily_notifications == True, User.city.isnot(None))
+    )
+    rows = []
+    for user_id, telegram_id, user_city, sub_city, notification_time in result.all():
+        city = user_city or sub_city
+        if city:
+            rows.append((user_id, telegram_id, city, notification_time or DEFAULT_NOTIFICATION_TIME))
+    return rows
+
+
+subscription_index = SubscriptionIndex()
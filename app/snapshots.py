@@ -0,0 +1,133 @@
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from . import cache_codec
+from .models import WeatherSnapshot
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FLUSH_SECONDS = int(os.getenv("SNAPSHOT_FLUSH_SECONDS", "30"))
+# последние известные данные показываем, только если они не старше суток
+LAST_KNOWN_MAX_AGE = int(os.getenv("SNAPSHOT_LAST_KNOWN_MAX_AGE", str(24 * 3600)))
+_FLUSH_CHUNK = 500
+
+# (ключ кеша, значение, время получения от OWM в секундах epoch)
+Snapshot = Tuple[str, Any, float]
+
+
+@dataclass
+class SnapshotStats:
+    recorded: int = 0
+    flushed: int = 0
+    rehydrated: int = 0
+    last_known_served: int = 0
+    db_errors: int = 0
+
+
+class SnapshotStore:
+    def __init__(self):
+        self._session_maker = None
+        self._pending: Dict[str, Tuple[Any, float]] = {}
+        self.stats = SnapshotStats()
+
+    def attach(self, session_maker):
+        self._session_maker = session_maker
+
+    def detach(self):
+        self._session_maker = None
+
+    def record(self, key: str, value: Any, fetched_at: Optional[float] = None):
+        # запись в БД откладывается до flush: горячий путь запроса не ждёт Postgres
+        self._pending[key] = (value, fetched_at if fetched_at is not None else time.time())
+        self.stats.recorded += 1
+
+    async def flush(self) -> int:
+        if self._session_maker is None or not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        rows = [
+            {"key": key, "payload": cache_codec.encode(value), "fetched_at": datetime.utcfromtimestamp(ts)}
+            for key, (value, ts) in pending.items()
+        ]
+        try:
+            async with self._session_maker() as session:
+                for start in range(0, len(rows), _FLUSH_CHUNK):
+                    stmt = pg_insert(WeatherSnapshot).values(rows[start:start + _FLUSH_CHUNK])
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[WeatherSnapshot.key],
+                        set_={"payload": stmt.excluded.payload, "fetched_at": stmt.excluded.fetched_at},
+                        where=WeatherSnapshot.fetched_at < stmt.excluded.fetched_at,
+                    )
+                    await session.execute(stmt)
+                await session.commit()
+        except Exception as exc:
+            self.stats.db_errors += 1
+            logger.warning(f"Weather snapshot flush failed ({len(rows)} rows): {exc}")
+            # возвращаем в буфер, если за это время не пришло более свежее значение
+            for key, item in pending.items():
+                self._pending.setdefault(key, item)
+            return 0
+        self.stats.flushed += len(rows)
+        return len(rows)
+
+    async def load_recent(self, max_age: float) -> List[Snapshot]:
+        if self._session_maker is None:
+            return []
+        since = datetime.utcnow() - timedelta(seconds=max_age)
+        try:
+            async with self._session_maker() as session:
+                rows = (
+                    await session.execute(
+                        select(WeatherSnapshot.key, WeatherSnapshot.payload, WeatherSnapshot.fetched_at)
+                        .where(WeatherSnapshot.fetched_at >= since)
+                    )
+                ).all()
+        except Exception as exc:
+            self.stats.db_errors += 1
+            logger.warning(f"Weather snapshot load failed: {exc}")
+            return []
+        return [snapshot for snapshot in (self._decode(*row) for row in rows) if snapshot is not None]
+
+    async def last_known(self, key: str, max_age: float = LAST_KNOWN_MAX_AGE) -> Optional[Snapshot]:
+        snapshot: Optional[Snapshot] = None
+        if key in self._pending:
+            value, ts = self._pending[key]
+            snapshot = (key, value, ts)
+        elif self._session_maker is not None:
+            try:
+                async with self._session_maker() as session:
+                    row = (
+                        await session.execute(
+                            select(WeatherSnapshot.key, WeatherSnapshot.payload, WeatherSnapshot.fetched_at)
+                            .where(WeatherSnapshot.key == key)
+                        )
+                    ).first()
+            except Exception as exc:
+                self.stats.db_errors += 1
+                logger.warning(f"Weather snapshot lookup failed for {key}: {exc}")
+                row = None
+            if row is not None:
+                snapshot = self._decode(*row)
+        if snapshot is None or time.time() - snapshot[2] > max_age:
+            return None
+        self.stats.last_known_served += 1
+        return snapshot
+
+    @staticmethod
+    def _decode(key: str, payload: bytes, fetched_at: datetime) -> Optional[Snapshot]:
+        try:
+            value = cache_codec.decode(bytes(payload))
+        except cache_codec.CodecError as exc:
+            logger.warning(f"Skipping unreadable weather snapshot {key}: {exc}")
+            return None
+        return key, value, (fetched_at - datetime(1970, 1, 1)).total_seconds()
+
+
+snapshot_store = SnapshotStore()
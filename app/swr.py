@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional, Set, Tuple, Union
+
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# soft TTL — после него значение отдаётся как устаревшее и обновляется в фоне;
+# hard TTL — после него запись пропадает из кеша и запрос ждёт OWM.
+# Обычно soft TTL считает app.ttl_policy по времени наблюдения; WEATHER_SOFT_TTL — запасной вариант без dt
+CURRENT_SOFT_TTL = int(os.getenv("WEATHER_SOFT_TTL", "300"))
+CURRENT_HARD_TTL = int(os.getenv("WEATHER_HARD_TTL", "1800"))
+FORECAST_HARD_TTL = int(os.getenv("FORECAST_HARD_TTL", "10800"))
+
+_clock: Callable[[], float] = time.time
+_refresh_tasks: Set[asyncio.Task] = set()
+
+# soft TTL задаётся числом или функцией (значение, время получения) -> секунды
+SoftTTL = Union[float, Callable[[Any, float], float]]
+
+FRESH = "fresh"
+STALE = "stale"
+MISS = "miss"
+
+
+@dataclass
+class SWRStats:
+    fresh_hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    background_refreshes: int = 0
+    refresh_errors: int = 0
+    refetches: int = 0
+    unchanged_refetches: int = 0
+
+
+swr_stats = SWRStats()
+
+
+def wrap(value: Any) -> dict:
+    return {"v": value, "ts": _clock()}
+
+
+def unwrap(entry: Any) -> Tuple[Any, Optional[float]]:
+    if isinstance(entry, dict) and "ts" in entry and "v" in entry:
+        return entry["v"], max(0.0, _clock() - float(entry["ts"]))
+    return None, None
+
+
+def soft_ttl_of(soft_ttl: SoftTTL, value: Any, age: float) -> float:
+    if callable(soft_ttl):
+        return soft_ttl(value, _clock() - age)
+    return soft_ttl
+
+
+def is_fresh(entry: Any, soft_ttl: SoftTTL) -> Tuple[Any, bool]:
+    value, age = unwrap(entry)
+    if age is None:
+        return None, False
+    return value, age <= soft_ttl_of(soft_ttl, value, age)
+
+
+def _same_observation(old: Any, new: Any) -> bool:
+    # у OWM время наблюдения — dt; совпало — значит провайдер ещё не обновил данные
+    if isinstance(old, dict) and isinstance(new, dict) and "dt" in old and "dt" in new:
+        return old["dt"] == new["dt"]
+    return old == new
+
+
+async def get_or_fetch(
+    key: str,
+    fetch: Callable[[], Awaitable[Any]],
+    *,
+    soft_ttl: SoftTTL,
+    hard_ttl: int,
+    flight: SingleFlight,
+    get: Callable[[str], Awaitable[Any]],
+    set: Callable[..., Awaitable[None]],
+    stats: SWRStats = swr_stats,
+) -> Tuple[Any, str]:
+    try:
+        entry = await get(key)
+    except Exception:
+        entry = None
+    value, age = unwrap(entry)
+
+    async def fetch_and_store():
+        fresh = await fetch()
+        if age is not None:
+            stats.refetches += 1
+            if _same_observation(value, fresh):
+                stats.unchanged_refetches += 1
+        try:
+            await set(key, wrap(fresh), ttl=max(hard_ttl, int(soft_ttl_of(soft_ttl, fresh, 0.0))))
+        except Exception:
+            pass
+        return fresh
+
+    if age is None or age > hard_ttl:
+        stats.misses += 1
+        return await flight.do(key, fetch_and_store), MISS
+
+    if age <= soft_ttl_of(soft_ttl, value, age):
+        stats.fresh_hits += 1
+        return value, FRESH
+
+    stats.stale_hits += 1
+    if not flight.in_flight(key):
+        stats.background_refreshes += 1
+        task = asyncio.ensure_future(_refresh(key, fetch_and_store, flight, stats))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+    return value, STALE
+
+
+async def _refresh(key: str, fetch_and_store, flight: SingleFlight, stats: SWRStats):
+    try:
+        await flight.do(key, fetch_and_store)
+    except Exception as exc:
+        stats.refresh_errors += 1
+        logger.warning(f"Background refresh failed for {key}: {exc}")
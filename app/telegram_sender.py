@@ -0,0 +1,77 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramRetryAfter
+
+from .rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Bot API: ~30 сообщений/с на бота и ~1 сообщение/с в один чат
+GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+PER_CHAT_RATE = float(os.getenv("TELEGRAM_PER_CHAT_RATE", "1"))
+PER_CHAT_BURST = float(os.getenv("TELEGRAM_PER_CHAT_BURST", "2"))
+SESSION_LIMIT = int(os.getenv("TELEGRAM_SESSION_LIMIT", "100"))
+_MAX_CHAT_BUCKETS = int(os.getenv("TELEGRAM_MAX_CHAT_BUCKETS", "10000"))
+
+
+@dataclass
+class SenderStats:
+    sent: int = 0
+    failed: int = 0
+    flood_waits: int = 0
+    throttled_time: float = 0.0
+
+
+class TelegramSender:
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        per_chat_rate: float = PER_CHAT_RATE,
+        per_chat_burst: float = PER_CHAT_BURST,
+    ):
+        self._global = TokenBucket(global_rate)
+        self._per_chat_rate = per_chat_rate
+        self._per_chat_burst = per_chat_burst
+        self._chats: Dict[int, TokenBucket] = {}
+        self.stats = SenderStats()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_CHAT_BUCKETS:
+                self._chats = {cid: b for cid, b in self._chats.items() if not b.idle}
+            bucket = TokenBucket(self._per_chat_rate, self._per_chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def send(self, bot, chat_id: int, text: str, parse_mode: Optional[str] = "HTML"):
+        waited = await self._chat_bucket(chat_id).acquire()
+        waited += await self._global.acquire()
+        self.stats.throttled_time += waited
+
+        try:
+            result = await bot.send_message(chat_id, text, parse_mode=parse_mode)
+        except TelegramRetryAfter as exc:
+            # flood control действует на весь бот — притормаживаем все отправки
+            self.stats.flood_waits += 1
+            self._global.pause(exc.retry_after)
+            self._chat_bucket(chat_id).pause(exc.retry_after)
+            logger.warning(f"Telegram flood control for chat {chat_id}: retry after {exc.retry_after}s")
+            raise
+        except Exception:
+            self.stats.failed += 1
+            raise
+
+        self.stats.sent += 1
+        return result
+
+
+telegram_sender = TelegramSender()
+
+
+def create_bot_session() -> AiohttpSession:
+    return AiohttpSession(limit=SESSION_LIMIT)
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from dataclasses import dataclass
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpcore
+import httpx
+
+logger = logging.getLogger(__name__)
+
+OWM_BASE_URL = "https://api.openweathermap.org"
+HTTP2_ENABLED = os.getenv("WEATHER_HTTP2", "0") == "1"
+DNS_CACHE_TTL = float(os.getenv("WEATHER_DNS_CACHE_TTL", "300"))  # секунды, 0 — без кеша
+PREWARM_CONNECTIONS = int(os.getenv("WEATHER_PREWARM_CONNECTIONS", "4"))
+# помечает служебные HEAD-запросы прогрева, чтобы пул не считал их трафиком
+PREWARM_EXTENSION = "weather_prewarm"
+
+Resolver = Callable[[str, int], Awaitable[List[str]]]
+
+
+async def system_resolve(host: str, port: int) -> List[str]:
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    addresses: List[str] = []
+    for info in infos:
+        address = info[4][0]
+        if address not in addresses:
+            addresses.append(address)
+    return addresses
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@dataclass
+class DNSCacheStats:
+    hits: int = 0
+    misses: int = 0
+    errors: int = 0
+
+
+class DNSCache:
+    def __init__(self, ttl: float = DNS_CACHE_TTL, resolver: Resolver = system_resolve, clock=time.monotonic):
+        self.ttl = ttl
+        self._resolver = resolver
+        self._clock = clock
+        self._entries: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._pending: Dict[Tuple[str, int], asyncio.Future] = {}
+        self.stats = DNSCacheStats()
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        key = (host, port)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > self._clock():
+            self.stats.hits += 1
+            return entry[1]
+
+        self.stats.misses += 1
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._resolver(host, port))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        try:
+            addresses = await asyncio.shield(pending)
+        except Exception:
+            self.stats.errors += 1
+            # резолвер недоступен — лучше старый адрес, чем отказ
+            if entry is not None:
+                return entry[1]
+            raise
+        if self.ttl > 0 and addresses:
+            self._entries[key] = (self._clock() + self.ttl, addresses)
+        return addresses
+
+    def invalidate(self, host: Optional[str] = None):
+        if host is None:
+            self._entries.clear()
+        else:
+            for key in [k for k in self._entries if k[0] == host]:
+                del self._entries[key]
+
+
+class CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    # SNI и проверка сертификата идут по имени из URL: httpcore передаёт его в start_tls отдельно от адреса
+    def __init__(self, dns_cache: DNSCache, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.dns_cache = dns_cache
+        self._backend = backend or httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            addresses = await self.dns_cache.resolve(host, port)
+        except OSError as exc:
+            # как у штатного транспорта: сбой резолвера — ошибка соединения, которую можно повторить
+            raise httpcore.ConnectError(f"DNS lookup for {host} failed: {exc}") from exc
+        last_exc: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout, OSError) as exc:
+                last_exc = exc
+        self.dns_cache.invalidate(host)
+        if last_exc is None:
+            raise httpcore.ConnectError(f"No addresses for {host}")
+        if isinstance(last_exc, OSError):
+            raise httpcore.ConnectError(str(last_exc)) from last_exc
+        raise last_exc
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+# от специфичных к общим: берём первое совпадение
+_HTTPCORE_ERRORS: Tuple[Tuple[type, type], ...] = (
+    (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+    (httpcore.ReadTimeout, httpx.ReadTimeout),
+    (httpcore.WriteTimeout, httpx.WriteTimeout),
+    (httpcore.PoolTimeout, httpx.PoolTimeout),
+    (httpcore.TimeoutException, httpx.TimeoutException),
+    (httpcore.ConnectError, httpx.ConnectError),
+    (httpcore.ReadError, httpx.ReadError),
+    (httpcore.WriteError, httpx.WriteError),
+    (httpcore.NetworkError, httpx.NetworkError),
+    (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+    (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+    (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+    (httpcore.ProtocolError, httpx.ProtocolError),
+)
+
+
+@contextmanager
+def _httpx_errors():
+    # вызывающий код (ретраи, выключатели) ловит ошибки httpx, а не httpcore
+    try:
+        yield
+    except httpcore.ProxyError as exc:
+        raise httpx.ProxyError(str(exc)) from exc
+    except Exception as exc:
+        for source, target in _HTTPCORE_ERRORS:
+            if isinstance(exc, source):
+                raise target(str(exc)) from exc
+        raise
+
+
+class _ResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream):
+        self._stream = stream
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        with _httpx_errors():
+            async for chunk in self._stream:
+                yield chunk
+
+    async def aclose(self):
+        if hasattr(self._stream, "aclose"):
+            await self._stream.aclose()
+
+
+class CachingDNSTransport(httpx.AsyncBaseTransport):
+    # httpx не даёт подменить network backend через публичный API, поэтому пул httpcore
+    # собираем сами через его конструктор, а транспорт только переводит запросы и ошибки
+    def __init__(self, limits: httpx.Limits, dns_cache: DNSCache, http2: bool = False, verify=True):
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(verify=verify),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=CachingNetworkBackend(dns_cache),
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with _httpx_errors():
+            response = await self._pool.handle_async_request(core_request)
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=_ResponseStream(response.stream),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._pool.aclose()
+
+
+def build_transport(
+    limits: httpx.Limits,
+    http2: bool = HTTP2_ENABLED,
+    dns_cache: Optional[DNSCache] = None,
+    verify=True,
+) -> httpx.AsyncBaseTransport:
+    if http2 and not http2_available():
+        logger.warning("WEATHER_HTTP2=1, но пакет h2 не установлен (pip install httpx[http2]); работаем по HTTP/1.1")
+        http2 = False
+    if dns_cache is None:
+        return httpx.AsyncHTTPTransport(verify=verify, http2=http2, limits=limits)
+    return CachingDNSTransport(limits, dns_cache, http2=http2, verify=verify)
+
+
+async def prewarm(client: httpx.AsyncClient, url: str = OWM_BASE_URL, connections: int = PREWARM_CONNECTIONS) -> int:
+    # параллельные HEAD-запросы открывают несколько соединений сразу; по HTTP/2 хватит одного
+    async def touch():
+        try:
+            await client.head(url, extensions={PREWARM_EXTENSION: True})
+            return True
+        except httpx.HTTPError as exc:
+            logger.warning(f"Prewarm request to {url} failed: {exc}")
+            return False
+
+    results: Iterable[bool] = await asyncio.gather(*(touch() for _ in range(max(1, connections))))
+    return sum(1 for ok in results if ok)
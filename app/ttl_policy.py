@@ -0,0 +1,33 @@
+import os
+from typing import Any
+
+from . import swr
+
+# OWM обновляет данные станций примерно раз в 10 минут, а 5-дневный прогноз — на границе 3-часовых слотов UTC
+CURRENT_CADENCE = int(os.getenv("OWM_CURRENT_CADENCE", "600"))
+CURRENT_MIN_TTL = int(os.getenv("WEATHER_MIN_SOFT_TTL", "60"))
+CURRENT_MAX_TTL = int(os.getenv("WEATHER_MAX_SOFT_TTL", "900"))
+FORECAST_CADENCE = int(os.getenv("OWM_FORECAST_CADENCE", "10800"))
+FORECAST_MIN_TTL = int(os.getenv("FORECAST_MIN_SOFT_TTL", "300"))
+FORECAST_MAX_TTL = int(os.getenv("FORECAST_MAX_SOFT_TTL", "10800"))
+# запас на задержку публикации у провайдера
+UPDATE_GRACE = int(os.getenv("OWM_UPDATE_GRACE", "30"))
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return max(low, min(high, value))
+
+
+def current_soft_ttl(value: Any, fetched_at: float) -> float:
+    observed = value.get("dt") if isinstance(value, dict) else None
+    if not isinstance(observed, (int, float)):
+        return swr.CURRENT_SOFT_TTL
+    # следующее наблюдение ждём к dt + cadence; если станция опаздывает, перепроверяем не реже CURRENT_MIN_TTL
+    next_update = observed + CURRENT_CADENCE + UPDATE_GRACE
+    return _clamp(next_update - fetched_at, CURRENT_MIN_TTL, CURRENT_MAX_TTL)
+
+
+def forecast_soft_ttl(value: Any, fetched_at: float) -> float:
+    # в ответе /forecast нет времени расчёта, поэтому ориентируемся на границу следующего слота
+    next_slot = (fetched_at // FORECAST_CADENCE + 1) * FORECAST_CADENCE + UPDATE_GRACE
+    return _clamp(next_slot - fetched_at, FORECAST_MIN_TTL, FORECAST_MAX_TTL)
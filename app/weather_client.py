@@ -1,17 +1,45 @@
 from __future__ import annotations
+import asyncio
+import time
 from collections import Counter, defaultdict
+from dataclasses import dataclass
 from datetime import date, datetime, timezone, timedelta
-from typing import Any, Dict, List, Tuple, Optional, Union
+from typing import Any, Dict, Iterable, List, Tuple, Optional, Union
 import httpx
 
 from .config import settings
-from .cache import get_cached, set_cached
+from .cache import get_cached, get_many, set_cached
+from .cache_codec import trim_current_weather
+from .circuit_breaker import HALF_OPEN, breaker_for
+from .geocoding import coordinates_store, normalize_city_name
+from .hedging import weather_hedger
+from .http_pool import weather_http
+from .negative_cache import negative_cache
+from .quota import HEDGE, INTERACTIVE, QuotaExceededError, current_priority, is_owm_url, owm_quota
+from .retry import INTERACTIVE_MAX_RETRIES, owm_retry, parse_retry_after, request_metrics
+from .singleflight import weather_flight
+from .snapshots import snapshot_store
+from .ttl_policy import current_soft_ttl, forecast_soft_ttl
+from . import swr
+
+_clock = time.monotonic
+_sleep = asyncio.sleep
 
 
 class WeatherClientError(Exception):
     pass
 
 
+class WeatherUnavailableError(WeatherClientError):
+    # OWM недоступен или перегружен — в отличие от ошибок запроса, тут можно показать последние известные данные
+    pass
+
+
+class CityNotFoundError(WeatherClientError):
+    # OWM ответил, что такого города нет — ответ можно кешировать, в отличие от сбоев сети
+    pass
+
+
 def _get_weather_icon(main: str | None = None, description: str | None = None) -> str:
     main_lower = main.lower() if main else ""
     description_lower = description.lower() if description else ""
@@ -49,92 +77,319 @@ def _ensure_api_key():
         raise WeatherClientError("API-ключ OpenWeatherMap не настроен")
 
 
-async def _request_json(
+async def _hedge_allowed() -> bool:
+    try:
+        await owm_quota.acquire(HEDGE)
+    except QuotaExceededError:
+        return False
+    return True
+
+
+class _TransientOWMError(WeatherUnavailableError):
+    # сбой, который имеет смысл повторить: сеть, 5xx, 429
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+async def _acquire_quota(metered: bool) -> None:
+    if not metered:
+        return
+    try:
+        await owm_quota.acquire()
+    except QuotaExceededError as exc:
+        raise WeatherUnavailableError("Превышен лимит запросов к сервису погоды, попробуйте позже") from exc
+
+
+async def _admit(breaker, metered: bool, stats) -> None:
+    if breaker is None:
+        await _acquire_quota(metered)
+        return
+    # пока OWM лежит, не ждём таймаут: сразу отдаём кеш или последние известные данные
+    if not breaker.allow():
+        stats.short_circuited += 1
+        raise WeatherUnavailableError("Сервис погоды временно недоступен, попробуйте позже")
+    probing = breaker.state == HALF_OPEN
+    try:
+        await _acquire_quota(metered)
+    except WeatherUnavailableError:
+        # без исхода пробника выключатель остался бы в half-open без свободного слота
+        if probing:
+            breaker.release_probe()
+        raise
+
+
+async def _request_once(
     url: str,
     params: dict,
-    client: Optional[Union[httpx.AsyncClient, Any]] = None,
-    timeout: float = 10.0,
+    client: Optional[Union[httpx.AsyncClient, Any]],
+    timeout: float,
+    remaining: float,
+    breaker,
+    metered: bool,
+    stats,
 ) -> httpx.Response:
+    # хеджируем только запросы пользователей: рассылке хвост задержки не важен, а квоту он съест
+    can_hedge = _hedge_allowed if metered and current_priority() == INTERACTIVE else None
+    # таймаут попытки урезаем, только если общий срок вызова уже ближе обычного таймаута
+    request_kwargs = {"timeout": remaining} if remaining < timeout else {}
     try:
         if client is None:
-            async with httpx.AsyncClient(timeout=timeout) as local_client:
-                resp = await local_client.get(url, params=params)
+            async with httpx.AsyncClient(timeout=min(timeout, remaining)) as local_client:
+                resp = await weather_hedger.run(lambda: local_client.get(url, params=params), can_hedge)
         else:
-            if hasattr(client, "__aenter__") and callable(getattr(client, "__aenter__")):
-                async with client as c:
-                    resp = await c.get(url, params=params)
+            # чужой клиент не закрываем: им владеет вызывающий код и он переиспользует соединения
+            resp = await weather_hedger.run(lambda: client.get(url, params=params, **request_kwargs), can_hedge)
+        if resp.status_code == 429:
+            stats.throttled += 1
+            if metered:
+                owm_quota.pause(parse_retry_after(resp.headers.get("Retry-After")))
+        if breaker is not None:
+            if resp.status_code >= 500 or resp.status_code == 429:
+                breaker.record_failure()
             else:
-                resp = await client.get(url, params=params)
+                breaker.record_success()
         resp.raise_for_status()
         return resp
     except httpx.RequestError as e:
-        raise WeatherClientError(f"Ошибка сети при запросе: {e}") from e
+        if breaker is not None:
+            breaker.record_failure()
+        raise _TransientOWMError(f"Ошибка сети при запросе: {e}") from e
     except httpx.HTTPStatusError as exc:
         try:
             body = exc.response.json()
             msg = body.get("message") or body.get("error") or exc.response.text or f"HTTP {exc.response.status_code}"
         except Exception:
             msg = f"HTTP {exc.response.status_code}"
-        raise WeatherClientError(f"Сервис вернул ошибку: {msg}") from exc
+        status = exc.response.status_code
+        if status >= 500 or status == 429:
+            retry_after = parse_retry_after(exc.response.headers.get("Retry-After"))
+            raise _TransientOWMError(f"Сервис вернул ошибку: {msg}", retry_after) from exc
+        error_cls = CityNotFoundError if status == 404 else WeatherClientError
+        raise error_cls(f"Сервис вернул ошибку: {msg}") from exc
     except Exception as exc:
         raise WeatherClientError(f"Неожиданная ошибка при запросе: {exc}") from exc
 
 
+async def _request_json(
+    url: str,
+    params: dict,
+    client: Optional[Union[httpx.AsyncClient, Any]] = None,
+    timeout: float = 10.0,
+    deadline: Optional[float] = None,
+) -> httpx.Response:
+    if client is None:
+        client = weather_http.client
+    breaker = breaker_for(url)
+    metered = is_owm_url(url)
+    stats = request_metrics.for_url(url)
+    stats.calls += 1
+    # общая политика ретраев: бюджет, backoff, Retry-After и срок вызова
+    call_deadline = owm_retry.start(deadline)
+    max_retries = INTERACTIVE_MAX_RETRIES if current_priority() == INTERACTIVE else owm_retry.max_retries
+    started = _clock()
+    attempt = 0
+    succeeded = False
+    try:
+        while True:
+            await _admit(breaker, metered, stats)
+            attempt += 1
+            try:
+                resp = await _request_once(url, params, client, timeout, call_deadline.remaining(), breaker, metered, stats)
+            except _TransientOWMError as exc:
+                delay = owm_retry.delay_for(attempt, exc.retry_after)
+                if owm_retry.give_up(attempt, delay, call_deadline, stats, max_retries) is not None:
+                    raise
+                await _sleep(delay)
+                continue
+            succeeded = True
+            return resp
+    finally:
+        stats.attempts.observe(attempt)
+        stats.latency.observe(_clock() - started)
+        if not succeeded:
+            stats.failures += 1
+
+
+def _cache_enabled(use_cache: bool = True) -> bool:
+    return use_cache and settings.openweather_api_key != "test-key"
+
+
+def current_weather_cache_key(city: str) -> str:
+    return f"current_weather:{city.strip().lower()}"
+
+
+async def peek_current_weather(city: str, ttl: swr.SoftTTL = current_soft_ttl) -> Optional[Dict[str, Any]]:
+    if not _cache_enabled():
+        return None
+    try:
+        entry = await get_cached(current_weather_cache_key(city))
+    except Exception:
+        return None
+    # устаревшую запись не отдаём: пусть get_current_weather вернёт её и запустит обновление
+    value, fresh = swr.is_fresh(entry, ttl)
+    return value if fresh else None
+
+
+async def peek_many_current_weather(cities: Iterable[str], ttl: swr.SoftTTL = current_soft_ttl) -> Dict[str, Dict[str, Any]]:
+    if not _cache_enabled():
+        return {}
+    keys = {city: current_weather_cache_key(city) for city in cities}
+    try:
+        entries = await get_many(keys.values())
+    except Exception:
+        return {}
+    result = {}
+    for city, key in keys.items():
+        value, fresh = swr.is_fresh(entries.get(key), ttl)
+        if fresh:
+            result[city] = value
+    return result
+
+
+async def _fetch_unless_not_found(city: str, fetch):
+    # негативный кеш смотрим только на промахе: попадания по существующим городам не платят лишнее чтение
+    message = await negative_cache.check(city)
+    if message is not None:
+        raise CityNotFoundError(message)
+    try:
+        return await fetch()
+    except CityNotFoundError as exc:
+        await negative_cache.remember(city, str(exc))
+        raise
+
+
 async def get_current_weather(
     city: str,
     client: Optional[httpx.AsyncClient] = None,
     use_cache: bool = True,
-    ttl: int = 300,
+    ttl: swr.SoftTTL = current_soft_ttl,
+    hard_ttl: int = swr.CURRENT_HARD_TTL,
 ) -> Dict[str, Any]:
     _ensure_api_key()
-    cache_enabled = use_cache and settings.openweather_api_key != "test-key"
-    city_key = city.strip().lower()
-    cache_key = f"current_weather:{city_key}"
-    if cache_enabled:
+    cache_key = current_weather_cache_key(city)
+
+    async def fetch() -> Dict[str, Any]:
+        params = {
+            "q": city,
+            "appid": settings.openweather_api_key,
+            "units": "metric",
+            "lang": "ru",
+        }
+        resp = await _request_json("https://api.openweathermap.org/data/2.5/weather", params, client)
         try:
-            cached = await get_cached(cache_key)
-        except Exception:
-            cached = None
-        if cached is not None:
-            return cached
-    params = {
-        "q": city,
-        "appid": settings.openweather_api_key,
-        "units": "metric",
-        "lang": "ru",
-    }
-    resp = await _request_json("https://api.openweathermap.org/data/2.5/weather", params, client)
+            data = resp.json()
+        except ValueError as exc:
+            raise WeatherClientError("Некорректный JSON в ответе сервиса погоды") from exc
+        return trim_current_weather(data)
+
+    if not _cache_enabled(use_cache):
+        return await weather_flight.do(cache_key, fetch)
+
+    async def fetch_and_snapshot() -> Dict[str, Any]:
+        data = await _fetch_unless_not_found(city, fetch)
+        snapshot_store.record(cache_key, data)
+        return data
+
+    # между soft и hard TTL отдаём сохранённое значение сразу, а OWM опрашиваем в фоне;
+    # одновременные промахи по одному городу ждут один запрос к OWM
     try:
-        data = resp.json()
-    except ValueError as exc:
-        raise WeatherClientError("Некорректный JSON в ответе сервиса погоды") from exc
-    if cache_enabled:
-        try:
-            await set_cached(cache_key, data, ttl=ttl)
-        except Exception:
-            pass
+        data, _ = await swr.get_or_fetch(
+            cache_key,
+            fetch_and_snapshot,
+            soft_ttl=ttl,
+            hard_ttl=hard_ttl,
+            flight=weather_flight,
+            get=get_cached,
+            set=set_cached,
+        )
+    except WeatherUnavailableError:
+        snapshot = await snapshot_store.last_known(cache_key)
+        if snapshot is None:
+            raise
+        _, data, fetched_at = snapshot
+        return dict(data, last_known_at=fetched_at)
     return data
 
 
+def convert_units(data: Dict[str, Any], units: str = "metric") -> Dict[str, Any]:
+    # в кеше одна запись на город в metric; imperial/standard считаем на выдаче, а не отдельным запросом к OWM
+    if units == "metric":
+        return data
+    if units not in ("imperial", "standard"):
+        raise WeatherClientError(f"Неизвестная система единиц: {units}")
+
+    def temp(value):
+        if value is None:
+            return None
+        return value * 9 / 5 + 32 if units == "imperial" else value + 273.15
+
+    main = dict(data.get("main") or {})
+    for field in ("temp", "feels_like"):
+        main[field] = temp(main.get(field))
+    wind = dict(data.get("wind") or {})
+    if units == "imperial" and wind.get("speed") is not None:
+        wind["speed"] = wind["speed"] * 2.23694
+    return dict(data, main=main, wind=wind)
+
+
 async def _get_city_coordinates(city: str, client: Optional[httpx.AsyncClient] = None) -> Tuple[float, float]:
     _ensure_api_key()
-    params = {
-        "q": city,
-        "limit": 1,
-        "appid": settings.openweather_api_key,
-    }
-    resp = await _request_json("https://api.openweathermap.org/geo/1.0/direct", params, client)
-    try:
-        data = resp.json()
-    except ValueError as exc:
-        raise WeatherClientError("Некорректный JSON в ответе геокодера") from exc
-    if not data:
-        raise WeatherClientError("Город не найден, попробуйте уточнить запрос")
-    lat = data[0].get("lat")
-    lon = data[0].get("lon")
-    if lat is None or lon is None:
-        raise WeatherClientError("Не удалось определить координаты города")
-    return float(lat), float(lon)
+    coords = await coordinates_store.get(city)
+    if coords is not None:
+        return coords
+
+    async def fetch() -> Tuple[float, float]:
+        params = {
+            "q": city,
+            "limit": 1,
+            "appid": settings.openweather_api_key,
+        }
+        resp = await _request_json("https://api.openweathermap.org/geo/1.0/direct", params, client)
+        try:
+            data = resp.json()
+        except ValueError as exc:
+            raise WeatherClientError("Некорректный JSON в ответе геокодера") from exc
+        if not data:
+            raise CityNotFoundError("Город не найден, попробуйте уточнить запрос")
+        lat = data[0].get("lat")
+        lon = data[0].get("lon")
+        if lat is None or lon is None:
+            raise WeatherClientError("Не удалось определить координаты города")
+        await coordinates_store.put(city, float(lat), float(lon))
+        return float(lat), float(lon)
+
+    async def fetch_checked() -> Tuple[float, float]:
+        return await _fetch_unless_not_found(city, fetch)
+
+    return await weather_flight.do(f"geo:{normalize_city_name(city)}", fetch_checked if _cache_enabled() else fetch)
+
+
+async def rehydrate_cache(max_age: Optional[float] = None) -> int:
+    # после рестарта наполняем пустой кеш последними снимками, сохраняя их исходное время получения
+    limits = {"current_weather:": swr.CURRENT_HARD_TTL, "forecast:": swr.FORECAST_HARD_TTL}
+    snapshots = await snapshot_store.load_recent(max_age or max(limits.values()))
+    if not snapshots:
+        return 0
+    present = await get_many(key for key, _, _ in snapshots)
+    now = swr._clock()
+    restored = 0
+    for key, value, fetched_at in snapshots:
+        hard_ttl = next((ttl for prefix, ttl in limits.items() if key.startswith(prefix)), None)
+        if hard_ttl is None or key in present:
+            continue
+        remaining = int(hard_ttl - (now - fetched_at))
+        if remaining <= 0:
+            continue
+        await set_cached(key, {"v": value, "ts": fetched_at}, ttl=remaining)
+        restored += 1
+    snapshot_store.stats.rehydrated += restored
+    return restored
+
+
+def _last_known_note(fetched_at: float) -> str:
+    moment = datetime.fromtimestamp(fetched_at, tz=timezone.utc)
+    return f"⚠️ Сервис погоды недоступен, показаны данные на {moment:%d.%m %H:%M} UTC"
 
 
 def _aggregate_daily(entries: List[Dict[str, Any]], timezone_offset: int) -> Dict[str, Any]:
@@ -173,10 +428,22 @@ def _aggregate_daily(entries: List[Dict[str, Any]], timezone_offset: int) -> Dic
     }
 
 
-async def get_daily_forecast(city: str, days: int, client: Optional[httpx.AsyncClient] = None) -> Tuple[List[Dict[str, Any]], int]:
-    if days < 1 or days > 5:
-        raise ValueError("Количество дней должно быть в диапазоне 1-5")
-    lat, lon = await _get_city_coordinates(city, client)
+@dataclass
+class ForecastCacheStats:
+    requests: int = 0
+    # попадания в общую запись координат, в том числе с другим days, чем у запроса, который её заполнил
+    hits: int = 0
+    upstream_fetches: int = 0
+
+
+forecast_cache_stats = ForecastCacheStats()
+
+
+def forecast_cache_key(lat: float, lon: float) -> str:
+    return f"forecast:{lat:.4f}:{lon:.4f}"
+
+
+async def _fetch_forecast(lat: float, lon: float, client: Optional[httpx.AsyncClient] = None) -> Tuple[List[Dict[str, Any]], int]:
     params = {
         "lat": lat,
         "lon": lon,
@@ -184,10 +451,6 @@ async def get_daily_forecast(city: str, days: int, client: Optional[httpx.AsyncC
         "lang": "ru",
         "appid": settings.openweather_api_key,
     }
-    cache_key = f"forecast:{city.strip().lower()}:{days}"
-    cached = await get_cached(cache_key)
-    if cached:
-        return cached
     resp = await _request_json("https://api.openweathermap.org/data/2.5/forecast", params, client)
     try:
         data = resp.json()
@@ -202,9 +465,42 @@ async def get_daily_forecast(city: str, days: int, client: Optional[httpx.AsyncC
         dt = datetime.fromtimestamp(item["dt"], tz=timezone.utc) + timedelta(seconds=timezone_offset)
         grouped[dt.date()].append(item)
     sorted_dates = sorted(grouped.keys())
-    aggregated = [_aggregate_daily(grouped[day], timezone_offset) for day in sorted_dates]
-    await set_cached(cache_key, (aggregated[:days], timezone_offset), ttl=300)
-    return aggregated[:days], timezone_offset
+    return [_aggregate_daily(grouped[day], timezone_offset) for day in sorted_dates], timezone_offset
+
+
+async def get_daily_forecast(city: str, days: int, client: Optional[httpx.AsyncClient] = None) -> Tuple[List[Dict[str, Any]], int]:
+    if days < 1 or days > 5:
+        raise ValueError("Количество дней должно быть в диапазоне 1-5")
+    forecast_cache_stats.requests += 1
+    lat, lon = await _get_city_coordinates(city, client)
+    # один полный прогноз на координаты; любое количество дней — срез этой записи
+    cache_key = forecast_cache_key(lat, lon)
+
+    async def fetch() -> Tuple[List[Dict[str, Any]], int]:
+        result = await _fetch_forecast(lat, lon, client)
+        forecast_cache_stats.upstream_fetches += 1
+        snapshot_store.record(cache_key, result)
+        return result
+
+    try:
+        (aggregated, timezone_offset), state = await swr.get_or_fetch(
+            cache_key,
+            fetch,
+            soft_ttl=forecast_soft_ttl,
+            hard_ttl=swr.FORECAST_HARD_TTL,
+            flight=weather_flight,
+            get=get_cached,
+            set=set_cached,
+        )
+    except WeatherUnavailableError:
+        snapshot = await snapshot_store.last_known(cache_key)
+        if snapshot is None:
+            raise
+        _, (aggregated, timezone_offset), fetched_at = snapshot
+        return [dict(day, last_known_at=fetched_at) for day in aggregated[:days]], timezone_offset
+    if state != swr.MISS:
+        forecast_cache_stats.hits += 1
+    return list(aggregated[:days]), timezone_offset
 
 
 def _format_date(day: date) -> str:
@@ -241,12 +537,17 @@ def format_weekly_forecast(city: str, daily: List[Dict[str, Any]], timezone_offs
     parts = [f"Погода на {len(daily)} дней в <b>{city}</b> 📅", ""]
     for index, day in enumerate(daily, start=1):
         parts.append(_format_daily_block(day, index))
+    if daily and daily[0].get("last_known_at"):
+        parts.append(_last_known_note(daily[0]["last_known_at"]))
     return "\n\n".join(parts)
 
 
 def format_single_forecast(city: str, day: Dict[str, Any], timezone_offset: int, day_index: int) -> str:
     header = f"Прогноз на {day_index}-й день для <b>{city}</b> 📅"
-    return "\n".join([header, "", _format_daily_block(day, day_index)])
+    lines = [header, "", _format_daily_block(day, day_index)]
+    if day.get("last_known_at"):
+        lines += ["", _last_known_note(day["last_known_at"])]
+    return "\n".join(lines)
 
 
 def format_weather_message(city: str, data: Dict[str, Any]) -> str:
@@ -273,4 +574,6 @@ def format_weather_message(city: str, data: Dict[str, Any]) -> str:
         parts.append(f"Влажность: {humidity}%")
     if wind_speed is not None:
         parts.append(f"Ветер: {wind_speed} м/с")
+    if data.get("last_known_at"):
+        parts += ["", _last_known_note(data["last_known_at"])]
     return "\n".join(parts)
@@ -8,27 +8,29 @@ from handlers.common import register_common_handlers
 from handlers.weather import register_weather_handlers
 
 try:
-    from app.http_client import HTTPClient
+    from app.http_pool import weather_http
 except Exception:
-    HTTPClient = None
+    weather_http = None
 
 async def on_startup():
-    if HTTPClient is None:
+    if weather_http is None:
         return
 
+    # тот же пул соединений к OWM, что и у app.main
     try:
-        await HTTPClient.get_session()
+        await weather_http.start()
+        await weather_http.prewarm()
 
     except Exception:
         pass
 
 
 async def on_shutdown():
-    if HTTPClient is None:
+    if weather_http is None:
         return
 
     try:
-        await HTTPClient.close()
+        await weather_http.close()
     except Exception:
         pass
 
@@ -39,7 +41,10 @@ async def main():
 
     register_common_handlers(dp)
     register_weather_handlers(dp)
-    await dp.start_polling(bot, on_startup=on_startup, on_shutdown=on_shutdown)
+    # в aiogram 3 лишние kwargs start_polling уходят в workflow data, хуки надо регистрировать явно
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    await dp.start_polling(bot)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,15 +1,19 @@
 import os, asyncio
-from app.http_client import HTTPClient
-from app.cache import get_cached
+from app.http_pool import weather_http
+from app.cache import cache_health, get_cached
 
 async def main():
     ok = True
     try:
-        await HTTPClient.get_session()
+        await weather_http.start()
+        await weather_http.close()
     except Exception:
         ok = False
     try:
         await get_cached("health:test")
+        health = await cache_health()
+        if health["redis"] == "down":
+            ok = False
     except Exception:
         ok = False
     print("OK" if ok else "NOT OK")
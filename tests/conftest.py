@@ -8,6 +8,15 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 
+class FakeClock:
+    # ручные часы для кэшей, квоты и лимитеров: тест двигает now сам
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
 @pytest.fixture(autouse=True)
 def _test_env(monkeypatch):
     monkeypatch.setenv("BOT_TOKEN", os.getenv("BOT_TOKEN", "test-token"))
@@ -30,3 +39,16 @@ def _block_network(monkeypatch, request):
 
     monkeypatch.setattr(httpx.Client, "request", _boom, raising=True)
     monkeypatch.setattr(httpx.AsyncClient, "request", _boom, raising=True)
+
+
+@pytest.fixture(autouse=True)
+def _reset_owm_guards():
+    # выключатели и квота общие на процесс: сбои и запросы одного теста не должны влиять на следующие
+    from app.circuit_breaker import reset_breakers
+    from app.quota import owm_quota
+
+    reset_breakers()
+    owm_quota.reset()
+    yield
+    reset_breakers()
+    owm_quota.reset()
@@ -0,0 +1,72 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.coordination import Coordinator
+from app.db import DATABASE_URL
+from tools.coordination_check import run_check
+
+pytestmark = pytest.mark.integration
+
+
+def _get_test_database_url() -> str:
+    url = os.getenv("TEST_DATABASE_URL") or DATABASE_URL
+
+    if "weather-postgres" in url and os.getenv("RUNNING_IN_DOCKER") != "1":
+        url = url.replace("weather-postgres", os.getenv("TEST_DB_HOST", "localhost"))
+
+    return url
+
+
+async def _postgres_error(url: str):
+    engine = create_async_engine(url, echo=False)
+    try:
+        async with engine.connect():
+            return None
+    except Exception as exc:
+        return exc
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_advisory_lock_leadership_between_sessions():
+    if os.getenv("RUN_INTEGRATION_TESTS") != "1":
+        pytest.skip("Integration test skipped (set RUN_INTEGRATION_TESTS=1 to run)")
+
+    error = await _postgres_error(_get_test_database_url())
+    if error is not None:
+        pytest.skip(f"Postgres is not available for integration test: {error!r}")
+
+    first_engine = create_async_engine(_get_test_database_url(), echo=False)
+    second_engine = create_async_engine(_get_test_database_url(), echo=False)
+    first = Coordinator(first_engine, mode="leader", lock_key=99000101)
+    second = Coordinator(second_engine, mode="leader", lock_key=99000101)
+
+    try:
+        assert await first.heartbeat() is True
+        assert await second.heartbeat() is False
+
+        await first.close()
+        assert await second.heartbeat() is True
+    finally:
+        await first.close()
+        await second.close()
+        await first_engine.dispose()
+        await second_engine.dispose()
+
+
+def test_leader_failover_across_processes():
+    if os.getenv("RUN_INTEGRATION_TESTS") != "1":
+        pytest.skip("Integration test skipped (set RUN_INTEGRATION_TESTS=1 to run)")
+
+    error = asyncio.run(_postgres_error(_get_test_database_url()))
+    if error is not None:
+        pytest.skip(f"Postgres is not available for integration test: {error!r}")
+
+    result = run_check(_get_test_database_url(), replicas=3)
+
+    assert len(result["leaders"]) >= 2, "После гибели лидера должна пройти перевыборка"
+    assert result["max_concurrent_leaders"] == 1, "Одновременно может быть только один лидер"
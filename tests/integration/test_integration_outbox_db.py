@@ -0,0 +1,73 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import DATABASE_URL
+from app.models import Base
+from app.outbox import OutboxStore, OutboxWorkerPool
+
+pytestmark = pytest.mark.integration
+
+
+def _get_test_database_url() -> str:
+    url = os.getenv("TEST_DATABASE_URL") or DATABASE_URL
+
+    if "weather-postgres" in url and os.getenv("RUNNING_IN_DOCKER") != "1":
+        url = url.replace("weather-postgres", os.getenv("TEST_DB_HOST", "localhost"))
+
+    return url
+
+
+@pytest.mark.asyncio
+async def test_outbox_workers_never_double_send():
+    if os.getenv("RUN_INTEGRATION_TESTS") != "1":
+        pytest.skip("Integration test skipped (set RUN_INTEGRATION_TESTS=1 to run)")
+
+    engine = create_async_engine(_get_test_database_url(), echo=False)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    except Exception as exc:
+        await engine.dispose()
+        pytest.skip(f"Postgres is not available for integration test: {exc!r}")
+
+    async with Session() as s:
+        await s.execute(text("TRUNCATE TABLE delivery_outbox RESTART IDENTITY"))
+        await s.commit()
+
+    store = OutboxStore(Session)
+    planned = [(chat_id, "Тестоград", ["daily", "alert"]) for chat_id in range(1, 201)]
+
+    assert await store.enqueue("2024-01-01T06:00", planned) == 200
+    assert await store.enqueue("2024-01-01T06:00", planned) == 0, "Повторное планирование не должно дублировать строки"
+
+    delivered: list[tuple[int, str]] = []
+
+    async def send_text(chat_id, text):
+        await asyncio.sleep(0)
+        delivered.append((chat_id, text))
+
+    # два пула имитируют две реплики, разбирающие одну таблицу через SKIP LOCKED
+    pools = [OutboxWorkerPool(store, send_text, workers=4, batch_size=10) for _ in range(2)]
+    results = await asyncio.gather(*(pool.drain() for pool in pools))
+
+    assert sum(r.sent for r in results) == 200
+    assert len(delivered) == 400
+    assert len(set(delivered)) == 400
+    assert await store.run_counts("2024-01-01T06:00") == {"sent": 200}
+
+    # чистка не трогает ни свежие строки, ни недоставленные
+    await store.enqueue("2024-01-02T06:00", [(1, "Тестоград", ["daily"])])
+    later = datetime.utcnow() + timedelta(days=8)
+    assert await store.purge(retention_days=7, now=later) == 200
+    assert await store.run_counts("2024-01-01T06:00") == {}
+    assert await store.run_counts("2024-01-02T06:00") == {"pending": 1}
+
+    await engine.dispose()
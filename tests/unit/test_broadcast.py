@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from app.broadcast import run_broadcast
+
+
+@pytest.mark.asyncio
+async def test_run_broadcast_delivers_every_chat_in_order():
+    users_by_city = {"Москва": [1, 2], "Казань": [3]}
+    sent: list[tuple[int, str]] = []
+
+    async def fetch_city(city: str):
+        return [f"daily {city}", f"alert {city}"]
+
+    async def send_chat(chat_id: int, texts):
+        for text in texts:
+            sent.append((chat_id, text))
+
+    stats = await run_broadcast(users_by_city, fetch_city, send_chat, fetch_concurrency=2, send_concurrency=2)
+
+    assert sorted(sent) == sorted([
+        (1, "daily Москва"), (1, "alert Москва"),
+        (2, "daily Москва"), (2, "alert Москва"),
+        (3, "daily Казань"), (3, "alert Казань"),
+    ])
+    for chat_id in (1, 2, 3):
+        texts = [text for cid, text in sent if cid == chat_id]
+        assert texts[0].startswith("daily"), "Экстренное предупреждение не должно обгонять прогноз"
+    assert stats.fetch.items == 2
+    assert stats.send.items == 3
+    assert stats.fetch.errors == 0 and stats.send.errors == 0
+
+
+@pytest.mark.asyncio
+async def test_run_broadcast_skips_failed_city_and_counts_errors():
+    sent: list[int] = []
+
+    async def fetch_city(city: str):
+        if city == "Ошибка":
+            raise RuntimeError("OWM down")
+        if city == "Пусто":
+            return []
+        return ["text"]
+
+    async def send_chat(chat_id: int, texts):
+        if chat_id == 5:
+            raise RuntimeError("blocked by user")
+        sent.append(chat_id)
+
+    stats = await run_broadcast(
+        {"Ошибка": [1], "Пусто": [2], "Ок": [3, 4, 5]},
+        fetch_city,
+        send_chat,
+    )
+
+    assert sorted(sent) == [3, 4]
+    assert stats.fetch.items == 3
+    assert stats.fetch.errors == 1
+    assert stats.send.items == 3
+    assert stats.send.errors == 1
+
+
+@pytest.mark.asyncio
+async def test_run_broadcast_applies_backpressure_and_overlaps_stages():
+    fetched: list[str] = []
+    release = asyncio.Event()
+
+    async def fetch_city(city: str):
+        fetched.append(city)
+        return ["text"]
+
+    async def send_chat(chat_id: int, texts):
+        await release.wait()
+
+    async def open_gate():
+        await asyncio.sleep(0.05)
+        release.set()
+
+    gate = asyncio.create_task(open_gate())
+    stats = await run_broadcast(
+        {f"city{i}": [i] for i in range(6)},
+        fetch_city,
+        send_chat,
+        fetch_concurrency=3,
+        send_concurrency=1,
+        queue_size=1,
+    )
+    await gate
+
+    assert len(fetched) == 6
+    assert stats.send.items == 6
+    assert stats.max_queue_depth == 1
+    assert stats.backpressure_wait > 0
+    assert stats.as_dict()["fetch"]["items"] == 6
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from app.cache import BoundedTTLCache
+from tests.conftest import FakeClock
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_and_are_counted():
+    clock = FakeClock()
+    cache = BoundedTTLCache(shards=1, clock=clock)
+    await cache.set("a", {"temp": 1}, ttl=10)
+
+    assert await cache.get("a") == {"temp": 1}
+    clock.now = 11
+    assert await cache.get("a") is None
+    assert await cache.get("missing") is None
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.expirations) == (1, 2, 1)
+    assert len(cache) == 0 and cache.stats.bytes == 0
+
+
+def test_lru_evicts_least_recently_used_by_count():
+    cache = BoundedTTLCache(max_entries=3, shards=1, policy="lru")
+    for key in "abc":
+        cache.set_local(key, key)
+    cache.get_local("a")
+    cache.set_local("d", "d")
+
+    assert cache.get_local("b") is None
+    assert all(cache.get_local(k) is not None for k in "acd")
+    assert cache.stats.evictions == 1
+
+
+def test_lfu_keeps_frequently_read_entries():
+    cache = BoundedTTLCache(max_entries=3, shards=1, policy="lfu")
+    for key in "abc":
+        cache.set_local(key, key)
+    for _ in range(5):
+        cache.get_local("a")
+    cache.get_local("b")
+    cache.set_local("d", "d")
+
+    # "a" самый старый по LRU, но читается чаще всех
+    assert cache.get_local("a") == "a"
+    assert cache.get_local("c") is None
+
+
+def test_byte_budget_bounds_the_cache():
+    cache = BoundedTTLCache(max_entries=1000, max_bytes=4000, shards=1)
+    for i in range(50):
+        cache.set_local(f"k{i}", "x" * 500)
+
+    assert cache.stats.bytes <= 4000
+    assert 0 < len(cache) < 50
+    assert cache.get_local("k49") is not None
+
+
+@pytest.mark.asyncio
+async def test_sweeper_removes_expired_entries_without_reads():
+    clock = FakeClock()
+    cache = BoundedTTLCache(shards=2, clock=clock)
+    for i in range(10):
+        cache.set_local(f"k{i}", i, ttl=5)
+    cache.set_local("long", 1, ttl=100)
+    clock.now = 6
+
+    cache.start_sweeper(interval=0.02)
+    await asyncio.sleep(0.05)
+    await cache.stop_sweeper()
+
+    assert len(cache) == 1
+    assert cache.stats.expirations == 10
@@ -0,0 +1,89 @@
+import json
+from datetime import date
+
+import pytest
+
+from app import cache_codec
+from app.cache_codec import decode, encode, trim_current_weather
+
+RAW_CURRENT = {
+    "coord": {"lon": 37.62, "lat": 55.75},
+    "weather": [{"id": 800, "main": "Clear", "description": "ясно", "icon": "01d"}],
+    "base": "stations",
+    "main": {"temp": -3, "feels_like": -8.4, "temp_min": -4, "temp_max": -2, "pressure": 1020, "humidity": 74},
+    "visibility": 10000,
+    "wind": {"speed": 4, "deg": 210},
+    "clouds": {"all": 0},
+    "dt": 1704106800,
+    "sys": {"country": "RU", "sunrise": 1704088800, "sunset": 1704114000},
+    "timezone": 10800,
+    "id": 524901,
+    "name": "Москва",
+    "cod": 200,
+}
+
+
+def _daily():
+    return [
+        {
+            "date": date(2024, 1, d),
+            "temp_min": -5.0 - d,
+            "temp_max": 1.5,
+            "temp_avg": -2.25,
+            "feels_like_avg": -6.0,
+            "wind_speed_avg": 3.2,
+            "humidity_avg": 80.0 if d != 3 else None,
+            "main": "Snow",
+            "description": "небольшой снег",
+        }
+        for d in range(1, 6)
+    ], 10800
+
+
+def test_current_weather_is_trimmed_and_round_trips():
+    trimmed = trim_current_weather(RAW_CURRENT)
+    raw = encode(trimmed)
+
+    assert raw[:1] == cache_codec.TAG_CURRENT
+    assert decode(raw) == trimmed
+    assert trimmed["main"] == {"temp": -3.0, "feels_like": -8.4, "humidity": 74}
+    assert trimmed["weather"] == [{"main": "Clear", "description": "ясно"}]
+    assert len(raw) < len(json.dumps(RAW_CURRENT).encode()) / 4
+
+
+def test_forecast_round_trips_dates_exactly():
+    value = _daily()
+    raw = encode({"v": value, "ts": 1704106800.25})
+    decoded = decode(raw)
+
+    assert decoded["ts"] == 1704106800.25
+    days, offset = decoded["v"]
+    assert offset == 10800
+    assert days == value[0]
+    assert all(type(day["date"]) is date for day in days)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        {"lat": 55.75, "lon": 37.62},
+        [1, 2, 3],
+        {"main": {"temp": 1.0, "pressure": 1000}, "extra": True},
+        ([{"date": date(2024, 1, 1), "custom": 1}], 0),
+    ],
+)
+def test_unknown_shapes_fall_back_to_tagged_json(value):
+    raw = encode(value)
+
+    assert raw[:1] == cache_codec.TAG_JSON
+    decoded = decode(raw)
+    assert decoded == (list(value) if isinstance(value, tuple) else value)
+
+
+def test_corrupted_entry_raises_codec_error():
+    raw = encode(trim_current_weather(RAW_CURRENT))
+
+    with pytest.raises(cache_codec.CodecError):
+        decode(raw[:10])
+    with pytest.raises(cache_codec.CodecError):
+        decode(b"Xgarbage")
@@ -0,0 +1,101 @@
+import httpx
+import pytest
+
+from app import weather_client
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, breaker_for, owm_breakers
+from app.quota import QuotaExceededError
+from app.retry import RequestMetrics
+
+WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+
+
+def test_breaker_opens_probes_and_closes():
+    now = [0.0]
+    breaker = CircuitBreaker("weather", failure_threshold=3, reset_timeout=30, clock=lambda: now[0])
+
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    # после паузы пропускаем ровно один пробный запрос
+    now[0] += 30
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    now[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.as_dict()["opened"] == 2
+    assert breaker.stats.rejected == 2
+
+
+def test_endpoints_have_separate_breakers():
+    assert breaker_for(WEATHER_URL) is owm_breakers["weather"]
+    assert breaker_for("https://api.openweathermap.org/data/2.5/forecast") is owm_breakers["forecast"]
+    assert breaker_for("https://api.openweathermap.org/geo/1.0/direct") is owm_breakers["geo"]
+    assert breaker_for("http://127.0.0.1:8080/data/2.5/weather") is None
+
+
+@pytest.mark.network
+@pytest.mark.asyncio
+async def test_open_breaker_fails_fast_without_calling_owm(monkeypatch):
+    calls = 0
+
+    def handler(request):
+        nonlocal calls
+        calls += 1
+        return httpx.Response(503, json={"message": "down"})
+
+    async def no_sleep(seconds):
+        return None
+
+    monkeypatch.setattr(weather_client, "_sleep", no_sleep)
+    breaker = owm_breakers["weather"]
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        # каждая попытка, включая ретрай, считается сбоем
+        while breaker.state != OPEN:
+            with pytest.raises(weather_client.WeatherUnavailableError):
+                await weather_client._request_json(WEATHER_URL, {}, client)
+        assert calls == breaker.failure_threshold
+        with pytest.raises(weather_client.WeatherUnavailableError, match="временно недоступен"):
+            await weather_client._request_json(WEATHER_URL, {}, client)
+        assert calls == breaker.failure_threshold
+        # прогноз ходит через свой выключатель
+        with pytest.raises(weather_client.WeatherUnavailableError, match="HTTP|down"):
+            await weather_client._request_json("https://api.openweathermap.org/data/2.5/forecast", {}, client)
+
+    assert owm_breakers["forecast"].state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_quota_rejection_releases_half_open_probe(monkeypatch):
+    now = [0.0]
+    breaker = CircuitBreaker("weather", failure_threshold=1, reset_timeout=30, clock=lambda: now[0])
+    metrics = RequestMetrics()
+
+    async def acquire(priority=None):
+        raise QuotaExceededError("quota exhausted")
+
+    monkeypatch.setattr(weather_client, "breaker_for", lambda url: breaker)
+    monkeypatch.setattr(weather_client, "request_metrics", metrics)
+    monkeypatch.setattr(weather_client.owm_quota, "acquire", acquire)
+
+    breaker.allow()
+    breaker.record_failure()
+    with pytest.raises(weather_client.WeatherUnavailableError, match="временно недоступен"):
+        await weather_client._request_json(WEATHER_URL, {})
+    assert metrics.for_url(WEATHER_URL).short_circuited == 1
+
+    # пробник получил слот, но упёрся в квоту — слот должен вернуться
+    now[0] += 30
+    with pytest.raises(weather_client.WeatherUnavailableError, match="лимит"):
+        await weather_client._request_json(WEATHER_URL, {})
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow(), "Следующий вызов должен получить пробный слот"
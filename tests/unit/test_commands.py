@@ -170,4 +170,37 @@ async def test_send_daily_weather_uses_notification_time(monkeypatch):
     assert bot.messages == []
 
     await main_module.send_daily_weather(bot, current_time="09:15")
-    assert bot.messages, "Сообщения должны отправляться в сохранённое время"
\ No newline at end of file
+    assert bot.messages, "Сообщения должны отправляться в сохранённое время"
+
+@pytest.mark.asyncio
+async def test_notification_time_change_sends_preview_only_to_that_user(monkeypatch):
+    user = User(id=4, telegram_id=400, username="preview", city="Омск", subscribed=True)
+    subscription = Subscription(user_id=user.id, city=user.city, daily_notifications=True)
+
+    async def fake_get_current_weather(city: str):
+        return {"main": {"temp": 3.0}, "weather": [{"description": "ясно"}]}
+
+    async def broadcast_must_not_run(*args, **kwargs):
+        raise AssertionError("Смена времени не должна запускать общую рассылку")
+
+    class FakeState:
+        async def clear(self):
+            return None
+
+    monkeypatch.setattr(main_module, "get_current_weather", fake_get_current_weather)
+    monkeypatch.setattr(main_module, "send_daily_weather", broadcast_must_not_run)
+    monkeypatch.setattr(main_module, "select", lambda *models: FakeSelect(*models))
+    monkeypatch.setattr(main_module, "async_session_maker", FakeSessionMaker(user, subscription))
+
+    # оба зарегистрированных обработчика: своё время и выбор из готовых вариантов
+    for text, handler, expected_time in (
+        ("08:30", main_module.process_notification_time, "08:30"),
+        ("Утром", main_module.process_notification_choice, "06:00"),
+    ):
+        message = FakeMessage(text, user.telegram_id, user.username)
+        message.bot = FakeBot()
+        await handler(message, FakeState())
+
+        assert subscription.notification_time == expected_time
+        assert [m["chat_id"] for m in message.bot.messages] == [400]
+        assert "Ежедневный прогноз" in message.bot.messages[0]["text"]
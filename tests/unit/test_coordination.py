@@ -0,0 +1,178 @@
+import pytest
+
+from app.coordination import Coordinator, city_shard
+
+
+class FakeLockServer:
+    def __init__(self):
+        self.owners: dict[int, "FakeConnection"] = {}
+
+
+class FakeConnection:
+    def __init__(self, server: FakeLockServer):
+        self.server = server
+        self.closed = False
+
+    async def execution_options(self, **kwargs):
+        return self
+
+    async def scalar(self, statement, params=None):
+        if self.closed:
+            raise ConnectionError("connection is closed")
+        sql = str(statement)
+        key = (params or {}).get("key")
+        if "pg_try_advisory_lock" in sql:
+            owner = self.server.owners.get(key)
+            if owner is None or owner is self:
+                self.server.owners[key] = self
+                return True
+            return False
+        if "pg_advisory_unlock" in sql:
+            if self.server.owners.get(key) is self:
+                del self.server.owners[key]
+                return True
+            return False
+        return 1
+
+    async def close(self):
+        self.closed = True
+        for key, owner in list(self.server.owners.items()):
+            if owner is self:
+                del self.server.owners[key]
+
+
+class FakeEngine:
+    def __init__(self, server: FakeLockServer):
+        self.server = server
+        self.connections: list[FakeConnection] = []
+
+    async def connect(self):
+        conn = FakeConnection(self.server)
+        self.connections.append(conn)
+        return conn
+
+
+def _crash(engine: FakeEngine):
+    # реплика умерла: Postgres закрывает её сессию и снимает блокировки
+    for conn in engine.connections:
+        conn.closed = True
+        for key, owner in list(conn.server.owners.items()):
+            if owner is conn:
+                del conn.server.owners[key]
+
+
+def _cities_by_shard(shard_count: int) -> dict[int, str]:
+    result: dict[int, str] = {}
+    for i in range(100):
+        city = f"city-{i}"
+        result.setdefault(city_shard(city, shard_count), city)
+        if len(result) == shard_count:
+            return result
+    raise AssertionError("not enough distinct shards")
+
+
+def test_city_shard_is_stable_and_case_insensitive():
+    assert city_shard("Москва", 4) == city_shard(" москва ", 4)
+    assert 0 <= city_shard("London", 3) < 3
+
+
+@pytest.mark.asyncio
+async def test_single_mode_runs_everything_without_db():
+    coordinator = Coordinator()
+
+    async with coordinator.broadcast_turn() as owns_city:
+        assert owns_city("Москва")
+    assert coordinator.is_leader
+
+
+@pytest.mark.asyncio
+async def test_leader_election_and_failover():
+    server = FakeLockServer()
+    first_engine, second_engine = FakeEngine(server), FakeEngine(server)
+    first = Coordinator(first_engine, mode="leader")
+    second = Coordinator(second_engine, mode="leader")
+
+    assert await first.heartbeat() is True
+    assert await second.heartbeat() is False
+
+    async with second.broadcast_turn() as owns_city:
+        assert owns_city is None, "Не-лидер не должен рассылать"
+
+    _crash(first_engine)
+    assert await first.heartbeat() is False
+    assert await second.heartbeat() is True
+    async with second.broadcast_turn() as owns_city:
+        assert owns_city("Москва")
+    assert any(t.startswith("acquired") for t in second.transitions)
+
+
+@pytest.mark.asyncio
+async def test_shard_mode_splits_cities_and_adopts_orphaned_shard():
+    server = FakeLockServer()
+    now = [0.0]
+    engines = [FakeEngine(server), FakeEngine(server)]
+    replicas = [
+        Coordinator(engines[i], mode="shard", shard_index=i, shard_count=2, clock=lambda: now[0]) for i in range(2)
+    ]
+    cities = _cities_by_shard(2)
+
+    for replica in replicas:
+        await replica.heartbeat()
+
+    async with replicas[0].broadcast_turn() as owns_city:
+        assert owns_city(cities[0]) and not owns_city(cities[1])
+    async with replicas[1].broadcast_turn() as owns_city:
+        assert owns_city(cities[1]) and not owns_city(cities[0])
+
+    _crash(engines[1])
+
+    async with replicas[0].broadcast_turn() as owns_city:
+        assert owns_city(cities[0]) and owns_city(cities[1]), "Доля упавшей реплики должна быть подхвачена"
+
+    # чужая доля отпускается в следующую минуту, и вернувшаяся реплика снова её забирает
+    restarted = Coordinator(FakeEngine(server), mode="shard", shard_index=1, shard_count=2)
+    assert await restarted.heartbeat() is False
+    now[0] += 60
+    await replicas[0].heartbeat()
+    assert await restarted.heartbeat() is True
+    async with replicas[0].broadcast_turn() as owns_city:
+        assert not owns_city(cities[1])
+
+
+@pytest.mark.asyncio
+async def test_orphaned_shard_is_adopted_once_per_minute():
+    server = FakeLockServer()
+    now = [120.0]
+    replicas = [
+        Coordinator(FakeEngine(server), mode="shard", shard_index=i, shard_count=3, clock=lambda: now[0])
+        for i in range(2)
+    ]
+    orphan = _cities_by_shard(3)[2]
+    for replica in replicas:
+        await replica.heartbeat()
+
+    # cron второй реплики срабатывает на несколько сотен мс позже, в ту же минуту
+    async with replicas[0].broadcast_turn() as owns_city:
+        assert owns_city(orphan)
+    now[0] += 0.3
+    async with replicas[1].broadcast_turn() as owns_city:
+        assert not owns_city(orphan), "Доля не должна рассылаться дважды за минуту"
+
+    # heartbeat внутри минуты долю не отпускает
+    now[0] += 10
+    await replicas[0].heartbeat()
+    async with replicas[1].broadcast_turn() as owns_city:
+        assert not owns_city(orphan)
+
+    # в следующую минуту долю может подхватить любая живая реплика, но только одна
+    now[0] += 60
+    await replicas[0].heartbeat()
+    async with replicas[1].broadcast_turn() as owns_city:
+        assert owns_city(orphan)
+    async with replicas[0].broadcast_turn() as owns_city:
+        assert not owns_city(orphan)
+
+
+def test_shard_index_must_be_in_range():
+    with pytest.raises(ValueError):
+        Coordinator(FakeEngine(FakeLockServer()), mode="shard", shard_index=3, shard_count=2)
@@ -84,4 +84,59 @@ async def test_daily_weather_flow(monkeypatch):
     assert "Ежедневный прогноз" in text_all
     assert ("Экстренное предупреждение" in text_all) or ("⚠️" in text_all)
     assert "Температура: <b>-22.0°C</b>" in text_all
-    assert "Ощущается как: <b>-25.0°C</b>" in text_all
\ No newline at end of file
+    assert "Ощущается как: <b>-25.0°C</b>" in text_all
+
+@pytest.mark.asyncio
+async def test_outbox_broadcast_hands_delivery_to_the_job(monkeypatch):
+    import app.main as main_module
+
+    enqueued = []
+    woken = []
+    counts = [{"pending": 1, "sent": 1}, {"sent": 2}]
+
+    class FakeStore:
+        def __init__(self, session_maker):
+            pass
+
+        async def enqueue(self, run_key, planned):
+            enqueued.extend(planned)
+            return len(planned)
+
+        async def claim(self, limit):
+            return []
+
+        async def run_counts(self, run_key):
+            return counts.pop(0)
+
+    class FakeJob:
+        def modify(self, **changes):
+            woken.append(changes["next_run_time"])
+
+    class FakeScheduler:
+        def get_job(self, job_id):
+            assert job_id == main_module.OUTBOX_JOB_ID
+            return FakeJob()
+
+    async def fake_get_current_weather(city: str):
+        return {"main": {"temp": 1.0}, "weather": [{"description": "ясно"}]}
+
+    monkeypatch.setattr(main_module, "DELIVERY_MODE", "outbox")
+    monkeypatch.setattr(main_module, "OutboxStore", FakeStore)
+    monkeypatch.setattr(main_module, "scheduler", FakeScheduler())
+    monkeypatch.setattr(main_module, "outbox_open_runs", set())
+    monkeypatch.setattr(main_module, "get_current_weather", fake_get_current_weather)
+
+    fake_bot = FakeBot()
+    await main_module._broadcast_to(fake_bot, None, "06:00", {"Тестоград": [1, 2]})
+
+    assert sorted(chat_id for chat_id, _, _ in enqueued) == [1, 2]
+    assert len(woken) == 1
+    assert fake_bot.messages == []
+    assert counts == [{"pending": 1, "sent": 1}, {"sent": 2}], "Рассылка не должна сама разбирать outbox"
+
+    # job сообщает итоги прогона, пока его строки не дойдут до конечного статуса
+    run_key = main_module.run_key_for("06:00")
+    await main_module.deliver_outbox(fake_bot)
+    assert main_module.outbox_open_runs == {run_key}
+    await main_module.deliver_outbox(fake_bot)
+    assert main_module.outbox_open_runs == set()
@@ -0,0 +1,90 @@
+import httpx
+import pytest
+from unittest.mock import patch
+
+from app import weather_client
+from app.geocoding import CoordinatesStore, coordinates_store, normalize_city_name
+from app.models import CityCoordinates
+
+
+class CountingAsyncClient:
+    calls: list[str] = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def get(self, url, params=None):
+        CountingAsyncClient.calls.append(url)
+        return httpx.Response(
+            status_code=200,
+            json=[{"lat": 59.94, "lon": 30.31}],
+            request=httpx.Request("GET", url),
+        )
+
+
+class FakeSession:
+    def __init__(self, row):
+        self.row = row
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def scalar(self, query):
+        return self.row
+
+
+def test_normalize_city_name():
+    assert normalize_city_name("  Санкт-Петербург ") == "санкт-петербург"
+    assert normalize_city_name("New   York") == "new york"
+
+
+@pytest.mark.asyncio
+async def test_lru_evicts_least_recently_used():
+    store = CoordinatesStore(max_entries=2)
+    await store.put("A", 1.0, 1.0)
+    await store.put("B", 2.0, 2.0)
+    assert await store.get("a") == (1.0, 1.0)
+    await store.put("C", 3.0, 3.0)
+
+    assert store.get_local("B") is None
+    assert store.get_local("A") == (1.0, 1.0)
+    assert store.stats.lru_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_db_hit_populates_lru():
+    store = CoordinatesStore()
+    store.attach(lambda: FakeSession(CityCoordinates(name="казань", lat=55.8, lon=49.1)))
+
+    assert await store.get("Казань") == (55.8, 49.1)
+    assert store.stats.db_hits == 1
+
+    store.detach()
+    assert await store.get("Казань") == (55.8, 49.1)
+    assert store.stats.lru_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_geocoder_called_only_on_true_miss():
+    original_key = weather_client.settings.openweather_api_key
+    weather_client.settings.openweather_api_key = "test-key"
+    CountingAsyncClient.calls = []
+    try:
+        with patch("httpx.AsyncClient", CountingAsyncClient):
+            first = await weather_client._get_city_coordinates("Геоград")
+            second = await weather_client._get_city_coordinates(" геоград ")
+    finally:
+        weather_client.settings.openweather_api_key = original_key
+        coordinates_store._lru.pop("геоград", None)
+
+    assert first == second == (59.94, 30.31)
+    assert len(CountingAsyncClient.calls) == 1
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from app.hedging import Hedger
+
+
+def _hedger(**kwargs) -> Hedger:
+    options = dict(enabled=True, initial_delay=0.02, min_delay=0.01, min_samples=5)
+    options.update(kwargs)
+    return Hedger(**options)
+
+
+async def _allow() -> bool:
+    return True
+
+
+async def _deny() -> bool:
+    return False
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_fast_copy_wins():
+    hedger = _hedger()
+    delays = iter([0.3, 0.01])
+    sent = 0
+
+    async def send():
+        nonlocal sent
+        sent += 1
+        call = sent
+        await asyncio.sleep(next(delays))
+        return call
+
+    assert await hedger.run(send, _allow) == 2
+    assert sent == 2
+    assert (hedger.stats.hedged, hedger.stats.hedge_wins) == (1, 1)
+    assert hedger.served.percentile(99) < 0.2
+
+    # проигравший запрос дорабатывает в фоне, и его время попадает в «без хеджа»
+    await asyncio.gather(*hedger._stragglers)
+    assert hedger.as_dict()["unhedged_p99_ms"] >= 300
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_without_quota_or_when_primary_is_fast():
+    hedger = _hedger()
+    sent = 0
+
+    async def send(delay):
+        nonlocal sent
+        sent += 1
+        await asyncio.sleep(delay)
+        return "ok"
+
+    assert await hedger.run(lambda: send(0.05), _deny) == "ok"
+    assert await hedger.run(lambda: send(0), _allow) == "ok"
+    assert sent == 2
+    assert hedger.stats.quota_denied == 1
+    assert hedger.as_dict()["hedge_rate"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_copy_does_not_hide_successful_one():
+    hedger = _hedger()
+    sent = 0
+
+    async def send():
+        nonlocal sent
+        sent += 1
+        if sent == 1:
+            await asyncio.sleep(0.05)
+            raise ConnectionError("reset")
+        await asyncio.sleep(0.1)
+        return "hedge"
+
+    assert await hedger.run(send, _allow) == "hedge"
+
+    async def always_fail():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        await hedger.run(always_fail, _allow)
+
+
+def test_hedge_delay_follows_observed_percentile():
+    hedger = _hedger(percentile=95)
+    assert hedger.delay() == 0.02
+    for ms in range(1, 101):
+        hedger.primary.observe(ms / 1000)
+    assert hedger.delay() == pytest.approx(0.095)
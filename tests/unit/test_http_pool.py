@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import weather_client
+from app.http_pool import WeatherHTTPPool
+
+
+async def _keepalive_server():
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                if not request:
+                    break
+                body = b'{"ok": true}'
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}/data"
+
+
+# network-маркер снимает блокировку httpx; запросы идут только на loopback
+@pytest.mark.network
+@pytest.mark.asyncio
+async def test_pool_reuses_connections():
+    server, url = await _keepalive_server()
+    pool = WeatherHTTPPool()
+    client = await pool.start()
+    try:
+        for _ in range(3):
+            resp = await weather_client._request_json(url, {}, client)
+            assert resp.json() == {"ok": True}
+        assert not client.is_closed
+    finally:
+        await pool.close()
+        server.close()
+        await server.wait_closed()
+
+    assert (pool.stats.requests, pool.stats.new_connections, pool.stats.reused) == (3, 1, 2)
+    assert pool.client is None
+
+
+@pytest.mark.network
+@pytest.mark.asyncio
+async def test_request_json_uses_shared_client_and_keeps_it_open(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(str(request.url))
+        return httpx.Response(200, json={"ok": True})
+
+    pool = WeatherHTTPPool()
+    await pool.start(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(weather_client, "weather_http", pool)
+    try:
+        await weather_client._request_json("https://example.test/a", {})
+        await weather_client._request_json("https://example.test/b", {})
+        assert not pool.client.is_closed
+    finally:
+        await pool.close()
+
+    assert calls == ["https://example.test/a", "https://example.test/b"]
+    assert pool.stats.requests == 2
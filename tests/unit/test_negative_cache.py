@@ -0,0 +1,75 @@
+import pytest
+
+from app import negative_cache as negative_cache_module
+from app import weather_client
+from app.negative_cache import NegativeCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    original_key = weather_client.settings.openweather_api_key
+    weather_client.settings.openweather_api_key = "real-key"
+    store: dict = {}
+
+    async def fake_get_cached(key):
+        return store.get(key)
+
+    async def fake_set_cached(key, value, ttl=300):
+        store[key] = value
+
+    for module in (weather_client, negative_cache_module):
+        monkeypatch.setattr(module, "get_cached", fake_get_cached)
+        monkeypatch.setattr(module, "set_cached", fake_set_cached)
+    negatives = NegativeCache(ttl=600)
+    monkeypatch.setattr(weather_client, "negative_cache", negatives)
+    monkeypatch.setattr(weather_client.snapshot_store, "record", lambda *args, **kwargs: None)
+    try:
+        yield negatives, store
+    finally:
+        weather_client.settings.openweather_api_key = original_key
+
+
+@pytest.mark.asyncio
+async def test_unknown_city_is_not_requested_twice(cache, monkeypatch):
+    negatives, store = cache
+    calls = 0
+
+    async def not_found(url, params, client=None, timeout=10.0):
+        nonlocal calls
+        calls += 1
+        raise weather_client.CityNotFoundError("Сервис вернул ошибку: city not found")
+
+    monkeypatch.setattr(weather_client, "_request_json", not_found)
+
+    for city in ("Масква", " масква "):
+        with pytest.raises(weather_client.CityNotFoundError):
+            await weather_client.get_current_weather(city)
+
+    assert calls == 1
+    assert store["notfound:масква"] == {"message": "Сервис вернул ошибку: city not found"}
+    assert (negatives.stats.stored, negatives.stats.hits) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_not_cached(cache, monkeypatch):
+    negatives, store = cache
+    calls = 0
+
+    async def owm_down(url, params, client=None, timeout=10.0):
+        nonlocal calls
+        calls += 1
+        raise weather_client.WeatherUnavailableError("Сервис вернул ошибку: HTTP 503")
+
+    async def no_snapshot(key):
+        return None
+
+    monkeypatch.setattr(weather_client, "_request_json", owm_down)
+    monkeypatch.setattr(weather_client.snapshot_store, "last_known", no_snapshot)
+
+    for _ in range(2):
+        with pytest.raises(weather_client.WeatherUnavailableError):
+            await weather_client.get_current_weather("Казань")
+
+    assert calls == 2
+    assert not any(key.startswith("notfound:") for key in store)
+    assert negatives.stats.stored == 0
@@ -0,0 +1,114 @@
+from datetime import datetime
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app import outbox
+from app.outbox import OutboxItem, OutboxStore, OutboxWorkerPool, retry_delay, run_key_for
+
+
+class FakeStore:
+    def __init__(self, items):
+        self.pending = list(items)
+        self.sent: list[int] = []
+        self.retried: list[tuple[int, int, float]] = []
+        self.failed: list[int] = []
+
+    async def claim(self, limit):
+        batch, self.pending = self.pending[:limit], self.pending[limit:]
+        for item in batch:
+            item.attempts += 1
+        return batch
+
+    async def mark_sent(self, item):
+        self.sent.append(item.id)
+
+    async def mark_retry(self, item, sent_parts, delay, error):
+        if item.attempts >= outbox.OUTBOX_MAX_ATTEMPTS:
+            self.failed.append(item.id)
+            return False
+        self.retried.append((item.id, sent_parts, delay))
+        return True
+
+    async def mark_failed(self, item, sent_parts, error):
+        self.failed.append(item.id)
+
+
+def test_run_key_and_backoff():
+    from datetime import datetime
+
+    assert run_key_for("06:00", datetime(2024, 5, 1, 6, 0, 3)) == "2024-05-01T06:00"
+    assert retry_delay(1) == outbox.OUTBOX_BACKOFF_INITIAL
+    assert retry_delay(2) == outbox.OUTBOX_BACKOFF_INITIAL * 2
+    assert retry_delay(100) == outbox.OUTBOX_BACKOFF_MAX
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_sends_and_marks_rows():
+    store = FakeStore([OutboxItem(i, 100 + i, ["daily", "alert"], 0, 0) for i in range(1, 8)])
+    delivered: list[tuple[int, str]] = []
+
+    async def send_text(chat_id, text):
+        delivered.append((chat_id, text))
+
+    stats = await OutboxWorkerPool(store, send_text, workers=3, batch_size=2).drain()
+
+    assert sorted(store.sent) == list(range(1, 8))
+    assert stats.claimed == 7 and stats.sent == 7
+    assert len(delivered) == 14
+    assert sum(stats.per_worker.values()) == 7
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_resumes_partially_sent_row_and_schedules_retries():
+    store = FakeStore([
+        OutboxItem(1, 101, ["daily", "alert"], 1, 0),
+        OutboxItem(2, 102, ["daily", "alert"], 0, 0),
+        OutboxItem(3, 103, ["daily"], 0, 0),
+    ])
+    delivered: list[tuple[int, str]] = []
+
+    async def send_text(chat_id, text):
+        if chat_id == 102 and text == "alert":
+            raise TelegramRetryAfter(method=SendMessage(chat_id=chat_id, text=text), message="flood", retry_after=7)
+        if chat_id == 103:
+            raise TelegramForbiddenError(method=SendMessage(chat_id=chat_id, text=text), message="blocked")
+        delivered.append((chat_id, text))
+
+    stats = await OutboxWorkerPool(store, send_text, workers=1).drain()
+
+    assert delivered == [(101, "alert"), (102, "daily")], "Уже отправленные части не должны дублироваться"
+    assert store.sent == [1]
+    assert store.retried == [(2, 1, 7)]
+    assert store.failed == [3]
+    assert (stats.sent, stats.retried, stats.failed) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_purge_deletes_only_finished_rows_past_retention():
+    statements = []
+
+    class Result:
+        rowcount = 3
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, statement):
+            statements.append(statement)
+            return Result()
+
+        async def commit(self):
+            pass
+
+    removed = await OutboxStore(Session).purge(retention_days=7, now=datetime(2024, 1, 8, 12, 0))
+
+    assert removed == 3
+    params = statements[0].compile().params
+    assert sorted(params["status_1"]) == ["failed", "sent"]
+    assert params["created_at_1"] == datetime(2024, 1, 1, 12, 0)
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+
+from app import swr
+from app.prefetch import WeatherPrefetcher
+from app.schedule_index import SubscriptionIndex
+from app.ttl_policy import current_soft_ttl
+
+
+@pytest.mark.asyncio
+async def test_prefetch_warms_cities_due_after_lookahead():
+    index = SubscriptionIndex()
+    index.load([
+        (1, 100, "Москва", "06:02"),
+        (2, 200, "Казань", "06:02"),
+        (3, 300, "Сочи", "06:00"),
+    ])
+    prefetcher = WeatherPrefetcher(index, lookahead_minutes=2)
+    fetched: list[str] = []
+
+    async def fetch(city: str):
+        fetched.append(city)
+        if city == "Казань":
+            raise RuntimeError("timeout")
+
+    warmed = await prefetcher.run(datetime(2024, 1, 1, 6, 0), fetch)
+
+    assert sorted(fetched) == ["Казань", "Москва"]
+    assert warmed == 1
+    assert prefetcher.stats.warmed == 1
+    assert prefetcher.stats.failed == 1
+
+
+@pytest.mark.asyncio
+async def test_prefetch_skipped_until_index_loaded():
+    prefetcher = WeatherPrefetcher(SubscriptionIndex())
+
+    async def fetch(city: str):
+        raise AssertionError("Без индекса префетч не должен ходить в API")
+
+    assert await prefetcher.run(datetime(2024, 1, 1, 6, 0), fetch) == 0
+
+
+def test_prefetch_hit_rate():
+    prefetcher = WeatherPrefetcher(SubscriptionIndex())
+
+    prefetcher.record_tick("06:00", "Москва", cache_hit=True)
+    prefetcher.record_tick("06:00", "Казань", cache_hit=True)
+    prefetcher.record_tick("06:00", "Сочи", cache_hit=False)
+    prefetcher.finish_tick("06:00")
+
+    assert prefetcher.stats.hit_rate == pytest.approx(2 / 3)
+    assert prefetcher.stats.as_dict()["tick_misses"] == 1
+
+
+def test_prefetched_entry_stays_fresh_until_tick(monkeypatch):
+    prefetcher = WeatherPrefetcher(SubscriptionIndex(), lookahead_minutes=2)
+    now = [10_000.0]
+    monkeypatch.setattr(swr, "_clock", lambda: now[0])
+
+    # станция давно не обновлялась: по dt soft TTL всего CURRENT_MIN_TTL
+    lagging = swr.wrap({"dt": now[0] - 1000})
+    # обычная запись, которая устареет между прогревом и тиком
+    now[0] -= 550
+    expiring = swr.wrap({"dt": now[0]})
+    now[0] += 550
+
+    assert swr.is_fresh(lagging, prefetcher.prefetch_ttl)[1]
+    assert swr.is_fresh(expiring, current_soft_ttl)[1]
+    assert not swr.is_fresh(expiring, prefetcher.prefetch_ttl)[1], "Прогрев должен обновить запись заранее"
+
+    now[0] += 120
+    assert not swr.is_fresh(lagging, current_soft_ttl)[1]
+    assert swr.is_fresh(lagging, prefetcher.tick_ttl)[1], "Прогретая запись должна дожить до тика"
@@ -0,0 +1,86 @@
+import httpx
+import pytest
+
+from app import quota, weather_client
+from app.quota import BROADCAST, INTERACTIVE, PREFETCH, QuotaExceededError, QuotaManager, quota_priority
+from tests.conftest import FakeClock
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+
+    async def fake_sleep(seconds):
+        clock.now += seconds
+
+    monkeypatch.setattr(quota, "_sleep", fake_sleep)
+    return clock
+
+
+@pytest.mark.asyncio
+async def test_background_traffic_leaves_reserve_for_users(clock):
+    manager = QuotaManager(per_minute=70, burst=10, clock=clock)
+
+    # prefetch останавливается на половине бакета и не ждёт
+    for _ in range(5):
+        await manager.acquire(PREFETCH)
+    with pytest.raises(QuotaExceededError):
+        await manager.acquire(PREFETCH)
+
+    # рассылка доедает бакет до резерва в 20%
+    for _ in range(3):
+        await manager.acquire(BROADCAST)
+    assert clock.now == 0
+
+    # резерв остаётся пользователям
+    for _ in range(2):
+        await manager.acquire(INTERACTIVE)
+    assert clock.now == 0
+
+    stats = manager.as_dict()["priorities"]
+    assert stats[PREFETCH] == {"granted": 5, "deferred": 0, "rejected": 1, "waited": 0.0}
+    assert stats[INTERACTIVE]["granted"] == 2
+
+
+@pytest.mark.asyncio
+async def test_broadcast_is_deferred_until_reserve_refills(clock):
+    manager = QuotaManager(per_minute=70, burst=10, clock=clock)
+    for _ in range(10):
+        await manager.acquire(INTERACTIVE)
+
+    with quota_priority(BROADCAST):
+        waited = await manager.acquire()
+
+    # одна минута пополняет 60 токенов: три нужны, чтобы взять токен и оставить резерв из двух
+    assert waited == pytest.approx(3.0)
+    assert manager.stats[BROADCAST].deferred == 1
+
+
+@pytest.mark.asyncio
+async def test_provider_throttling_pauses_every_priority(clock):
+    manager = QuotaManager(per_minute=70, burst=10, clock=clock)
+    manager.pause(5)
+
+    with pytest.raises(QuotaExceededError):
+        await manager.acquire(INTERACTIVE)
+    assert await manager.acquire(BROADCAST) == pytest.approx(5.0)
+    assert manager.as_dict()["throttled"] == 1
+
+
+@pytest.mark.network
+@pytest.mark.asyncio
+async def test_every_owm_endpoint_is_metered(monkeypatch):
+    granted = []
+
+    async def acquire(priority=None):
+        granted.append(priority)
+        return 0.0
+
+    monkeypatch.setattr(weather_client.owm_quota, "acquire", acquire)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200))) as client:
+        # у эндпоинта нет выключателя, но вызов всё равно расходует квоту тарифа
+        await weather_client._request_json("https://api.openweathermap.org/data/3.0/onecall", {}, client)
+        await weather_client._request_json("http://127.0.0.1:8080/data/2.5/weather", {}, client)
+
+    assert len(granted) == 1
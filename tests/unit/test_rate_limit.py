@@ -0,0 +1,101 @@
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app.broadcast import RetryDelivery, run_broadcast
+from app.rate_limit import TokenBucket
+from app.telegram_sender import TelegramSender
+from tests.conftest import FakeClock
+
+
+def _retry_after(seconds: int) -> TelegramRetryAfter:
+    method = SendMessage(chat_id=1, text="x")
+    return TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=seconds)
+
+
+def test_token_bucket_refills_at_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.delay_for() == pytest.approx(0.5)
+
+    clock.now = 0.5
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_token_bucket_pause_blocks_until_deadline():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, clock=clock)
+
+    bucket.pause(3)
+    assert not bucket.try_acquire()
+    assert bucket.delay_for() == pytest.approx(3)
+
+    clock.now = 3
+    assert bucket.try_acquire()
+
+
+class FloodBot:
+    def __init__(self, floods: int):
+        self.floods = floods
+        self.messages: list[tuple[int, str]] = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if self.floods:
+            self.floods -= 1
+            raise _retry_after(0)
+        self.messages.append((chat_id, text))
+
+
+@pytest.mark.asyncio
+async def test_sender_counts_flood_waits_and_reraises():
+    bot = FloodBot(floods=1)
+    sender = TelegramSender(global_rate=1000, per_chat_rate=1000, per_chat_burst=10)
+
+    with pytest.raises(TelegramRetryAfter):
+        await sender.send(bot, 1, "hello")
+    await sender.send(bot, 1, "hello")
+
+    assert bot.messages == [(1, "hello")]
+    assert sender.stats.flood_waits == 1
+    assert sender.stats.sent == 1
+
+
+@pytest.mark.asyncio
+async def test_broadcast_requeues_flood_controlled_delivery():
+    bot = FloodBot(floods=2)
+    sender = TelegramSender(global_rate=1000, per_chat_rate=1000, per_chat_burst=10)
+
+    async def fetch_city(city: str):
+        return ["daily", "alert"]
+
+    async def send_chat(chat_id: int, texts):
+        for index, text in enumerate(texts):
+            try:
+                await sender.send(bot, chat_id, text)
+            except TelegramRetryAfter as exc:
+                raise RetryDelivery(exc.retry_after, texts[index:]) from exc
+
+    stats = await run_broadcast({"Москва": [1, 2]}, fetch_city, send_chat)
+
+    assert sorted(bot.messages) == [(1, "alert"), (1, "daily"), (2, "alert"), (2, "daily")]
+    assert stats.send.retries == 2
+    assert stats.send.errors == 0
+
+
+@pytest.mark.asyncio
+async def test_broadcast_gives_up_after_max_retries():
+    async def fetch_city(city: str):
+        return ["daily"]
+
+    async def send_chat(chat_id: int, texts):
+        raise RetryDelivery(0, texts)
+
+    stats = await run_broadcast({"Москва": [1]}, fetch_city, send_chat, max_retries=2)
+
+    assert stats.send.retries == 2
+    assert stats.send.errors == 1
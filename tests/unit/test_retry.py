@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from app import weather_client
+from app.quota import BROADCAST, quota_priority
+from app.retry import RequestMetrics, RetryBudget, RetryPolicy, parse_retry_after
+
+WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+
+
+@pytest.fixture
+async def owm(monkeypatch):
+    # заглушка OWM отвечает по очереди заданными ответами, потом — 200
+    replies = []
+    sleeps = []
+    metrics = RequestMetrics()
+
+    def handler(request):
+        status, headers = replies.pop(0) if replies else (200, {})
+        return httpx.Response(status, json={"status": status}, headers=headers)
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(weather_client, "_sleep", fake_sleep)
+    # пауза квоты после 429 проверяется в test_quota; здесь ожидание видно по паузе ретрая
+    monkeypatch.setattr(weather_client.owm_quota, "pause", lambda seconds=None: None)
+    monkeypatch.setattr(weather_client, "owm_retry", RetryPolicy(budget=RetryBudget(ratio=0.1, max_tokens=10)))
+    monkeypatch.setattr(weather_client, "request_metrics", metrics)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        yield client, replies, sleeps, lambda: metrics.as_dict()["/data/2.5/weather"]
+
+
+@pytest.mark.network
+@pytest.mark.asyncio
+async def test_429_waits_for_retry_after(owm):
+    client, replies, sleeps, stats = owm
+    replies.extend([(429, {"Retry-After": "2"}), (503, {})])
+
+    with quota_priority(BROADCAST):
+        resp = await weather_client._request_json(WEATHER_URL, {}, client)
+
+    assert resp.json() == {"status": 200}
+    assert sleeps[0] == 2.0
+    assert (stats()["calls"], stats()["retries"], stats()["throttled"]) == (1, 2, 1)
+    assert stats()["attempts"]["buckets"]["le_3"] == 1
+    assert stats()["latency"]["count"] == 1
+
+
+@pytest.mark.network
+@pytest.mark.asyncio
+async def test_deadline_bounds_retries(owm):
+    client, replies, sleeps, stats = owm
+    replies.extend([(429, {"Retry-After": "30"})])
+
+    with quota_priority(BROADCAST), pytest.raises(weather_client.WeatherUnavailableError):
+        await weather_client._request_json(WEATHER_URL, {}, client, deadline=5)
+
+    assert sleeps == []
+    assert stats()["deadline_exceeded"] == 1
+    assert stats()["failures"] == 1
+
+
+@pytest.mark.network
+@pytest.mark.asyncio
+async def test_retry_budget_caps_retries(owm, monkeypatch):
+    client, replies, sleeps, stats = owm
+    monkeypatch.setattr(weather_client, "owm_retry", RetryPolicy(budget=RetryBudget(ratio=0.1, max_tokens=2)))
+    # 5xx считаются сбоями выключателя; здесь проверяем только бюджет
+    monkeypatch.setattr(weather_client, "breaker_for", lambda url: None)
+    replies.extend([(503, {})] * 10)
+
+    with quota_priority(BROADCAST):
+        for _ in range(3):
+            with pytest.raises(weather_client.WeatherUnavailableError):
+                await weather_client._request_json(WEATHER_URL, {}, client)
+
+    assert stats()["retries"] == 2
+    assert stats()["budget_exhausted"] == 3
+    assert stats()["failures"] == 3
+
+
+def test_parse_retry_after():
+    now = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("Mon, 01 Jan 2024 12:00:30 GMT", now=now) == 30.0
+    assert parse_retry_after("garbage") is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,161 @@
+import pytest
+
+import app.main as main_module
+from app.models import Subscription, User
+from app.schedule_index import SubscriptionIndex, minute_of_day, subscription_index
+
+
+def test_minute_of_day_bounds():
+    assert minute_of_day("00:00") == 0
+    assert minute_of_day("06:00") == 360
+    assert minute_of_day("23:59") == 1439
+    with pytest.raises(ValueError):
+        minute_of_day("24:00")
+
+
+def test_index_groups_due_users_by_city():
+    index = SubscriptionIndex()
+    index.load([
+        (1, 100, "Москва", "06:00"),
+        (2, 200, "Москва", "06:00"),
+        (3, 300, "Казань", "06:00"),
+        (4, 400, "Москва", "07:30"),
+    ])
+
+    assert index.loaded
+    assert index.due("06:00") == {"Москва": [100, 200], "Казань": [300]}
+    assert index.due("07:30") == {"Москва": [400]}
+    assert index.due("12:00") == {}
+
+
+def test_index_incremental_updates():
+    index = SubscriptionIndex()
+    index.load([(1, 100, "Москва", "06:00"), (2, 200, "Москва", "06:00")])
+
+    index.upsert(1, 100, "Москва", "08:15")
+    index.update_city(2, "Тверь")
+    index.upsert(3, 300, "Сочи", None)
+    index.remove(42)
+
+    assert index.due("08:15") == {"Москва": [100]}
+    assert index.due("06:00") == {"Тверь": [200], "Сочи": [300]}
+
+    index.remove(2)
+    assert index.due("06:00") == {"Сочи": [300]}
+    assert len(index) == 2
+
+
+def test_reconcile_replays_changes_made_during_load():
+    index = SubscriptionIndex()
+    index.load([(1, 100, "Москва", "06:00")])
+
+    index.begin_reconcile()
+    index.upsert(2, 200, "Казань", "09:00")
+    drift = index.finish_reconcile([(1, 100, "Москва", "06:30")])
+
+    assert index.due("06:30") == {"Москва": [100]}
+    assert index.due("09:00") == {"Казань": [200]}
+    assert drift == 1
+
+
+class FakeSession:
+    def __init__(self, user, subscription):
+        self.user = user
+        self.subscription = subscription
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def scalar(self, query):
+        entity = query.column_descriptions[0]["entity"]
+        if entity is User:
+            return self.user
+        if entity is Subscription:
+            return self.subscription
+        return None
+
+    def add(self, obj):
+        self.subscription = obj
+
+    async def commit(self):
+        return None
+
+    async def execute(self, query):
+        raise AssertionError("Рассылка не должна ходить в БД, когда индекс загружен")
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.messages.append(chat_id)
+
+
+@pytest.fixture
+def loaded_index():
+    subscription_index.load([])
+    try:
+        yield subscription_index
+    finally:
+        subscription_index.load([])
+        subscription_index.loaded = False
+
+
+@pytest.mark.asyncio
+async def test_handlers_keep_index_in_sync(monkeypatch, loaded_index):
+    user = User(id=7, telegram_id=700, username="idx", city="Пермь", subscribed=True)
+    session = FakeSession(user, None)
+
+    await main_module.save_notification_time(session, user.id, "10:45")
+    assert loaded_index.due("10:45") == {"Пермь": [700]}
+
+    monkeypatch.setattr(main_module, "async_session_maker", lambda: session)
+
+    async def fake_get_current_weather(city: str):
+        return {"main": {"temp": 1.0}, "weather": [{"description": "ясно"}]}
+
+    monkeypatch.setattr(main_module, "get_current_weather", fake_get_current_weather)
+
+    bot = FakeBot()
+    await main_module.send_daily_weather(bot, current_time="10:45")
+    assert bot.messages == [700]
+
+    class Message:
+        text = "/unsubscribe"
+        from_user = type("FromUser", (), {"id": 700, "username": "idx"})
+
+        async def answer(self, *args, **kwargs):
+            return None
+
+    await main_module.unsubscribe_daily(Message())
+    assert loaded_index.due("10:45") == {}
+
+
+@pytest.mark.asyncio
+async def test_multi_replica_broadcast_reads_recipients_from_db(monkeypatch, loaded_index):
+    # подписку оформили на другой реплике: локальный индекс о ней не знает до сверки
+    loaded_index.load([(1, 100, "Москва", "07:30")])
+    monkeypatch.setattr(main_module.coordinator, "mode", "leader")
+    monkeypatch.setattr(main_module.coordinator, "_held", {main_module.coordinator.lock_key})
+
+    async def no_heartbeat():
+        return True
+
+    async def load_users_by_city(target_time):
+        assert target_time == "07:30"
+        return {"Москва": [100, 200]}
+
+    async def fake_get_current_weather(city: str):
+        return {"main": {"temp": 1.0}, "weather": [{"description": "ясно"}]}
+
+    monkeypatch.setattr(main_module.coordinator, "heartbeat", no_heartbeat)
+    monkeypatch.setattr(main_module, "_load_users_by_city", load_users_by_city)
+    monkeypatch.setattr(main_module, "get_current_weather", fake_get_current_weather)
+
+    bot = FakeBot()
+    await main_module.send_daily_weather(bot, current_time="07:30")
+    assert sorted(bot.messages) == [100, 200]
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from app import weather_client
+from app.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = 0
+    gate = asyncio.Event()
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await gate.wait()
+        return {"temp": 1}
+
+    waiters = [asyncio.create_task(flight.do("k", fetch)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert flight.in_flight("k")
+    gate.set()
+    results = await asyncio.gather(*waiters)
+
+    assert calls == 1
+    assert all(r == {"temp": 1} for r in results)
+    assert (flight.stats.leaders, flight.stats.coalesced) == (1, 4)
+    assert not flight.in_flight("k")
+
+
+@pytest.mark.asyncio
+async def test_error_is_shared_and_next_call_retries():
+    flight = SingleFlight()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise weather_client.WeatherClientError("boom")
+
+    results = await asyncio.gather(*(flight.do("k", failing) for _ in range(3)), return_exceptions=True)
+    assert calls == 1
+    assert all(isinstance(r, weather_client.WeatherClientError) for r in results)
+
+    async def ok():
+        return 42
+
+    assert await flight.do("k", ok) == 42
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+    gate = asyncio.Event()
+
+    async def fetch():
+        await gate.wait()
+        return "done"
+
+    leader = asyncio.create_task(flight.do("k", fetch))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("k", fetch))
+    await asyncio.sleep(0)
+    leader.cancel()
+    gate.set()
+
+    assert await follower == "done"
+
+
+@pytest.mark.asyncio
+async def test_get_current_weather_coalesces_concurrent_misses(monkeypatch):
+    original_key = weather_client.settings.openweather_api_key
+    weather_client.settings.openweather_api_key = "test-key"
+    requests = 0
+
+    class FakeResponse:
+        def json(self):
+            return {"main": {"temp": 5.0}}
+
+    async def fake_request_json(url, params, client=None, timeout=10.0):
+        nonlocal requests
+        requests += 1
+        await asyncio.sleep(0.01)
+        return FakeResponse()
+
+    monkeypatch.setattr(weather_client, "_request_json", fake_request_json)
+    try:
+        results = await asyncio.gather(*(weather_client.get_current_weather("Москва") for _ in range(10)))
+    finally:
+        weather_client.settings.openweather_api_key = original_key
+
+    assert requests == 1
+    assert all(r["main"]["temp"] == 5.0 for r in results)
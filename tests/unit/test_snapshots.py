@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from app import swr, weather_client
+from app.snapshots import SnapshotStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    original_key = weather_client.settings.openweather_api_key
+    weather_client.settings.openweather_api_key = "real-key"
+    snapshots = SnapshotStore()
+    monkeypatch.setattr(weather_client, "snapshot_store", snapshots)
+    try:
+        yield snapshots
+    finally:
+        weather_client.settings.openweather_api_key = original_key
+
+
+@pytest.mark.asyncio
+async def test_last_known_weather_is_served_when_owm_is_down(store, monkeypatch):
+    cache: dict = {}
+
+    async def fake_get_cached(key):
+        return cache.get(key)
+
+    async def fake_set_cached(key, value, ttl=300):
+        cache[key] = value
+
+    async def owm_down(url, params, client=None, timeout=10.0):
+        raise weather_client.WeatherUnavailableError("Сервис вернул ошибку: HTTP 503")
+
+    monkeypatch.setattr(weather_client, "get_cached", fake_get_cached)
+    monkeypatch.setattr(weather_client, "set_cached", fake_set_cached)
+    monkeypatch.setattr(weather_client, "_request_json", owm_down)
+    fetched_at = time.time() - 3600
+    store.record("current_weather:москва", {"main": {"temp": -2.0}, "weather": [], "wind": {}}, fetched_at)
+
+    data = await weather_client.get_current_weather("Москва")
+
+    assert data["main"]["temp"] == -2.0
+    assert data["last_known_at"] == fetched_at
+    assert "Сервис погоды недоступен" in weather_client.format_weather_message("Москва", data)
+    with pytest.raises(weather_client.WeatherUnavailableError):
+        await weather_client.get_current_weather("Казань")
+
+
+@pytest.mark.asyncio
+async def test_rehydrate_restores_only_live_missing_entries(store, monkeypatch):
+    now = 10_000.0
+    monkeypatch.setattr(swr, "_clock", lambda: now)
+    written = {}
+
+    async def fake_load_recent(max_age):
+        return [
+            ("current_weather:москва", {"main": {}}, now - 60),
+            ("current_weather:казань", {"main": {}}, now - swr.CURRENT_HARD_TTL - 1),
+            ("current_weather:сочи", {"main": {}}, now - 30),
+            ("forecast:55.7500:37.6200", ([], 10800), now - 600),
+        ]
+
+    async def fake_get_many(keys):
+        return {"current_weather:сочи": {"v": {}, "ts": now}}
+
+    async def fake_set_cached(key, value, ttl=300):
+        written[key] = (value, ttl)
+
+    monkeypatch.setattr(store, "load_recent", fake_load_recent)
+    monkeypatch.setattr(weather_client, "get_many", fake_get_many)
+    monkeypatch.setattr(weather_client, "set_cached", fake_set_cached)
+
+    restored = await weather_client.rehydrate_cache()
+
+    assert restored == 2
+    assert written["current_weather:москва"] == ({"v": {"main": {}}, "ts": now - 60}, swr.CURRENT_HARD_TTL - 60)
+    assert written["forecast:55.7500:37.6200"][1] == swr.FORECAST_HARD_TTL - 600
+    assert store.stats.rehydrated == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_pending_snapshots():
+    class BrokenSession:
+        async def __aenter__(self):
+            raise ConnectionError("db down")
+
+        async def __aexit__(self, *exc):
+            return False
+
+    store = SnapshotStore()
+    store.attach(lambda: BrokenSession())
+    store.record("current_weather:москва", {"main": {"temp": 1.0}}, 100.0)
+
+    assert await store.flush() == 0
+    assert store.stats.db_errors == 1
+    snapshot = await store.last_known("current_weather:москва", max_age=float("inf"))
+    assert snapshot == ("current_weather:москва", {"main": {"temp": 1.0}}, 100.0)
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from app import swr
+from app.singleflight import SingleFlight
+
+
+class FakeCache:
+    def __init__(self):
+        self.store = {}
+        self.ttls = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ttl=300):
+        self.store[key] = value
+        self.ttls[key] = ttl
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(swr, "_clock", lambda: now[0])
+    return now
+
+
+async def _get(cache, fetch, stats, flight=None):
+    return await swr.get_or_fetch(
+        "k",
+        fetch,
+        soft_ttl=60,
+        hard_ttl=600,
+        flight=flight or SingleFlight(),
+        get=cache.get,
+        set=cache.set,
+        stats=stats,
+    )
+
+
+@pytest.mark.asyncio
+async def test_fresh_stale_and_expired_entries(clock):
+    cache = FakeCache()
+    stats = swr.SWRStats()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    assert await _get(cache, fetch, stats) == (1, swr.MISS)
+    assert cache.ttls["k"] == 600
+
+    clock[0] += 30
+    assert await _get(cache, fetch, stats) == (1, swr.FRESH)
+
+    # между soft и hard TTL — старое значение сразу, новое приезжает фоном
+    clock[0] += 60
+    assert await _get(cache, fetch, stats) == (1, swr.STALE)
+    await asyncio.gather(*swr._refresh_tasks)
+    assert await _get(cache, fetch, stats) == (2, swr.FRESH)
+
+    clock[0] += 601
+    assert await _get(cache, fetch, stats) == (3, swr.MISS)
+    assert (stats.fresh_hits, stats.stale_hits, stats.misses, stats.background_refreshes) == (2, 1, 2, 1)
+
+
+@pytest.mark.asyncio
+async def test_stale_reads_trigger_one_refresh(clock):
+    cache = FakeCache()
+    cache.store["k"] = swr.wrap("old")
+    stats = swr.SWRStats()
+    flight = SingleFlight()
+    gate = asyncio.Event()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await gate.wait()
+        return "new"
+
+    clock[0] += 120
+    results = []
+    for _ in range(5):
+        results.append(await _get(cache, fetch, stats, flight))
+        await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(*swr._refresh_tasks)
+
+    assert results == [("old", swr.STALE)] * 5
+    assert calls == 1
+    assert stats.background_refreshes == 1
+    assert swr.unwrap(cache.store["k"])[0] == "new"
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_stale_value(clock):
+    cache = FakeCache()
+    cache.store["k"] = swr.wrap("old")
+    stats = swr.SWRStats()
+
+    async def fetch():
+        raise RuntimeError("owm down")
+
+    clock[0] += 120
+    assert await _get(cache, fetch, stats) == ("old", swr.STALE)
+    await asyncio.gather(*swr._refresh_tasks)
+
+    assert stats.refresh_errors == 1
+    assert swr.unwrap(cache.store["k"])[0] == "old"
+
+
+@pytest.mark.asyncio
+async def test_soft_ttl_policy_and_unchanged_refetches(clock):
+    cache = FakeCache()
+    stats = swr.SWRStats()
+    observations = iter([{"dt": 900}, {"dt": 900}, {"dt": 1500}])
+
+    async def fetch():
+        return next(observations)
+
+    # свежесть зависит от значения: ждём следующего наблюдения к dt + 600
+    def soft_ttl(value, fetched_at):
+        return max(30, value["dt"] + 600 - fetched_at)
+
+    async def get():
+        return await swr.get_or_fetch(
+            "k", fetch, soft_ttl=soft_ttl, hard_ttl=3600, flight=SingleFlight(), get=cache.get, set=cache.set, stats=stats
+        )
+
+    assert await get() == ({"dt": 900}, swr.MISS)
+    clock[0] += 400
+    assert (await get())[1] == swr.FRESH
+    clock[0] += 200
+    assert (await get())[1] == swr.STALE
+    await asyncio.gather(*swr._refresh_tasks)
+    clock[0] += 31
+    assert (await get())[1] == swr.STALE
+    await asyncio.gather(*swr._refresh_tasks)
+
+    assert swr.unwrap(cache.store["k"])[0] == {"dt": 1500}
+    assert (stats.refetches, stats.unchanged_refetches) == (2, 1)
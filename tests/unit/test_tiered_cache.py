@@ -0,0 +1,157 @@
+import asyncio
+
+import pytest
+
+from app.cache import BoundedTTLCache, TieredCache
+
+
+class FakeBroker:
+    def __init__(self):
+        self.data = {}
+        self.subscribers = []
+        self.gets = 0
+        self.round_trips = 0
+        self.down = False
+
+
+class FakePipeline:
+    def __init__(self, broker):
+        self.broker = broker
+        self.ops = []
+
+    def mget(self, keys):
+        self.ops.append(("mget", keys))
+
+    def pttl(self, key):
+        self.ops.append(("pttl", key))
+
+    def set(self, key, value, ex=None):
+        self.ops.append(("set", key, value))
+
+    def publish(self, channel, message):
+        self.ops.append(("publish", message))
+
+    async def execute(self):
+        if self.broker.down:
+            raise ConnectionError("redis down")
+        self.broker.round_trips += 1
+        results = []
+        for op in self.ops:
+            if op[0] == "mget":
+                self.broker.gets += 1
+                results.append([self.broker.data.get(key) for key in op[1]])
+            elif op[0] == "pttl":
+                results.append(60000 if op[1] in self.broker.data else -2)
+            elif op[0] == "set":
+                self.broker.data[op[1]] = op[2]
+                results.append(True)
+            else:
+                for queue in self.broker.subscribers:
+                    queue.put_nowait({"type": "message", "data": op[1]})
+                results.append(len(self.broker.subscribers))
+        return results
+
+
+class FakePubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.broker.subscribers.append(self.queue)
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def aclose(self):
+        self.broker.subscribers.remove(self.queue)
+
+
+class FakeRedis:
+    def __init__(self, broker):
+        self.broker = broker
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.broker)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self.broker)
+
+    async def ping(self):
+        if self.broker.down:
+            raise ConnectionError("redis down")
+        return True
+
+    async def aclose(self):
+        pass
+
+
+def _replica(broker):
+    return TieredCache(FakeRedis(broker), BoundedTTLCache(shards=1), l1_ttl=30)
+
+
+@pytest.mark.asyncio
+async def test_hot_keys_are_served_from_l1():
+    broker = FakeBroker()
+    writer, reader = _replica(broker), _replica(broker)
+    await writer.set("current_weather:москва", {"temp": 1}, ttl=300)
+
+    for _ in range(100):
+        assert await reader.get("current_weather:москва") == {"temp": 1}
+
+    assert broker.gets == 1
+    assert (reader.stats.l1_hits, reader.stats.l2_hits) == (99, 1)
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_other_replicas_l1():
+    broker = FakeBroker()
+    a, b = _replica(broker), _replica(broker)
+    a.start()
+    b.start()
+    await asyncio.sleep(0)
+    try:
+        await a.set("k", {"v": 1})
+        assert await b.get("k") == {"v": 1}
+
+        await a.set("k", {"v": 2})
+        await asyncio.sleep(0)
+
+        assert await b.get("k") == {"v": 2}
+        assert b.stats.invalidations_received == 2
+        assert a.stats.invalidations_received == 0
+    finally:
+        await a.close()
+        await b.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_outage_degrades_to_l1():
+    broker = FakeBroker()
+    cache = _replica(broker)
+    await cache.set("k", {"v": 1})
+    broker.down = True
+
+    assert await cache.get("k") == {"v": 1}
+    assert await cache.get("other") is None
+    health = await cache.health()
+
+    assert health["redis"] == "down"
+    assert health["l2_errors"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_get_many_resolves_misses_in_one_round_trip():
+    broker = FakeBroker()
+    writer, reader = _replica(broker), _replica(broker)
+    await writer.set_many({f"city:{i}": {"v": i} for i in range(20)}, ttl=300)
+    assert broker.round_trips == 1
+
+    await reader.get("city:0")
+    broker.round_trips = 0
+    found = await reader.get_many([f"city:{i}" for i in range(25)])
+
+    assert broker.round_trips == 1
+    assert found == {f"city:{i}": {"v": i} for i in range(20)}
+    assert (reader.stats.l1_hits, reader.stats.l2_hits, reader.stats.misses) == (1, 20, 5)
@@ -0,0 +1,173 @@
+import asyncio
+import socket
+
+import httpx
+import pytest
+
+from app import http_pool, weather_client
+from app.circuit_breaker import owm_breakers
+from app.quota import BROADCAST, quota_priority
+from app.retry import RequestMetrics
+from app.http_pool import WeatherHTTPPool
+from app.transport import CachingDNSTransport, DNSCache
+from tests.conftest import FakeClock
+
+
+@pytest.mark.asyncio
+async def test_dns_cache_honours_ttl():
+    clock = FakeClock(100.0)
+    lookups = []
+
+    async def resolver(host, port):
+        lookups.append(host)
+        return ["10.0.0.1"]
+
+    cache = DNSCache(ttl=60, resolver=resolver, clock=clock)
+    assert await cache.resolve("api.openweathermap.org", 443) == ["10.0.0.1"]
+    assert await cache.resolve("api.openweathermap.org", 443) == ["10.0.0.1"]
+    clock.now += 61
+    await cache.resolve("api.openweathermap.org", 443)
+
+    assert len(lookups) == 2
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_dns_cache_coalesces_and_falls_back_to_expired_entry():
+    clock = FakeClock(100.0)
+    calls = 0
+    fail = False
+
+    async def resolver(host, port):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        if fail:
+            raise OSError("resolver down")
+        return ["10.0.0.2"]
+
+    cache = DNSCache(ttl=60, resolver=resolver, clock=clock)
+    results = await asyncio.gather(*(cache.resolve("owm", 443) for _ in range(5)))
+    assert calls == 1
+    assert all(r == ["10.0.0.2"] for r in results)
+
+    clock.now += 120
+    fail = True
+    assert await cache.resolve("owm", 443) == ["10.0.0.2"]
+    assert cache.stats.errors == 1
+
+
+@pytest.mark.asyncio
+async def test_keep_warm_only_after_idle_real_traffic(monkeypatch):
+    pool = WeatherHTTPPool()
+    pool.client = object()
+    clock = FakeClock(100.0)
+    warmed = []
+
+    async def fake_prewarm(client, url, connections):
+        warmed.append(url)
+        return connections
+
+    monkeypatch.setattr(http_pool, "prewarm", fake_prewarm)
+    monkeypatch.setattr(http_pool.time, "monotonic", clock)
+
+    # трафика ещё не было — прогревать нечего
+    assert await pool.keep_warm(idle_seconds=20) == 0
+    pool.last_used = 95.0
+    assert await pool.keep_warm(idle_seconds=20) == 0
+    clock.now = 130.0
+    assert await pool.keep_warm(idle_seconds=20) > 0
+    # без нового трафика повторно не прогреваем
+    clock.now = 200.0
+    assert await pool.keep_warm(idle_seconds=20) == 0
+
+    pool.last_used = 205.0
+    clock.now = 230.0
+    assert await pool.keep_warm(idle_seconds=20) > 0
+    assert warmed == [pool.base_url, pool.base_url]
+    assert pool.stats.prewarms == 2
+
+
+@pytest.mark.network
+@pytest.mark.asyncio
+async def test_prewarm_is_not_counted_as_traffic():
+    methods = []
+
+    def handler(request):
+        methods.append(request.method)
+        return httpx.Response(200)
+
+    pool = WeatherHTTPPool()
+    await pool.start(transport=httpx.MockTransport(handler))
+    try:
+        assert await pool.prewarm(connections=2) == 2
+        assert (pool.stats.requests, pool.last_used) == (0, None)
+        await pool.client.get(pool.base_url + "/data/2.5/weather")
+    finally:
+        await pool.close()
+
+    assert methods == ["HEAD", "HEAD", "GET"]
+    assert pool.stats.requests == 1
+    assert pool.stats.prewarms == 1
+
+
+# network-маркер снимает блокировку httpx; соединения идут только на loopback
+@pytest.mark.network
+@pytest.mark.asyncio
+async def test_caching_dns_transport_resolves_through_cache_and_maps_errors():
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    lookups = []
+
+    async def resolver(host, port):
+        lookups.append(host)
+        return ["127.0.0.1"]
+
+    transport = CachingDNSTransport(httpx.Limits(max_connections=2), DNSCache(ttl=60, resolver=resolver))
+    try:
+        async with httpx.AsyncClient(transport=transport) as client:
+            for _ in range(2):
+                resp = await client.get(f"http://owm.test:{port}/data")
+                assert (resp.status_code, resp.text) == (200, "ok")
+            server.close()
+            await server.wait_closed()
+            with pytest.raises(httpx.ConnectError):
+                await client.get(f"http://owm.test:{port}/data")
+    finally:
+        server.close()
+
+    assert lookups == ["owm.test"]
+
+
+@pytest.mark.network
+@pytest.mark.asyncio
+async def test_dns_failure_is_transient_and_retried(monkeypatch):
+    lookups = []
+    metrics = RequestMetrics()
+
+    async def resolver(host, port):
+        lookups.append(host)
+        raise socket.gaierror(socket.EAI_AGAIN, "Temporary failure in name resolution")
+
+    async def no_sleep(seconds):
+        return None
+
+    monkeypatch.setattr(weather_client, "_sleep", no_sleep)
+    monkeypatch.setattr(weather_client, "request_metrics", metrics)
+    transport = CachingDNSTransport(httpx.Limits(max_connections=2), DNSCache(ttl=60, resolver=resolver))
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        with quota_priority(BROADCAST), pytest.raises(weather_client._TransientOWMError, match="Ошибка сети"):
+            await weather_client._request_json("https://api.openweathermap.org/data/2.5/weather", {}, client)
+
+    # сбой резолвера — обычная сетевая ошибка: её повторяют и засчитывают выключателю
+    stats = metrics.as_dict()["/data/2.5/weather"]
+    assert stats["retries"] >= 1
+    assert len(lookups) == stats["retries"] + 1
+    assert owm_breakers["weather"].stats.failures == len(lookups)
@@ -0,0 +1,25 @@
+from app import swr, ttl_policy
+
+
+def test_current_ttl_follows_observation_time():
+    # наблюдение 2 минуты назад — следующее ждём через cadence - 120 + grace
+    ttl = ttl_policy.current_soft_ttl({"dt": 10_000}, 10_120)
+    assert ttl == ttl_policy.CURRENT_CADENCE - 120 + ttl_policy.UPDATE_GRACE
+
+
+def test_overdue_observation_is_rechecked_soon():
+    ttl = ttl_policy.current_soft_ttl({"dt": 10_000}, 10_000 + 3 * ttl_policy.CURRENT_CADENCE)
+    assert ttl == ttl_policy.CURRENT_MIN_TTL
+
+
+def test_current_ttl_without_dt_uses_default():
+    assert ttl_policy.current_soft_ttl({"main": {}}, 10_000) == swr.CURRENT_SOFT_TTL
+
+
+def test_forecast_ttl_ends_at_next_slot():
+    cadence = ttl_policy.FORECAST_CADENCE
+    fetched_at = 100 * cadence + 600
+    ttl = ttl_policy.forecast_soft_ttl(([], 0), fetched_at)
+    assert ttl == cadence - 600 + ttl_policy.UPDATE_GRACE
+    # у самой границы слота не перепрашиваем чаще минимума
+    assert ttl_policy.forecast_soft_ttl(([], 0), 101 * cadence - 10) == ttl_policy.FORECAST_MIN_TTL
@@ -1,73 +1,77 @@
-import importlib
+import httpx
 import pytest
 
-@pytest.mark.asyncio
-async def test_get_weather_fetches_and_caches(monkeypatch):
-    monkeypatch.setenv("OPEN_WEATHER_KEY", "dummy_key_for_tests")
-    import services.weather_api as wa
-    importlib.reload(wa)
+import services.weather_api as wa
+from app import optimized_weather, weather_client
+
 
+@pytest.mark.asyncio
+async def test_get_weather_maps_engine_payload(monkeypatch):
     fake_data = {
         "name": "TestCity",
         "main": {"temp": 12.0, "humidity": 80},
         "wind": {"speed": 3.0},
         "weather": [{"description": "sunny"}],
     }
+    requested = []
 
-    class FakeHTTPClient:
-        @staticmethod
-        async def fetch_json(url, params=None, timeout=10):
-            return fake_data
+    async def fake_get_current_weather(city, **kwargs):
+        requested.append(city)
+        return fake_data
 
-    monkeypatch.setattr(wa, "HTTPClient", FakeHTTPClient)
+    monkeypatch.setattr(wa, "get_current_weather", fake_get_current_weather)
 
-    async def fake_get_cached(key):
-        return None
+    res = await wa.get_weather("TestCity")
 
-    called = {}
+    assert res == {"city": "TestCity", "temp": 12.0, "humidity": 80, "wind": 3.0, "description": "sunny"}
+    assert requested == ["TestCity"]
 
-    async def fake_set_cached(key, value, ttl=300):
-        called["key"] = key
-        called["value"] = value
+    imperial = await wa.get_weather("TestCity", units="imperial")
+    assert imperial["temp"] == pytest.approx(53.6)
 
-    monkeypatch.setattr(wa, "get_cached", fake_get_cached)
-    monkeypatch.setattr(wa, "set_cached", fake_set_cached)
 
-    res = await wa.get_weather("TestCity")
+@pytest.mark.asyncio
+async def test_get_weather_returns_none_on_engine_error(monkeypatch):
+    async def not_found(city, **kwargs):
+        raise weather_client.CityNotFoundError("city not found")
+
+    monkeypatch.setattr(wa, "get_current_weather", not_found)
 
-    assert res is not None
-    assert res["city"] == "TestCity"
-    assert res["temp"] == 12.0
-    assert res["humidity"] == 80
-    assert res["wind"] == 3.0
-    assert res["description"] == "sunny"
-    assert called.get("key") == "weather:testcity:metric"
-    assert called.get("value") == res
+    assert await wa.get_weather("Масква") is None
 
 
 @pytest.mark.asyncio
-async def test_get_weather_returns_cached(monkeypatch):
-    monkeypatch.setenv("OPEN_WEATHER_KEY", "dummy_key_for_tests")
-    import services.weather_api as wa
-    importlib.reload(wa)
-
-    fake_cached = {
-        "city": "CachedCity",
-        "temp": 10.0,
-        "humidity": 50,
-        "wind": 2.0,
-        "description": "cached",
-    }
+async def test_all_entry_points_share_one_request_and_cache_key(monkeypatch):
+    original_key = weather_client.settings.openweather_api_key
+    weather_client.settings.openweather_api_key = "real-key"
+    cache: dict = {}
+    calls = 0
 
     async def fake_get_cached(key):
-        return fake_cached
+        return cache.get(key)
 
-    async def should_not_fetch(url, params=None, timeout=10):
-        raise AssertionError("HTTP fetch should not be called when cache returns value")
-
-    monkeypatch.setattr(wa, "get_cached", fake_get_cached)
-    monkeypatch.setattr(wa, "_fetch_json_direct", should_not_fetch)
-    monkeypatch.setattr(wa, "HTTPClient", None)
-
-    res = await wa.get_weather("AnyCityName")
-    assert res == fake_cached
\ No newline at end of file
+    async def fake_set_cached(key, value, ttl=300):
+        cache[key] = value
+
+    async def fake_request_json(url, params, client=None, timeout=10.0):
+        nonlocal calls
+        calls += 1
+        return httpx.Response(
+            200,
+            json={"name": "London", "main": {"temp": 10.0, "humidity": 70}, "wind": {"speed": 2.0}, "weather": []},
+            request=httpx.Request("GET", url),
+        )
+
+    monkeypatch.setattr(weather_client, "get_cached", fake_get_cached)
+    monkeypatch.setattr(weather_client, "set_cached", fake_set_cached)
+    monkeypatch.setattr(weather_client, "_request_json", fake_request_json)
+    monkeypatch.setattr(weather_client.snapshot_store, "record", lambda *args, **kwargs: None)
+    try:
+        await weather_client.get_current_weather("London")
+        await optimized_weather.get_weather("london", ttl=300)
+        await wa.get_weather(" London ")
+    finally:
+        weather_client.settings.openweather_api_key = original_key
+
+    assert calls == 1
+    assert list(cache) == ["current_weather:london"]
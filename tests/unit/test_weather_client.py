@@ -146,4 +146,62 @@ def test_weekly_forecast_uses_main_for_icons():
 
     result = weather_client.format_weekly_forecast("Новосибирск", daily, 0)
 
-    assert "❄️" in result
\ No newline at end of file
+    assert "❄️" in result
+
+@pytest.mark.asyncio
+async def test_daily_forecast_shares_one_entry_across_day_counts(monkeypatch):
+    store: dict = {}
+    fetches: list[tuple[float, float]] = []
+
+    async def fake_get_cached(key):
+        return store.get(key)
+
+    async def fake_set_cached(key, value, ttl=300):
+        store[key] = value
+
+    async def fake_coordinates(city, client=None):
+        return 55.75, 37.62
+
+    async def fake_fetch(lat, lon, client=None):
+        fetches.append((lat, lon))
+        return [{"date": date(2024, 1, d), "description": "ясно"} for d in range(1, 6)], 10800
+
+    monkeypatch.setattr(weather_client, "get_cached", fake_get_cached)
+    monkeypatch.setattr(weather_client, "set_cached", fake_set_cached)
+    monkeypatch.setattr(weather_client, "_get_city_coordinates", fake_coordinates)
+    monkeypatch.setattr(weather_client, "_fetch_forecast", fake_fetch)
+    stats = weather_client.ForecastCacheStats()
+    monkeypatch.setattr(weather_client, "forecast_cache_stats", stats)
+
+    week, offset = await weather_client.get_daily_forecast("Москва", 5)
+    day_two, _ = await weather_client.get_daily_forecast("москва", 2)
+    day_one, _ = await weather_client.get_daily_forecast("Москва", 1)
+
+    assert len(week) == 5 and len(day_two) == 2 and len(day_one) == 1
+    assert offset == 10800
+    assert fetches == [(55.75, 37.62)]
+    assert list(store) == ["forecast:55.7500:37.6200"]
+    assert (stats.requests, stats.upstream_fetches, stats.hits) == (3, 1, 2)
+
+
+@pytest.mark.asyncio
+async def test_peek_many_returns_only_fresh_entries(monkeypatch):
+    from app import swr
+
+    monkeypatch.setattr(weather_client.settings, "openweather_api_key", "real-key")
+    monkeypatch.setattr(swr, "_clock", lambda: 1000.0)
+    calls = []
+
+    async def fake_get_many(keys):
+        keys = list(keys)
+        calls.append(keys)
+        return {
+            "current_weather:москва": {"v": {"main": {"temp": 1.0}}, "ts": 990.0},
+            "current_weather:казань": {"v": {"main": {"temp": 2.0}}, "ts": 100.0},
+        }
+
+    monkeypatch.setattr(weather_client, "get_many", fake_get_many)
+    result = await weather_client.peek_many_current_weather(["Москва", "Казань", "Сочи"])
+
+    assert calls == [["current_weather:москва", "current_weather:казань", "current_weather:сочи"]]
+    assert result == {"Москва": {"main": {"temp": 1.0}}}
@@ -0,0 +1,89 @@
+import argparse
+import json
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.cache_codec import decode, encode, trim_current_weather
+
+RAW_CURRENT = {
+    "coord": {"lon": 37.6156, "lat": 55.7522},
+    "weather": [{"id": 600, "main": "Snow", "description": "небольшой снег", "icon": "13n"}],
+    "base": "stations",
+    "main": {
+        "temp": -3.58, "feels_like": -8.96, "temp_min": -4.12, "temp_max": -2.91,
+        "pressure": 1019, "humidity": 86, "sea_level": 1019, "grnd_level": 1000,
+    },
+    "visibility": 6200,
+    "wind": {"speed": 4.61, "deg": 213, "gust": 10.71},
+    "snow": {"1h": 0.25},
+    "clouds": {"all": 100},
+    "dt": 1704106800,
+    "sys": {"type": 2, "id": 2000314, "country": "RU", "sunrise": 1704088800, "sunset": 1704114000},
+    "timezone": 10800,
+    "id": 524901,
+    "name": "Москва",
+    "cod": 200,
+}
+
+FORECAST = (
+    [
+        {
+            "date": date(2024, 1, d),
+            "temp_min": -6.31,
+            "temp_max": -1.2,
+            "temp_avg": -3.874,
+            "feels_like_avg": -8.125,
+            "wind_speed_avg": 4.0375,
+            "humidity_avg": 87.5,
+            "main": "Snow",
+            "description": "небольшой снег",
+        }
+        for d in range(1, 6)
+    ],
+    10800,
+)
+
+
+def _json_bytes(value) -> bytes:
+    return json.dumps(value, default=str).encode("utf-8")
+
+
+def _timeit(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache codec size and speed benchmark")
+    parser.add_argument("-n", type=int, default=20000)
+    args = parser.parse_args()
+
+    # json.dumps сырого ответа — как было; даты прогноза json не умеет, поэтому default=str
+    cases = {
+        "current": (RAW_CURRENT, {"v": trim_current_weather(RAW_CURRENT), "ts": 1704106800.0}),
+        "forecast": (FORECAST, {"v": FORECAST, "ts": 1704106800.0}),
+    }
+    print(f"{'entry':10} {'json B':>8} {'codec B':>8} {'json enc':>9} {'json dec':>9} {'codec enc':>10} {'codec dec':>10}  (us/op)")
+    for name, (raw_value, cached_value) in cases.items():
+        json_raw = _json_bytes(raw_value)
+        packed = encode(cached_value)
+        assert decode(packed) == cached_value
+        print(
+            f"{name:10} {len(json_raw):8d} {len(packed):8d} "
+            f"{_timeit(lambda: _json_bytes(raw_value), args.n):9.2f} "
+            f"{_timeit(lambda: json.loads(json_raw), args.n):9.2f} "
+            f"{_timeit(lambda: encode(cached_value), args.n):10.2f} "
+            f"{_timeit(lambda: decode(packed), args.n):10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# стенд без Redis и без реального OWM; квоту поднимаем, чтобы мерить дедупликацию, а не лимитер
+os.environ.pop("REDIS_URL", None)
+os.environ["OPENWEATHER_API_KEY"] = "bench-key"
+os.environ.setdefault("OWM_CALLS_PER_MINUTE", "1000000")
+os.environ.setdefault("OWM_QUOTA_BURST", "100000")
+
+import httpx
+
+import services.weather_api as legacy_api
+from app import cache, optimized_weather, weather_client
+from app.http_pool import weather_http
+
+ENTRY_POINTS = {
+    "app.weather_client": lambda city: weather_client.get_current_weather(city),
+    "app.optimized_weather": lambda city: optimized_weather.get_weather(city),
+    "services.weather_api": lambda city: legacy_api.get_weather(city),
+}
+
+
+async def run(requests: int, cities: int, concurrency: int, latency_ms: float, seed: int) -> dict:
+    upstream = Counter()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        city = request.url.params["q"]
+        upstream[city.lower()] += 1
+        await asyncio.sleep(latency_ms / 1000)
+        payload = {"name": city, "dt": int(time.time()), "main": {"temp": 1.0, "humidity": 50}, "wind": {"speed": 1.0}}
+        return httpx.Response(200, json=payload)
+
+    weather_http.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    rng = random.Random(seed)
+    names = [f"City{i}" for i in range(cities)]
+    # как в проде: одни и те же города приходят через разные стеки и в разном написании
+    workload = [
+        (rng.choice(list(ENTRY_POINTS)), rng.choice([name, name.lower(), f" {name.upper()} "]))
+        for name in (rng.choice(names) for _ in range(requests))
+    ]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(entry: str, city: str):
+        async with semaphore:
+            await ENTRY_POINTS[entry](city)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(entry, city) for entry, city in workload))
+    finally:
+        await weather_http.close()
+    elapsed = time.perf_counter() - started
+
+    # раньше weather_client кешировал в current_weather:, а два других стека — в weather:{city}:{units},
+    # и без single-flight; это нижняя оценка числа запросов к OWM при старой раскладке
+    legacy_keyspace = {"app.weather_client": "current_weather"}
+    legacy_fetches = len({(legacy_keyspace.get(entry, "weather"), city.strip().lower()) for entry, city in workload})
+    return {
+        "requests": requests,
+        "distinct_cities": len({city.strip().lower() for _, city in workload}),
+        "owm_calls": sum(upstream.values()),
+        "max_calls_per_city": max(upstream.values()) if upstream else 0,
+        "legacy_min_owm_calls": legacy_fetches,
+        "cache_entries": len(cache._inmem),
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Unified weather provider: upstream dedup benchmark")
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--cities", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=45.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.requests, args.cities, args.concurrency, args.latency_ms, args.seed))
+    for name, value in result.items():
+        print(f"{name:20} {value}")
+    assert result["owm_calls"] == result["distinct_cities"], "every city must be fetched from OWM exactly once"
+
+
+if __name__ == "__main__":
+    main()
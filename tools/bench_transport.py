@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import httpx
+
+from app.http_pool import WeatherHTTPPool
+from app.transport import DNSCache, build_transport
+
+STUB_HOST = "owm.stub"
+
+
+def _make_cert(directory: str):
+    cert = os.path.join(directory, "stub.crt")
+    key = os.path.join(directory, "stub.key")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-keyout", key, "-out", cert, "-subj", f"/CN={STUB_HOST}",
+            "-addext", f"subjectAltName=DNS:{STUB_HOST}",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+async def _start_stub(cert: str, key: str, server_delay: float):
+    ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ctx.load_cert_chain(cert, key)
+    body = b'{"main": {"temp": 1.0}}'
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                await asyncio.sleep(server_delay)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n"
+                    + (b"" if request.startswith(b"HEAD") else body)
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, ssl=ctx)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def _resolver(dns_delay: float):
+    async def resolve(host: str, port: int):
+        # имитация обращения к системному резолверу
+        await asyncio.sleep(dns_delay)
+        return ["127.0.0.1"]
+
+    return resolve
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct * len(ordered))) - 1))]
+
+
+async def _measure(get, requests: int, concurrency: int, pause: float):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            resp = await get()
+            resp.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    # первая волна после простоя — самый дорогой запрос без прогрева
+    started = time.perf_counter()
+    (await get()).raise_for_status()
+    first = (time.perf_counter() - started) * 1000
+    for start in range(0, requests, concurrency):
+        await asyncio.gather(*(one() for _ in range(min(concurrency, requests - start))))
+        await asyncio.sleep(pause)
+    return first, latencies
+
+
+async def run_bench(requests: int, concurrency: int, dns_delay: float, server_delay: float, pause: float) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = _make_cert(directory)
+        server, port = await _start_stub(cert, key, server_delay)
+        url = f"https://{STUB_HOST}:{port}/data/2.5/weather"
+        verify = ssl.create_default_context(cafile=cert)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency, keepalive_expiry=30)
+
+        try:
+            # как было: новый клиент (DNS + TCP + TLS) на каждый запрос
+            async def per_request():
+                transport = build_transport(limits, http2=False, dns_cache=DNSCache(ttl=0, resolver=_resolver(dns_delay)), verify=verify)
+                async with httpx.AsyncClient(transport=transport) as client:
+                    return await client.get(url)
+
+            results["per-request client"] = await _measure(per_request, requests, concurrency, pause)
+
+            # общий пул без кеша DNS и без прогрева
+            pooled = httpx.AsyncClient(
+                transport=build_transport(limits, http2=False, dns_cache=DNSCache(ttl=0, resolver=_resolver(dns_delay)), verify=verify)
+            )
+            try:
+                results["pooled"] = await _measure(lambda: pooled.get(url), requests, concurrency, pause)
+            finally:
+                await pooled.aclose()
+
+            # пул + кеш DNS + прогрев, как в WeatherHTTPPool
+            pool = WeatherHTTPPool(max_connections=concurrency, max_keepalive=concurrency, base_url=f"https://{STUB_HOST}:{port}")
+            pool.dns_cache = DNSCache(ttl=300, resolver=_resolver(dns_delay))
+            client = await pool.start(verify=verify)
+            try:
+                await pool.prewarm(concurrency)
+                results["pooled + dns cache + prewarm"] = await _measure(lambda: client.get(url), requests, concurrency, pause)
+            finally:
+                await pool.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OWM transport benchmark against a local TLS stub")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--dns-delay-ms", type=float, default=20.0)
+    parser.add_argument("--server-delay-ms", type=float, default=2.0)
+    parser.add_argument("--pause-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = asyncio.run(
+        run_bench(
+            args.requests,
+            args.concurrency,
+            args.dns_delay_ms / 1000,
+            args.server_delay_ms / 1000,
+            args.pause_ms / 1000,
+        )
+    )
+    print(f"requests={args.requests}, concurrency={args.concurrency}, dns delay={args.dns_delay_ms}ms")
+    for name, (first, latencies) in results.items():
+        print(
+            f"{name:32} first={first:7.1f}ms  p50={statistics.median(latencies):6.1f}ms  "
+            f"p95={_percentile(latencies, 0.95):6.1f}ms  max={max(latencies):6.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import asyncio
+import multiprocessing as mp
+import os
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _replica(db_url: str, name: str, events, heartbeat: float, lock_key: int):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app.coordination import Coordinator
+
+    async def run():
+        engine = create_async_engine(db_url, echo=False)
+        coordinator = Coordinator(engine, mode="leader", lock_key=lock_key)
+        was_leader = False
+        try:
+            while True:
+                is_leader = await coordinator.heartbeat()
+                if is_leader != was_leader:
+                    events.put((time.time(), name, is_leader))
+                    was_leader = is_leader
+                await asyncio.sleep(heartbeat)
+        finally:
+            await coordinator.close()
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+def run_check(db_url: str, replicas: int = 3, heartbeat: float = 0.2, lock_key: int = 99000001) -> dict:
+    ctx = mp.get_context("spawn")
+    events = ctx.Queue()
+    procs = {
+        f"replica-{i}": ctx.Process(target=_replica, args=(db_url, f"replica-{i}", events, heartbeat, lock_key), daemon=True)
+        for i in range(replicas)
+    }
+    for proc in procs.values():
+        proc.start()
+
+    leaders: list[str] = []
+    current: set[str] = set()
+    max_concurrent = 0
+    deadline = time.time() + 30
+    killed = False
+
+    try:
+        while time.time() < deadline:
+            try:
+                _, name, is_leader = events.get(timeout=0.5)
+            except Exception:
+                continue
+            if is_leader:
+                current.add(name)
+                leaders.append(name)
+            else:
+                current.discard(name)
+            max_concurrent = max(max_concurrent, len(current))
+
+            if leaders and not killed:
+                # убиваем лидера без корректного завершения — сессия Postgres рвётся, блокировка снимается
+                victim = leaders[0]
+                procs[victim].kill()
+                procs[victim].join()
+                current.discard(victim)
+                killed = True
+            elif killed and len(leaders) >= 2:
+                break
+    finally:
+        for proc in procs.values():
+            if proc.is_alive():
+                proc.kill()
+            proc.join()
+
+    return {"leaders": leaders, "max_concurrent_leaders": max_concurrent}
+
+
+def main():
+    db_url = os.environ.get("TEST_DATABASE_URL") or os.environ.get("DATABASE_URL")
+    if not db_url:
+        raise SystemExit("Не задан TEST_DATABASE_URL (postgresql+asyncpg://...)")
+    replicas = int(os.environ.get("COORDINATION_CHECK_REPLICAS", "3"))
+
+    result = run_check(db_url, replicas=replicas)
+    print(f"leaders in order: {result['leaders']}")
+    print(f"max concurrent leaders: {result['max_concurrent_leaders']}")
+    if len(result["leaders"]) < 2 or result["max_concurrent_leaders"] > 1:
+        raise SystemExit("FAIL: no failover or split brain")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()